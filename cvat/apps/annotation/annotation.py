@@ -8,7 +8,7 @@ from collections import OrderedDict, namedtuple
 
 from django.utils import timezone
 
-from cvat.apps.engine.data_manager import DataManager, TrackManager
+from cvat.apps.engine.data_manager import TrackManager
 from cvat.apps.engine.serializers import LabeledDataSerializer
 
 class AnnotationIR:
@@ -111,13 +111,20 @@ class Annotation:
     Tag.__new__.__defaults__ = (0, )
     Frame = namedtuple('Frame', 'frame, name, width, height, labeled_shapes, tags')
 
-    def __init__(self, annotation_ir, db_task, scheme='', host='', create_callback=None):
+    def __init__(self, annotation_ir, db_task, scheme='', host='', create_callback=None,
+            annotation_ir_parts=None):
+        # annotation_ir_parts is an optional callable which returns an iterator
+        # over (frame, AnnotationIR) pairs. If it is specified, annotations are
+        # exported part by part and objects of following parts must not have
+        # shapes before the frame (see TaskAnnotation.iter_from_db).
         self._annotation_ir = annotation_ir
+        self._annotation_ir_parts = annotation_ir_parts
         self._db_task = db_task
         self._scheme = scheme
         self._host = host
         self._create_callback=create_callback
         self._MAX_ANNO_SIZE=30000
+        self._FRAME_WINDOW=1000
 
         db_labels = self._db_task.label_set.all().prefetch_related('attributespec_set').order_by('pk')
 
@@ -293,6 +300,12 @@ class Annotation:
             attributes=self._export_attributes(tag["attributes"]),
         )
 
+    def _iter_annotation_ir(self):
+        if self._annotation_ir_parts is None:
+            yield self._db_task.size, self._annotation_ir
+        else:
+            yield from self._annotation_ir_parts()
+
     def group_by_frame(self):
         def _get_frame(annotations, shape):
             db_image = self._frame_info[shape["frame"]]
@@ -302,8 +315,8 @@ class Annotation:
                 rpath = os.path.sep.join(rpath[rpath.index(".upload")+1:])
             else:
                 rpath = rpath[0]
-            if frame not in annotations:
-                annotations[frame] = Annotation.Frame(
+            if shape["frame"] not in annotations:
+                annotations[shape["frame"]] = Annotation.Frame(
                     frame=frame,
                     name=rpath,
                     height=db_image["height"],
@@ -311,40 +324,81 @@ class Annotation:
                     labeled_shapes=[],
                     tags=[],
                 )
-            return annotations[frame]
+            return annotations[shape["frame"]]
 
+        # Frames are kept until all objects which can have shapes on them
+        # have been read. Tracks are converted into shapes by windows of
+        # frames, thus only shapes of one window are created at once.
         annotations = {}
-        data_manager = DataManager(self._annotation_ir)
-        for shape in data_manager.to_shapes(self._db_task.size):
-            _get_frame(annotations, shape).labeled_shapes.append(self._export_labeled_shape(shape))
-
-        for tag in self._annotation_ir.tags:
-            _get_frame(annotations, tag).tags.append(self._export_tag(tag))
-
-        return iter(annotations.values())
+        for stop_frame, annotation_ir in self._iter_annotation_ir():
+            for shape in annotation_ir.shapes:
+                _get_frame(annotations, shape).labeled_shapes.append(self._export_labeled_shape(shape))
+
+            for tag in annotation_ir.tags:
+                _get_frame(annotations, tag).tags.append(self._export_tag(tag))
+
+            track_manager = TrackManager(annotation_ir.tracks)
+            tracked_shapes = [TrackManager.get_interpolated_shapes(track, 0, self._db_task.size)
+                for track in annotation_ir.tracks]
+            start = min((shapes.start_frame for shapes in tracked_shapes), default=0)
+            stop = max((shapes.stop_frame for shapes in tracked_shapes), default=0)
+            for window_start in range(start, max(stop, stop_frame), self._FRAME_WINDOW):
+                window_stop = window_start + self._FRAME_WINDOW
+                for shape in track_manager.to_shapes(self._db_task.size, window_start, window_stop):
+                    _get_frame(annotations, shape).labeled_shapes.append(self._export_labeled_shape(shape))
+
+                for frame in sorted(frame for frame in annotations
+                        if frame < min(window_stop, stop_frame)):
+                    yield annotations.pop(frame)
+
+            for frame in sorted(frame for frame in annotations if frame < stop_frame):
+                yield annotations.pop(frame)
+
+        for frame in sorted(annotations):
+            yield annotations[frame]
+
+    def _export_track(self, track):
+        tracked_shapes = TrackManager.get_interpolated_shapes(track, 0, self._db_task.size)
+        shapes = []
+        for tracked_shape in tracked_shapes:
+            tracked_shape = copy.copy(tracked_shape)
+            tracked_shape["attributes"] = tracked_shape["attributes"] + track["attributes"]
+            shapes.append(self._export_tracked_shape(tracked_shape))
+
+        return Annotation.Track(
+            label=self._get_label_name(track["label_id"]),
+            group=track['group'],
+            shapes=shapes,
+        )
 
     @property
     def shapes(self):
-        for shape in self._annotation_ir.shapes:
-            yield self._export_labeled_shape(shape)
+        for _, annotation_ir in self._iter_annotation_ir():
+            for shape in annotation_ir.shapes:
+                yield self._export_labeled_shape(shape)
 
     @property
     def tracks(self):
-        for track in self._annotation_ir.tracks:
-            tracked_shapes = TrackManager.get_interpolated_shapes(track, 0, self._db_task.size)
-            for tracked_shape in tracked_shapes:
-                tracked_shape["attributes"] += track["attributes"]
+        for _, annotation_ir in self._iter_annotation_ir():
+            for track in annotation_ir.tracks:
+                yield self._export_track(track)
+
+    @property
+    def tracks_and_shapes(self):
+        # Annotations are read once. If they are exported part by part,
+        # tracks of every part go before its shapes.
+        for _, annotation_ir in self._iter_annotation_ir():
+            for track in annotation_ir.tracks:
+                yield self._export_track(track)
 
-            yield Annotation.Track(
-                label=self._get_label_name(track["label_id"]),
-                group=track['group'],
-                shapes=[self._export_tracked_shape(shape) for shape in tracked_shapes],
-            )
+            for shape in annotation_ir.shapes:
+                yield self._export_labeled_shape(shape)
 
     @property
     def tags(self):
-        for tag in self._annotation_ir.tags:
-            yield self._export_tag(tag)
+        for _, annotation_ir in self._iter_annotation_ir():
+            for tag in annotation_ir.tags:
+                yield self._export_tag(tag)
 
     @property
     def meta(self):
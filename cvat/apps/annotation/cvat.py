@@ -307,38 +307,38 @@ def dump_as_cvat_interpolation(file_object, annotations):
         dumper.close_track()
 
     counter = 0
-    for track in annotations.tracks:
+    for obj in annotations.tracks_and_shapes:
+        if isinstance(obj, annotations.Track):
+            track = obj
+        else:
+            track = annotations.Track(
+                label=obj.label,
+                group=obj.group,
+                shapes=[annotations.TrackedShape(
+                    type=obj.type,
+                    points=obj.points,
+                    occluded=obj.occluded,
+                    outside=False,
+                    keyframe=True,
+                    z_order=obj.z_order,
+                    frame=obj.frame,
+                    attributes=obj.attributes,
+                ),
+                annotations.TrackedShape(
+                    type=obj.type,
+                    points=obj.points,
+                    occluded=obj.occluded,
+                    outside=True,
+                    keyframe=True,
+                    z_order=obj.z_order,
+                    frame=obj.frame + 1,
+                    attributes=obj.attributes,
+                ),
+                ],
+            )
         dump_track(counter, track)
         counter += 1
 
-    for shape in annotations.shapes:
-        dump_track(counter, annotations.Track(
-            label=shape.label,
-            group=shape.group,
-            shapes=[annotations.TrackedShape(
-                type=shape.type,
-                points=shape.points,
-                occluded=shape.occluded,
-                outside=False,
-                keyframe=True,
-                z_order=shape.z_order,
-                frame=shape.frame,
-                attributes=shape.attributes,
-            ),
-            annotations.TrackedShape(
-                type=shape.type,
-                points=shape.points,
-                occluded=shape.occluded,
-                outside=True,
-                keyframe=True,
-                z_order=shape.z_order,
-                frame=shape.frame + 1,
-                attributes=shape.attributes,
-            ),
-            ],
-        ))
-        counter += 1
-
     dumper.close_root()
 
 def load(file_object, annotations):
@@ -4,6 +4,9 @@
 # SPDX-License-Identifier: MIT
 
 import cv2
+import numpy as np
+
+from cvat.apps.engine import frames
 
 class ImageLoader():
     def __init__(self, image_list):
@@ -19,6 +22,19 @@ class ImageLoader():
     def __len__(self):
         return len(self.image_list)
 
+    def get_image(self, i):
+        return self._load_image(self.image_list[i])
+
     @staticmethod
     def _load_image(path_to_image):
         return cv2.imread(path_to_image)
+
+class FrameLoader(ImageLoader):
+    """Frames of a task in any storage of frames (see engine.frames)"""
+    def __init__(self, db_task):
+        super().__init__(list(range(db_task.size)))
+        self._db_task = db_task
+
+    def _load_image(self, frame):
+        data = frames.read_frame(self._db_task, frame)
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
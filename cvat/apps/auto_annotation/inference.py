@@ -1,35 +1,57 @@
-from .model_loader import ModelLoader
-from cvat.apps.engine.utils import import_modules, execute_python_code
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from django.conf import settings
+
+from .model_registry import get_model_loader, get_script
+from cvat.apps.engine.utils import import_modules, execute_python_code, map_in_order
 import itertools
 
-def _process_detections(detections, path_to_conv_script, restricted=True):
-    results = Results()
-    local_vars = {
-        "detections": detections,
-        "results": results,
-        }
-    source_code = open(path_to_conv_script).read()
-
-    if restricted:
-        global_vars = {
-            "__builtins__": {
-                "str": str,
-                "int": int,
-                "float": float,
-                "max": max,
-                "min": min,
-                "range": range,
-                },
+# Number of frames which detections are passed to the convertation script
+# at once. Outputs of the network are kept in memory only for these frames.
+_CONVERSION_CHUNK_SIZE = 64
+
+class _DetectionConverter():
+    """Run the convertation script for detections of several frames at once,
+    results of all runs are accumulated"""
+    def __init__(self, path_to_conv_script, restricted=True):
+        self.results = Results()
+        source_code, self._code = get_script(path_to_conv_script)
+
+        if restricted:
+            self._global_vars = {
+                "__builtins__": {
+                    "str": str,
+                    "int": int,
+                    "float": float,
+                    "max": max,
+                    "min": min,
+                    "range": range,
+                    },
+                }
+        else:
+            self._global_vars = globals()
+            imports = import_modules(source_code)
+            self._global_vars.update(imports)
+
+    def convert(self, detections):
+        local_vars = {
+            "detections": detections,
+            "results": self.results,
             }
-    else:
-        global_vars = globals()
-        imports = import_modules(source_code)
-        global_vars.update(imports)
-
+        execute_python_code(self._code, self._global_vars, local_vars)
 
-    execute_python_code(source_code, global_vars, local_vars)
+def _load_inputs(data, preprocess, workers):
+    """Yield ((height, width), network input) of images of the data. Images
+    are loaded and preprocessed by a pool of threads ahead of inference (cv2
+    releases the GIL)."""
+    get_image = getattr(data, "get_image", data.__getitem__)
+    def load(i):
+        image = get_image(i)
+        return image.shape[:2], preprocess(image)
 
-    return results
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from map_in_order(executor, load, range(len(data)), 2 * workers)
 
 class Results():
     def __init__(self):
@@ -78,7 +100,11 @@ class Results():
         }
 
 def run_inference_engine_annotation(data, model_file, weights_file,
-       labels_mapping, attribute_spec, convertation_file, job=None, update_progress=None, restricted=True):
+       labels_mapping, attribute_spec, convertation_file, job=None, update_progress=None, restricted=True,
+       save_results=None):
+    """Return annotations of the data. If save_results is passed, it is
+    called with annotations of every AUTO_ANNOTATION_SAVE_CHUNK_SIZE frames
+    (and of processed frames on cancel) and they aren't returned."""
     def process_attributes(shape_attributes, label_attr_spec):
         attributes = []
         for attr_text, attr_value in shape_attributes.items():
@@ -107,35 +133,60 @@ def run_inference_engine_annotation(data, model_file, weights_file,
                 "attributes": process_attributes(shape["attributes"], label_attr_spec),
             })
 
-    result = {
-        "shapes": [],
-        "tracks": [],
-        "tags": [],
-        "version": 0
-    }
+    def make_result():
+        return {
+            "shapes": [],
+            "tracks": [],
+            "tags": [],
+            "version": 0
+        }
+
+    def convert(detections):
+        converter.convert(detections)
+        add_shapes(converter.results.get_shapes(), result["shapes"])
+        converter.results = Results()
 
+    result = make_result()
     data_len = len(data)
-    model = ModelLoader(model=model_file, weights=weights_file)
-
-    frame_counter = 0
+    model = get_model_loader(model_file, weights_file,
+        batch_size=settings.AUTO_ANNOTATION_BATCH_SIZE,
+        num_requests=settings.AUTO_ANNOTATION_INFER_REQUESTS)
+    converter = _DetectionConverter(convertation_file, restricted=restricted)
 
+    inputs = _load_inputs(data, model.preprocess, settings.AUTO_ANNOTATION_DECODE_WORKERS)
     detections = []
-    for frame in data:
-        orig_rows, orig_cols = frame.shape[:2]
-
-        detections.append({
-            "frame_id": frame_counter,
-            "frame_height": orig_rows,
-            "frame_width": orig_cols,
-            "detections": model.infer(frame),
-        })
-
-        frame_counter += 1
-        if job and update_progress and not update_progress(job, frame_counter * 100 / data_len):
-            return None
-
-    processed_detections = _process_detections(detections, convertation_file, restricted=restricted)
-
-    add_shapes(processed_detections.get_shapes(), result["shapes"])
+    unsaved_frames = 0
+    # The model is shared with next runs, its requests are finished by close()
+    with closing(model.infer_many(inputs)) as model_results:
+        for frame_counter, ((orig_rows, orig_cols), results) in enumerate(
+            model_results, 1):
+            detections.append({
+                "frame_id": frame_counter - 1,
+                "frame_height": orig_rows,
+                "frame_width": orig_cols,
+                "detections": results,
+            })
+            unsaved_frames += 1
+            is_canceled = job and update_progress and \
+                not update_progress(job, frame_counter * 100 / data_len)
+
+            if len(detections) == _CONVERSION_CHUNK_SIZE or is_canceled:
+                convert(detections)
+                detections = []
+
+                if save_results is not None and (is_canceled or
+                    unsaved_frames >= settings.AUTO_ANNOTATION_SAVE_CHUNK_SIZE):
+                    save_results(result)
+                    result = make_result()
+                    unsaved_frames = 0
+
+            if is_canceled:
+                return None
+
+    if detections:
+        convert(detections)
+    if save_results is not None:
+        save_results(result)
+        result = make_result()
 
     return result
@@ -8,11 +8,18 @@ import cv2
 import os
 import subprocess
 import numpy as np
+from collections import deque
 
 from cvat.apps.auto_annotation.inference_engine import make_plugin, make_network
+from cvat.apps.engine.utils import iter_chunks
 
 class ModelLoader():
-    def __init__(self, model, weights):
+    """The network is loaded with num_requests infer requests, batches of
+    inputs are inferred by them asynchronously (see infer_many). The batch
+    size is changed only if every output can be split by images: a
+    DetectionOutput layer (its rows have image ids) or a blob whose first
+    dimension is the batch."""
+    def __init__(self, model, weights, batch_size=1, num_requests=2):
         self._model = model
         self._weights = weights
 
@@ -41,28 +48,99 @@ class ModelLoader():
         if self._input_blob_name == 'image_info':
             self._input_blob_name = next(iter_inputs)
 
-        self._net = plugin.load(network=network, num_requests=2)
+        self._detection_outputs = {name for name in network.outputs
+            if network.layers[name].type == 'DetectionOutput'}
+        if batch_size > 1 and all(name in self._detection_outputs or
+            network.outputs[name].shape[0] == network.batch_size
+            for name in network.outputs):
+            network.batch_size = batch_size
+        self._batch_size = network.batch_size
+
+        self._num_requests = num_requests
+        self._net = plugin.load(network=network, num_requests=num_requests)
         input_type = network.inputs[self._input_blob_name]
         self._input_layout = input_type if isinstance(input_type, list) else input_type.shape
 
-    def infer(self, image):
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    def preprocess(self, image):
+        """Resize the BGR image to the network input and change its layout
+        from HWC to CHW. It can be called from other threads."""
         _, _, h, w = self._input_layout
         in_frame = image if image.shape[:-1] == (h, w) else cv2.resize(image, (w, h))
-        in_frame = in_frame.transpose((2, 0, 1))  # Change data layout from HWC to CHW
-        inputs = {self._input_blob_name: in_frame}
+        return in_frame.transpose((2, 0, 1))
+
+    def _make_inputs(self, in_frames):
+        # The last batch is padded up to the batch size
+        in_frames = list(in_frames)
+        in_frames += in_frames[-1:] * (self._batch_size - len(in_frames))
+        inputs = {self._input_blob_name: np.stack(in_frames)}
         if self._require_image_info:
-            info = np.zeros([1, 3])
-            info[0, 0] = h
-            info[0, 1] = w
+            _, _, h, w = self._input_layout
+            info = np.zeros([self._batch_size, 3])
+            info[:, 0] = h
+            info[:, 1] = w
             # frame number
-            info[0, 2] = 1
+            info[:, 2] = 1
             inputs['image_info'] = info
+        return inputs
+
+    def _split_results(self, results, idx):
+        """Results of the idx-th image of a batch"""
+        if self._batch_size > 1:
+            image_results = {}
+            for name, blob in results.items():
+                if name in self._detection_outputs:
+                    rows = blob.reshape(-1, blob.shape[-1])
+                    rows = rows[rows[:, 0] == idx].copy()
+                    rows[:, 0] = 0
+                    image_results[name] = rows.reshape(1, 1, -1, blob.shape[-1])
+                else:
+                    image_results[name] = blob[idx:idx + 1]
+            results = image_results
 
-        results = self._net.infer(inputs)
         if len(results) == 1:
-            return results[self._output_blob_name].copy()
-        else:
-            return results.copy()
+            return results[self._output_blob_name]
+        return results
+
+    def _get_results(self, request_id, keys):
+        request = self._net.requests[request_id]
+        request.wait(-1)
+        results = {name: blob.copy() for name, blob in request.outputs.items()}
+        for idx, key in enumerate(keys):
+            yield key, self._split_results(results, idx)
+
+    def infer_many(self, inputs):
+        """Yield (key, results) for (key, preprocessed image) pairs in the same
+        order. Batches of images are inferred by all requests at once."""
+        pending = deque()
+        free_requests = deque(range(self._num_requests))
+        try:
+            for batch in iter_chunks(inputs, self._batch_size):
+                if not free_requests:
+                    request_id, keys = pending.popleft()
+                    yield from self._get_results(request_id, keys)
+                    free_requests.append(request_id)
+
+                keys, in_frames = zip(*batch)
+                request_id = free_requests.popleft()
+                self._net.start_async(request_id=request_id,
+                    inputs=self._make_inputs(in_frames))
+                pending.append((request_id, keys))
+
+            while pending:
+                request_id, keys = pending.popleft()
+                yield from self._get_results(request_id, keys)
+        finally:
+            # The loader is reused by next runs (see model_registry), so
+            # requests of a stopped run must be finished
+            for request_id, _ in pending:
+                self._net.requests[request_id].wait(-1)
+
+    def infer(self, image):
+        return next(self.infer_many([(None, self.preprocess(image))]))[1]
 
 
 def load_labelmap(labels_path):
@@ -3,7 +3,6 @@
 # SPDX-License-Identifier: MIT
 
 import django_rq
-import fnmatch
 import numpy as np
 import os
 import rq
@@ -19,12 +18,13 @@ from cvat.apps.engine.log import slogger
 from cvat.apps.engine.models import Task as TaskModel
 from cvat.apps.authentication.auth import has_admin_role
 from cvat.apps.engine.serializers import LabeledDataSerializer
-from cvat.apps.engine.annotation import put_task_data, patch_task_data
+from cvat.apps.engine.annotation import delete_task_data, patch_task_data
 
 from .models import AnnotationModel, FrameworkChoice
 from .model_loader import ModelLoader, load_labelmap
-from .image_loader import ImageLoader
+from .image_loader import FrameLoader
 from .inference import run_inference_engine_annotation
+from .model_registry import format_metrics
 
 
 
@@ -210,17 +210,8 @@ def delete(dl_model_id):
     else:
         raise Exception("Requested DL model {} doesn't exist".format(dl_model_id))
 
-def get_image_data(path_to_data):
-    def get_image_key(item):
-        return int(os.path.splitext(os.path.basename(item))[0])
-
-    image_list = []
-    for root, _, filenames in os.walk(path_to_data):
-        for filename in fnmatch.filter(filenames, "*.jpg"):
-            image_list.append(os.path.join(root, filename))
-
-    image_list.sort(key=get_image_key)
-    return ImageLoader(image_list)
+def get_image_data(db_task):
+    return FrameLoader(db_task)
 
 
 def run_inference_thread(tid, model_file, weights_file, labels_mapping, attributes, convertation_file, reset, user, restricted=True):
@@ -240,10 +231,26 @@ def run_inference_thread(tid, model_file, weights_file, labels_mapping, attribut
         job.save_meta()
         db_task = TaskModel.objects.get(pk=tid)
 
+        # Annotations are saved by chunks of frames, thus memory isn't
+        # occupied by all of them and processed frames are kept on cancel.
+        # Old annotations are deleted before the first chunk if reset is set.
+        is_reset_pending = reset
+        def save_results(result):
+            nonlocal is_reset_pending
+            if is_reset_pending:
+                delete_task_data(tid, user)
+                is_reset_pending = False
+            if not result["shapes"]:
+                return
+
+            serializer = LabeledDataSerializer(data = result)
+            if serializer.is_valid(raise_exception=True):
+                patch_task_data(tid, user, result, "create")
+
         result = None
         slogger.glob.info("auto annotation with openvino toolkit for task {}".format(tid))
         result = run_inference_engine_annotation(
-            data=get_image_data(db_task.get_data_dirname()),
+            data=get_image_data(db_task),
             model_file=model_file,
             weights_file=weights_file,
             labels_mapping=labels_mapping,
@@ -251,20 +258,15 @@ def run_inference_thread(tid, model_file, weights_file, labels_mapping, attribut
             convertation_file= convertation_file,
             job=job,
             update_progress=update_progress,
-            restricted=restricted
+            restricted=restricted,
+            save_results=save_results,
         )
+        slogger.glob.info(format_metrics())
 
         if result is None:
             slogger.glob.info("auto annotation for task {} canceled by user".format(tid))
             return
 
-        serializer = LabeledDataSerializer(data = result)
-        if serializer.is_valid(raise_exception=True):
-            if reset:
-                put_task_data(tid, user, result)
-            else:
-                patch_task_data(tid, user, result, "create")
-
         slogger.glob.info("auto annotation for task {} done".format(tid))
     except Exception as e:
         try:
@@ -0,0 +1,94 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from cvat.apps.engine.utils import compile_python_code
+
+
+class ModelRegistry():
+    """LRU cache of loaded models and compiled scripts of a worker process.
+    A value is loaded again if any of its files is changed (files of an
+    AnnotationModel are stored in its own directory, so paths and mtimes
+    identify a version of the model). Values are shared by all callers, thus
+    they mustn't be used by several jobs at once (an RQ worker runs one job
+    at a time)."""
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._load_time = 0.0
+
+    def get(self, key, paths, load):
+        """Return the value of the key or call load() to get it"""
+        mtimes = tuple(os.stat(path).st_mtime_ns for path in paths)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == mtimes:
+                self._items.move_to_end(key)
+                self._hits += 1
+                return item[1]
+            # Free the memory of an outdated value before loading a new one
+            self._items.pop(key, None)
+
+        start = time.perf_counter()
+        value = load()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._misses += 1
+            self._load_time += elapsed
+            if self._max_size > 0:
+                self._items[key] = (mtimes, value)
+                while len(self._items) > self._max_size:
+                    self._items.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            requests = self._hits + self._misses
+            return {
+                "size": len(self._items),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / requests if requests else 0.0,
+                "load_time": self._load_time,
+            }
+
+model_registry = ModelRegistry(settings.AUTO_ANNOTATION_MODEL_CACHE_SIZE)
+
+def get_model_loader(model_file, weights_file, batch_size=1, num_requests=2):
+    # OpenVINO is imported only when a model is really loaded
+    from cvat.apps.auto_annotation.model_loader import ModelLoader
+
+    return model_registry.get(
+        ("model", model_file, weights_file, batch_size, num_requests),
+        (model_file, weights_file),
+        lambda: ModelLoader(model=model_file, weights=weights_file,
+            batch_size=batch_size, num_requests=num_requests))
+
+def get_script(path):
+    """Return (source code, code object) of the python script"""
+    def load():
+        with open(path) as script_file:
+            source_code = script_file.read()
+        return source_code, compile_python_code(source_code, path)
+
+    return model_registry.get(("script", path), (path,), load)
+
+def format_metrics():
+    return "model registry: {size} items, {hits} hits, {misses} misses " \
+        "(hit rate {hit_rate:.0%}), {load_time:.2f}s of loading".format(
+            **model_registry.get_metrics())
@@ -24,7 +24,7 @@ from .models import AnnotationModel
     fn=objectgetter(TaskModel, "tid"), raise_exception=True)
 def cancel(request, tid):
     try:
-        queue = django_rq.get_queue("low")
+        queue = django_rq.get_queue("inference")
         job = queue.fetch_job("auto_annotation.run.{}".format(tid))
         if job is None or job.is_finished or job.is_failed:
             raise Exception("Task is not being annotated currently")
@@ -149,7 +149,7 @@ def get_meta_info(request):
                 "labels": labels,
             })
 
-        queue = django_rq.get_queue("low")
+        queue = django_rq.get_queue("inference")
         for tid in tids:
             rq_id = "auto_annotation.run.{}".format(tid)
             job = queue.fetch_job(rq_id)
@@ -172,7 +172,7 @@ def start_annotation(request, mid, tid):
     slogger.glob.info("auto annotation create request for task {} via DL model {}".format(tid, mid))
     try:
         db_task = TaskModel.objects.get(pk=tid)
-        queue = django_rq.get_queue("low")
+        queue = django_rq.get_queue("inference")
         job = queue.fetch_job("auto_annotation.run.{}".format(tid))
         if job is not None and (job.is_started or job.is_queued):
             raise Exception("The process is already running")
@@ -235,7 +235,7 @@ def start_annotation(request, mid, tid):
 @login_required
 def check(request, rq_id):
     try:
-        target_queue = "low" if "auto_annotation.run" in rq_id else "default"
+        target_queue = "inference" if "auto_annotation.run" in rq_id else "default"
         queue = django_rq.get_queue(target_queue)
         job = queue.fetch_job(rq_id)
         if job is not None and "cancel" in job.meta:
@@ -0,0 +1,49 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import threading
+from collections import deque
+
+import numpy as np
+
+from cvat.apps.engine.log import slogger
+
+
+class LatencyStats():
+    """Latencies of stages of last requests of the process. Percentiles of
+    them are logged every log_interval requests."""
+    def __init__(self, name, window=1000, log_interval=100):
+        self._name = name
+        self._log_interval = log_interval
+        self._latencies = {}
+        self._window = window
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def add(self, **stages):
+        """Record latencies of stages of a request in seconds"""
+        with self._lock:
+            for stage, latency in stages.items():
+                self._latencies.setdefault(stage,
+                    deque(maxlen=self._window)).append(latency)
+            self._count += 1
+            is_time_to_log = self._count % self._log_interval == 0
+
+        if is_time_to_log:
+            slogger.glob.info(self.format())
+
+    def get_percentiles(self, percentiles=(50, 99)):
+        """Return {stage: [percentile, ...]} in seconds"""
+        with self._lock:
+            latencies = {stage: list(values)
+                for stage, values in self._latencies.items()}
+        return {stage: np.percentile(values, percentiles).tolist()
+            for stage, values in latencies.items()}
+
+    def format(self):
+        stages = ", ".join("{} p50 {:.0f}ms p99 {:.0f}ms".format(
+                stage, p50 * 1000, p99 * 1000)
+            for stage, (p50, p99) in sorted(self.get_percentiles().items()))
+        return "{} latency of last {} requests: {}".format(
+            self._name, min(self._count, self._window), stages)
@@ -0,0 +1,91 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Preparation of the DEXTR network input from an image and extreme points
+and conversion of the network output into a polygon. The network isn't
+needed here, so the processing can be used and measured separately."""
+
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+PADDING = 50
+THRESHOLD = 0.9
+SIZE = 512
+
+@lru_cache(maxsize=4)
+def _get_gaussian(size):
+    """1D Gaussian of offsets [-2 * size, 2 * size]. The 2D Gaussian of a
+    point is the outer product of its slices for the point coordinates."""
+    offsets = np.arange(-2 * size, 2 * size + 1, dtype=np.float64)
+    gaussian = np.exp(-4 * np.log(2) * offsets ** 2 / 100)
+    gaussian.setflags(write=False)
+    return gaussian
+
+def make_heatmap(points, size=SIZE):
+    """Return the (size, size) maximum of Gaussians around the points"""
+    gaussian = _get_gaussian(size)
+    starts = 2 * size - np.clip(points, -size, 2 * size)
+    idx = starts[:, :, np.newaxis] + np.arange(size)
+    # (points, size) slices for x and y axes
+    x_axes = gaussian[idx[:, 0]]
+    y_axes = gaussian[idx[:, 1]]
+    return np.max(y_axes[:, :, np.newaxis] * x_axes[:, np.newaxis, :], axis=0)
+
+def get_bounding_box(points, image_shape):
+    """(xtl, ytl, xbr, ybr) of the points with padding inside the image"""
+    xtl, ytl = points.min(axis=0)
+    xbr, ybr = points.max(axis=0)
+    return (
+        max(xtl - PADDING, 0),
+        max(ytl - PADDING, 0),
+        min(xbr + PADDING, image_shape[1] - 1),
+        min(ybr + PADDING, image_shape[0] - 1),
+    )
+
+def make_input(image, points):
+    """Return the (1, 4, SIZE, SIZE) network input for the RGB image and
+    the extreme points ([{"x": ..., "y": ...}, ...]) and the bounding box
+    of the crop of the image which is passed into the network"""
+    points = np.asarray([[int(p["x"]), int(p["y"])] for p in points], dtype=int)
+    bounding_box = get_bounding_box(points, image.shape)
+    cropped = image[bounding_box[1]:bounding_box[3],
+        bounding_box[0]:bounding_box[2]]
+
+    # The image and the heatmap are written directly into CHW planes
+    blob = np.empty((1, 4, SIZE, SIZE), dtype=np.float32)
+    resized = cv2.resize(cropped, (SIZE, SIZE), interpolation=cv2.INTER_CUBIC)
+    blob[0, :3] = resized.transpose((2, 0, 1))
+
+    points = points - points.min(axis=0) + PADDING
+    points = (points * [SIZE / cropped.shape[1], SIZE / cropped.shape[0]]).astype(int)
+    heatmap = make_heatmap(points)
+    cv2.normalize(heatmap, heatmap, 0, 255, cv2.NORM_MINMAX)
+    blob[0, 3] = heatmap
+
+    return blob, bounding_box
+
+def make_polygon(pred, bounding_box):
+    """Return the polygon ("x1,y1 x2,y2 ...") of the biggest object of the
+    (SIZE, SIZE) network output in coordinates of the image. The mask is
+    made only for the crop of the bounding box."""
+    width = bounding_box[2] - bounding_box[0]
+    height = bounding_box[3] - bounding_box[1]
+    pred = cv2.resize(pred, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    # One pixel of background around the crop, so contours which touch
+    # the crop border are closed in the same way as in the whole image
+    mask = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    mask[1:-1, 1:-1] = pred > THRESHOLD
+    # OpenCV 3 returns (image, contours, hierarchy), OpenCV 4 (contours, hierarchy)
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_TC89_KCOS,
+        offset=(int(bounding_box[0]) - 1, int(bounding_box[1]) - 1))[-2]
+
+    contour = max(contours, key=lambda arr: arr.size).reshape(-1, 2) \
+        if contours else np.empty((0, 2), dtype=int)
+    if len(contour) < 3:
+        raise Exception('Less then three point have been detected. Can not build a polygon.')
+
+    return " ".join("{},{}".format(x, y) for x, y in contour.tolist())
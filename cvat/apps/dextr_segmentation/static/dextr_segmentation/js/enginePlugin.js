@@ -137,61 +137,59 @@ window.addEventListener('DOMContentLoaded', () => {
                     const area = polybox.width * polybox.height;
 
                     if (area > AREA_TRESHOLD) {
+                        const onError = (errorData) => {
+                            dextrOverlay.addClass('hidden');
+                            const message = `Can not segment the object. Code: ${errorData.status}.`
+                                + ` Message: ${errorData.responseText || errorData.statusText}`;
+                            showMessage(message);
+                        };
+
+                        const onStatus = (jobData) => {
+                            if (['queued', 'started'].includes(jobData.status)) {
+                                if (jobData.status === 'queued') {
+                                    dextrCancelButton.prop('disabled', false);
+                                }
+                                setTimeout(() => {
+                                    $.ajax({
+                                        url: `/dextr/check/${window.cvat.job.id}`,
+                                        type: 'GET',
+                                        success: onStatus,
+                                        error: onError,
+                                    });
+                                }, 1000);
+                            } else {
+                                dextrOverlay.addClass('hidden');
+                                if (jobData.status === 'finished') {
+                                    if (jobData.result) {
+                                        instance._controller.finish({ points: jobData.result }, 'polygon');
+                                    }
+                                } else if (jobData.status === 'failed') {
+                                    const message = `Segmentation has fallen. Error: '${jobData.stderr}'`;
+                                    showMessage(message);
+                                } else {
+                                    let message = `Check segmentation request returned "${jobData.status}" status.`;
+                                    if (jobData.stderr) {
+                                        message += ` Error: ${jobData.stderr}`;
+                                    }
+                                    showMessage(message);
+                                }
+                            }
+                        };
+
+                        // The server waits for the polygon and replies with it at once,
+                        // the request is checked periodically only if it takes too long
+                        dextrCancelButton.prop('disabled', true);
+                        dextrOverlay.removeClass('hidden');
                         $.ajax({
-                            url: `/dextr/create/${window.cvat.job.id}`,
+                            url: `/dextr/segment/${window.cvat.job.id}`,
                             type: 'POST',
                             data: JSON.stringify({
                                 frame: window.cvat.player.frames.current,
                                 points: actualPoints,
                             }),
                             contentType: 'application/json',
-                            success: () => {
-                                function intervalCallback() {
-                                    $.ajax({
-                                        url: `/dextr/check/${window.cvat.job.id}`,
-                                        type: 'GET',
-                                        success: (jobData) => {
-                                            if (['queued', 'started'].includes(jobData.status)) {
-                                                if (jobData.status === 'queued') {
-                                                    dextrCancelButton.prop('disabled', false);
-                                                }
-                                                setTimeout(intervalCallback, 1000);
-                                            } else {
-                                                dextrOverlay.addClass('hidden');
-                                                if (jobData.status === 'finished') {
-                                                    if (jobData.result) {
-                                                        instance._controller.finish({ points: jobData.result }, 'polygon');
-                                                    }
-                                                } else if (jobData.status === 'failed') {
-                                                    const message = `Segmentation has fallen. Error: '${jobData.stderr}'`;
-                                                    showMessage(message);
-                                                } else {
-                                                    let message = `Check segmentation request returned "${jobData.status}" status.`;
-                                                    if (jobData.stderr) {
-                                                        message += ` Error: ${jobData.stderr}`;
-                                                    }
-                                                    showMessage(message);
-                                                }
-                                            }
-                                        },
-                                        error: (errorData) => {
-                                            dextrOverlay.addClass('hidden');
-                                            const message = `Can not check segmentation. Code: ${errorData.status}.`
-                                                + ` Message: ${errorData.responseText || errorData.statusText}`;
-                                            showMessage(message);
-                                        },
-                                    });
-                                }
-
-                                dextrCancelButton.prop('disabled', true);
-                                dextrOverlay.removeClass('hidden');
-                                setTimeout(intervalCallback, 1000);
-                            },
-                            error: (errorData) => {
-                                const message = `Can not cancel ReID process. Code: ${errorData.status}.`
-                                    + ` Message: ${errorData.responseText || errorData.statusText}`;
-                                showMessage(message);
-                            },
+                            success: onStatus,
+                            error: onError,
                         });
                     }
 
@@ -8,5 +8,6 @@ from . import views
 urlpatterns = [
     path('create/<int:jid>', views.create),
     path('cancel/<int:jid>', views.cancel),
-    path('check/<int:jid>', views.check)
+    path('check/<int:jid>', views.check),
+    path('segment/<int:jid>', views.segment),
 ]
\ No newline at end of file
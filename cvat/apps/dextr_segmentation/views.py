@@ -2,26 +2,118 @@
 #
 # SPDX-License-Identifier: MIT
 
+from django.conf import settings
 from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from cvat.apps.authentication.decorators import login_required
 from rules.contrib.views import permission_required, objectgetter
 
-from cvat.apps.engine.models import Job
+from cvat.apps.engine.frames import open_frame
+from cvat.apps.engine.models import Job, Task
 from cvat.apps.engine.log import slogger
 from cvat.apps.dextr_segmentation.dextr import DEXTR_HANDLER
+from cvat.apps.dextr_segmentation.latency import LatencyStats
 
+from datetime import datetime
 import django_rq
 import json
-import os
+import numpy as np
 import rq
+import time
+from rq.exceptions import NoSuchJobError
+from PIL import Image
 
-__RQ_QUEUE_NAME = "default"
-__DEXTR_HANDLER = DEXTR_HANDLER()
+__RQ_QUEUE_NAME = "dextr"
+__DEXTR_HANDLER = DEXTR_HANDLER(settings.DEXTR_FRAME_CACHE_SIZE)
+# Latencies of requests in the worker and of segment requests in the server
+__WORKER_LATENCY = LatencyStats("dextr worker")
+__SERVER_LATENCY = LatencyStats("dextr segment")
 
-def _dextr_thread(im_path, points):
+def _get_result_key(rq_id):
+    return "dextr.result/{}".format(rq_id)
+
+def _read_image(tid, frame):
+    db_task = Task.objects.get(pk=tid)
+    with open_frame(db_task, frame) as frame_file:
+        return np.array(Image.open(frame_file).convert("RGB"))
+
+def _dextr_thread(tid, frame, points):
     job = rq.get_current_job()
-    job.meta["result"] = __DEXTR_HANDLER.handle(im_path, points)
-    job.save_meta()
+    queued = (datetime.utcnow() - job.enqueued_at).total_seconds()
+    start = time.perf_counter()
+    reply = {"status": "failed", "stderr": "Segmentation was interrupted"}
+    try:
+        image = __DEXTR_HANDLER.get_image((tid, frame),
+            lambda: _read_image(tid, frame))
+        image_loaded = time.perf_counter()
+        job.meta["result"] = __DEXTR_HANDLER.handle(image, points)
+        job.save_meta()
+        reply = {"status": "finished", "result": job.meta["result"]}
+    except Exception as ex:
+        reply["stderr"] = str(ex)
+        raise
+    finally:
+        # The segment request waits for the reply in this list
+        result_key = _get_result_key(job.id)
+        job.connection.rpush(result_key, json.dumps(reply))
+        job.connection.expire(result_key, 30)
+
+    finished = time.perf_counter()
+    __WORKER_LATENCY.add(queue=queued, frame=image_loaded - start,
+        segmentation=finished - image_loaded, total=finished - start)
+
+def _enqueue(request, jid):
+    data = json.loads(request.body.decode("utf-8"))
+
+    points = data["points"]
+    frame = int(data["frame"])
+    username = request.user.username
+
+    slogger.job[jid].info("create dextr request for the JOB: {} ".format(jid)
+        + "by the USER: {} on the FRAME: {}".format(username, frame))
+
+    db_task = Job.objects.select_related("segment__task").get(id=jid).segment.task
+
+    queue = django_rq.get_queue(__RQ_QUEUE_NAME)
+    rq_id = "dextr.create/{}/{}".format(jid, username)
+    job = queue.fetch_job(rq_id)
+
+    if job is not None and (job.is_started or job.is_queued):
+        if "cancel" not in job.meta:
+            raise Exception("Segmentation process has been already run for the " +
+                "JOB: {} and the USER: {}".format(jid, username))
+        else:
+            job.delete()
+
+    # A reply of a previous request mustn't be taken for this one
+    queue.connection.delete(_get_result_key(rq_id))
+    return queue.enqueue_call(func=_dextr_thread,
+        args=(db_task.id, frame, points),
+        job_id=rq_id,
+        timeout=15,
+        ttl=30,
+        result_ttl=30)
+
+def _get_status(job):
+    data = {}
+    if job is None:
+        data["status"] = "unknown"
+    else:
+        if "cancel" in job.meta:
+            data["status"] = "finished"
+        elif job.is_queued:
+            data["status"] = "queued"
+        elif job.is_started:
+            data["status"] = "started"
+        elif job.is_finished:
+            data["status"] = "finished"
+            data["result"] = job.meta["result"]
+            job.delete()
+        else:
+            data["status"] = "failed"
+            data["stderr"] = job.exc_info
+            job.delete()
+
+    return data
 
 
 @login_required
@@ -29,34 +121,7 @@ def _dextr_thread(im_path, points):
     fn=objectgetter(Job, "jid"), raise_exception=True)
 def create(request, jid):
     try:
-        data = json.loads(request.body.decode("utf-8"))
-
-        points = data["points"]
-        frame = int(data["frame"])
-        username = request.user.username
-
-        slogger.job[jid].info("create dextr request for the JOB: {} ".format(jid)
-            + "by the USER: {} on the FRAME: {}".format(username, frame))
-
-        db_task = Job.objects.select_related("segment__task").get(id=jid).segment.task
-        im_path = os.path.realpath(db_task.get_frame_path(frame))
-
-        queue = django_rq.get_queue(__RQ_QUEUE_NAME)
-        rq_id = "dextr.create/{}/{}".format(jid, username)
-        job = queue.fetch_job(rq_id)
-
-        if job is not None and (job.is_started or job.is_queued):
-            if "cancel" not in job.meta:
-                raise Exception("Segmentation process has been already run for the " +
-                    "JOB: {} and the USER: {}".format(jid, username))
-            else:
-                job.delete()
-
-        queue.enqueue_call(func=_dextr_thread,
-            args=(im_path, points),
-            job_id=rq_id,
-            timeout=15,
-            ttl=30)
+        _enqueue(request, jid)
 
         return HttpResponse()
     except Exception as ex:
@@ -101,27 +166,42 @@ def check(request, jid):
         queue = django_rq.get_queue(__RQ_QUEUE_NAME)
         rq_id = "dextr.create/{}/{}".format(jid, username)
         job = queue.fetch_job(rq_id)
-        data = {}
+        data = _get_status(job)
+
+        return JsonResponse(data)
+    except Exception as ex:
+        slogger.job[jid].error("can't check a dextr request for the job {}".format(jid), exc_info=True)
+        return HttpResponseBadRequest(str(ex))
+
 
-        if job is None:
-            data["status"] = "unknown"
+@login_required
+@permission_required(perm=["engine.job.change"],
+    fn=objectgetter(Job, "jid"), raise_exception=True)
+def segment(request, jid):
+    """Create a request and wait for its result up to DEXTR_WAIT_TIMEOUT
+    seconds. The reply is the same as of check, if the result isn't ready,
+    the status is "queued" or "started" and the client should call check."""
+    start = time.perf_counter()
+    try:
+        job = _enqueue(request, jid)
+        reply = job.connection.blpop(_get_result_key(job.id),
+            timeout=settings.DEXTR_WAIT_TIMEOUT)
+        try:
+            job.refresh()
+        except NoSuchJobError:
+            # The job has expired or has been replaced by a next request of
+            # the user. The client gets the actual status by check.
+            job = None
+
+        if reply is not None and (job is None or "cancel" not in job.meta):
+            data = json.loads(reply[1].decode("utf-8"))
+        elif job is not None:
+            data = _get_status(job)
         else:
-            if "cancel" in job.meta:
-                data["status"] = "finished"
-            elif job.is_queued:
-                data["status"] = "queued"
-            elif job.is_started:
-                data["status"] = "started"
-            elif job.is_finished:
-                data["status"] = "finished"
-                data["result"] = job.meta["result"]
-                job.delete()
-            else:
-                data["status"] = "failed"
-                data["stderr"] = job.exc_info
-                job.delete()
+            data = {"status": "started"}
 
+        __SERVER_LATENCY.add(total=time.perf_counter() - start)
         return JsonResponse(data)
     except Exception as ex:
-        slogger.job[jid].error("can't check a dextr request for the job {}".format(jid), exc_info=True)
+        slogger.job[jid].error("can't segment by dextr for the job {}".format(jid), exc_info=True)
         return HttpResponseBadRequest(str(ex))
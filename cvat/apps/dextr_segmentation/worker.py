@@ -0,0 +1,17 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from cvat.apps.engine.log import slogger
+from cvat.apps.engine.worker import SimpleWorker
+from cvat.apps.dextr_segmentation.dextr import DEXTR_HANDLER
+
+
+class DextrWorker(SimpleWorker):
+    """The network and decoded frames are kept between DEXTR requests
+    (see SimpleWorker). The network is loaded before the first request."""
+    def work(self, *args, **kwargs):
+        # Handlers share the loaded network (see network_registry)
+        DEXTR_HANDLER().load_network()
+        slogger.glob.info("dextr network is loaded")
+        return super().work(*args, **kwargs)
@@ -3,13 +3,19 @@
 # SPDX-License-Identifier: MIT
 
 import os
+import json
+import zlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from collections import OrderedDict
 from django.utils import timezone
 from PIL import Image
 
 from django.conf import settings
-from django.db import transaction
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Max
 
 from cvat.apps.profiler import silk_profile
 from cvat.apps.engine.plugins import plugin_decorator
@@ -37,7 +43,7 @@ class PatchAction(str, Enum):
 @silk_profile(name="GET job data")
 @transaction.atomic
 def get_job_data(pk, user):
-    annotation = JobAnnotation(pk, user)
+    annotation = JobAnnotation(pk, user, read_only=True)
     annotation.init_from_db()
 
     return annotation.data
@@ -116,32 +122,116 @@ def delete_task_data(pk, user):
     annotation.delete()
 
 def dump_task_data(pk, user, filename, dumper, scheme, host):
-    # For big tasks dump function may run for a long time and
-    # we dont need to acquire lock after _AnnotationForTask instance
-    # has been initialized from DB.
+    # For big tasks dump function may run for a long time. Annotations are
+    # read job by job while they are written into the file without locks
+    # (see TaskAnnotation.iter_from_db and JobAnnotation.init_from_db).
     # But there is the bug with corrupted dump file in case 2 or more dump request received at the same time.
     # https://github.com/opencv/cvat/issues/217
-    with transaction.atomic():
-        annotation = TaskAnnotation(pk, user)
-        annotation.init_from_db()
-
+    annotation = TaskAnnotation(pk, user)
     annotation.dump(filename, dumper, scheme, host)
 
+class _CopyStream:
+    """File-like object for COPY ... FROM STDIN. Model instances are encoded
+    into rows of the text format on demand, so all rows aren't kept in
+    memory at the same time."""
+    _escapes = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+    def __init__(self, fields, objects):
+        self._fields = fields
+        self._objects = iter(objects)
+        self._data = ""
+
+    @classmethod
+    def _encode(cls, value):
+        if value is None:
+            return "\\N"
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, (bytes, memoryview)):
+            return "\\\\x" + bytes(value).hex()
+        return str(value).translate(cls._escapes)
+
+    def _encode_row(self, obj):
+        return "\t".join(self._encode(field.get_prep_value(getattr(obj, field.attname)))
+            for field in self._fields) + "\n"
+
+    def read(self, size=-1):
+        rows = [self._data]
+        length = len(self._data)
+        while size < 0 or length < size:
+            obj = next(self._objects, None)
+            if obj is None:
+                break
+            rows.append(self._encode_row(obj))
+            length += len(rows[-1])
+        data = "".join(rows)
+        if size < 0:
+            size = len(data)
+        self._data = data[size:]
+
+        return data[:size]
+
+def _is_copy_enabled(count):
+    return 'postgresql' in settings.DATABASES["default"]["ENGINE"] and \
+        settings.ANNOTATION_COPY_MIN_OBJECTS is not None and \
+        count >= settings.ANNOTATION_COPY_MIN_OBJECTS
+
+def copy_create(db_model, objects, count=None):
+    """Insert objects by COPY ... FROM STDIN (PostgreSQL only) and return
+    their ids. Ids are reserved in the sequence of the table before, so they
+    don't need to be fetched back like for INSERT. objects can be a generator
+    of count objects, then they are made while the stream is read and all of
+    them aren't kept in memory."""
+    if count is None:
+        count = len(objects)
+    db_table = db_model._meta.db_table
+    fields = db_model._meta.concrete_fields
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)", [db_table, count])
+        ids = [obj_id for obj_id, in cursor.fetchall()]
+
+        written = []
+        def _set_ids():
+            for obj, obj_id in zip(objects, ids):
+                obj.id = obj_id
+                written.append(obj_id)
+                yield obj
+
+        cursor.copy_expert("COPY {} ({}) FROM STDIN".format(
+            connection.ops.quote_name(db_table),
+            ", ".join(connection.ops.quote_name(field.column) for field in fields)),
+            _CopyStream(fields, _set_ids()))
+        if len(written) != count:
+            raise ValueError("{} objects are written instead of {}".format(
+                len(written), count))
+
+    return ids
+
 def bulk_create(db_model, objects, flt_param):
     if objects:
-        if flt_param:
-            if 'postgresql' in settings.DATABASES["default"]["ENGINE"]:
-                return db_model.objects.bulk_create(objects)
-            else:
-                ids = list(db_model.objects.filter(**flt_param).values_list('id', flat=True))
-                db_model.objects.bulk_create(objects)
+        if 'postgresql' in settings.DATABASES["default"]["ENGINE"]:
+            if _is_copy_enabled(len(objects)):
+                copy_create(db_model, objects)
+                return objects
+            return db_model.objects.bulk_create(objects)
+        elif flt_param:
+            ids = list(db_model.objects.filter(**flt_param).values_list('id', flat=True))
+            db_model.objects.bulk_create(objects)
 
-                return list(db_model.objects.exclude(id__in=ids).filter(**flt_param))
+            return list(db_model.objects.exclude(id__in=ids).filter(**flt_param))
         else:
             return db_model.objects.bulk_create(objects)
 
     return []
 
+def create_objects(db_model, objects, count, flt_param):
+    """Insert count objects of the iterable and return their ids in the same
+    order. The objects are consumed lazily if they are inserted by COPY."""
+    if _is_copy_enabled(count):
+        return copy_create(db_model, objects, count)
+    return [db_obj.id for db_obj in bulk_create(db_model, list(objects), flt_param)]
+
 def _merge_table_rows(rows, keys_for_merge, field_id):
     """dot.notation access to dictionary attributes"""
     from collections import OrderedDict
@@ -179,11 +269,43 @@ def _merge_table_rows(rows, keys_for_merge, field_id):
 
     return list(merged_rows.values())
 
+def _read_table_rows(rows, fields):
+    """Convert flat value tuples into dictionaries with the given keys"""
+    return [dict(zip(fields, row)) for row in rows.iterator()]
+
+def _group_table_rows(rows, fields):
+    """Group flat value tuples by their first column (e.g. a foreign key).
+    It keeps the order of rows inside of each group."""
+    groups = {}
+    for row in rows.iterator():
+        item = dict(zip(fields, row[1:]))
+        if row[0] in groups:
+            groups[row[0]].append(item)
+        else:
+            groups[row[0]] = [item]
+
+    return groups
+
+def _read_packed_points(db_shape):
+    """Replace text points of a shape row by packed ones if they are present"""
+    packed_points = db_shape.pop('packed_points')
+    if packed_points is not None:
+        db_shape['points'] = packed_points
+
 class JobAnnotation:
-    def __init__(self, pk, user):
+    # Number of attempts to read a job without the lock while it is changed
+    _READ_ATTEMPTS = 3
+
+    def __init__(self, pk, user, read_only=False):
+        """Mutations need the row lock of the job to be serialized. A read-only
+        instance doesn't take the lock and checks that the job wasn't changed
+        while it was read (see init_from_db)."""
         self.user = user
-        self.db_job = models.Job.objects.select_related('segment__task') \
-            .select_for_update().get(id=pk)
+        self.read_only = read_only
+        db_jobs = models.Job.objects.select_related('segment__task')
+        if not read_only:
+            db_jobs = db_jobs.select_for_update()
+        self.db_job = db_jobs.get(id=pk)
 
         db_segment = self.db_job.segment
         self.start_frame = db_segment.start_frame
@@ -213,173 +335,301 @@ class JobAnnotation:
     def reset(self):
         self.ir_data.reset()
 
-    def _save_tracks_to_db(self, tracks):
-        db_tracks = []
-        db_track_attrvals = []
-        db_shapes = []
-        db_shape_attrvals = []
+    def _check_label(self, label_id):
+        if label_id not in self.db_labels:
+            raise AttributeError("label_id `{}` is invalid".format(label_id))
+
+    def _save_attributes_to_db(self, db_model, field_id, objects, spec_type=None):
+        """Insert attributes of objects ((id, label_id, attributes) items).
+        Attributes are checked against the spec_type attributes of the label
+        if it is given."""
+        def _make_attrvals():
+            for obj_id, label_id, attributes in objects:
+                for attr in attributes:
+                    db_attrval = db_model(**attr)
+                    setattr(db_attrval, field_id, obj_id)
+                    if spec_type is not None and db_attrval.spec_id not in \
+                            self.db_attributes[label_id][spec_type]:
+                        raise AttributeError("spec_id `{}` is invalid".format(db_attrval.spec_id))
+                    yield db_attrval
+
+        create_objects(db_model, _make_attrvals(),
+            sum(len(attributes) for _, _, attributes in objects), flt_param={})
+
+    def _save_tracked_shapes_to_db(self, shapes, label_ids=None):
+        """Insert shapes of tracks, track_id of every shape is set. Their
+        attributes are checked if label_ids (of every shape) are given."""
+        def _make_shapes():
+            for shape in shapes:
+                # FIXME: need to clamp points (be sure that all of them inside the image)
+                # Should we check here or implement a validator?
+                db_shape = models.TrackedShape(**{key: value
+                    for key, value in shape.items() if key != "attributes"})
+                db_shape.set_points(shape["points"])
+                yield db_shape
+
+        shape_ids = create_objects(models.TrackedShape, _make_shapes(), len(shapes),
+            flt_param={"track__job_id": self.db_job.id})
+        for shape, shape_id in zip(shapes, shape_ids):
+            shape["id"] = shape_id
+
+        self._save_attributes_to_db(models.TrackedShapeAttributeVal, 'shape_id',
+            [(shape["id"], label_id, shape.setdefault("attributes", []))
+                for shape, label_id in zip(shapes, label_ids or [None] * len(shapes))],
+            "mutable" if label_ids else None)
 
+    def _save_tracks_to_db(self, tracks):
+        def _make_tracks():
+            for track in tracks:
+                db_track = models.LabeledTrack(job=self.db_job, **{key: value
+                    for key, value in track.items() if key not in ("attributes", "shapes")})
+                self._check_label(db_track.label_id)
+                yield db_track
+
+        track_ids = create_objects(models.LabeledTrack, _make_tracks(), len(tracks),
+            flt_param={"job_id": self.db_job.id})
+        for track, track_id in zip(tracks, track_ids):
+            track["id"] = track_id
+
+        self._save_attributes_to_db(models.LabeledTrackAttributeVal, 'track_id',
+            [(track["id"], track["label_id"], track.setdefault("attributes", []))
+                for track in tracks],
+            "immutable")
+
+        shapes = []
+        label_ids = []
         for track in tracks:
-            track_attributes = track.pop("attributes", [])
-            shapes = track.pop("shapes")
-            db_track = models.LabeledTrack(job=self.db_job, **track)
-            if db_track.label_id not in self.db_labels:
-                raise AttributeError("label_id `{}` is invalid".format(db_track.label_id))
-
-            for attr in track_attributes:
-                db_attrval = models.LabeledTrackAttributeVal(**attr)
-                if db_attrval.spec_id not in self.db_attributes[db_track.label_id]["immutable"]:
-                    raise AttributeError("spec_id `{}` is invalid".format(db_attrval.spec_id))
-                db_attrval.track_id = len(db_tracks)
-                db_track_attrvals.append(db_attrval)
+            for shape in track["shapes"]:
+                shape["track_id"] = track["id"]
+                shapes.append(shape)
+                label_ids.append(track["label_id"])
+        self._save_tracked_shapes_to_db(shapes, label_ids)
+        for shape in shapes:
+            del shape["track_id"]
 
+        self.ir_data.tracks = tracks
+
+    def _save_shapes_to_db(self, shapes):
+        def _make_shapes():
             for shape in shapes:
-                shape_attributes = shape.pop("attributes", [])
                 # FIXME: need to clamp points (be sure that all of them inside the image)
                 # Should we check here or implement a validator?
-                db_shape = models.TrackedShape(**shape)
-                db_shape.track_id = len(db_tracks)
+                db_shape = models.LabeledShape(job=self.db_job, **{key: value
+                    for key, value in shape.items() if key != "attributes"})
+                db_shape.set_points(shape["points"])
+                self._check_label(db_shape.label_id)
+                yield db_shape
+
+        shape_ids = create_objects(models.LabeledShape, _make_shapes(), len(shapes),
+            flt_param={"job_id": self.db_job.id})
+        for shape, shape_id in zip(shapes, shape_ids):
+            shape["id"] = shape_id
+
+        self._save_attributes_to_db(models.LabeledShapeAttributeVal, 'shape_id',
+            [(shape["id"], shape["label_id"], shape.setdefault("attributes", []))
+                for shape in shapes],
+            "all")
 
-                for attr in shape_attributes:
-                    db_attrval = models.TrackedShapeAttributeVal(**attr)
-                    if db_attrval.spec_id not in self.db_attributes[db_track.label_id]["mutable"]:
-                        raise AttributeError("spec_id `{}` is invalid".format(db_attrval.spec_id))
-                    db_attrval.shape_id = len(db_shapes)
-                    db_shape_attrvals.append(db_attrval)
+        self.ir_data.shapes = shapes
+
+    def _save_tags_to_db(self, tags):
+        def _make_tags():
+            for tag in tags:
+                db_tag = models.LabeledImage(job=self.db_job, **{key: value
+                    for key, value in tag.items() if key != "attributes"})
+                self._check_label(db_tag.label_id)
+                yield db_tag
+
+        tag_ids = create_objects(models.LabeledImage, _make_tags(), len(tags),
+            flt_param={"job_id": self.db_job.id})
+        for tag, tag_id in zip(tags, tag_ids):
+            tag["id"] = tag_id
+
+        self._save_attributes_to_db(models.LabeledImageAttributeVal, 'image_id',
+            [(tag["id"], tag["label_id"], tag.setdefault("attributes", []))
+                for tag in tags],
+            "all")
 
-                db_shapes.append(db_shape)
-                shape["attributes"] = shape_attributes
+        self.ir_data.tags = tags
 
-            db_tracks.append(db_track)
-            track["attributes"] = track_attributes
-            track["shapes"] = shapes
+    def _check_attributes(self, label_id, attributes, spec_type):
+        if label_id not in self.db_labels:
+            raise AttributeError("label_id `{}` is invalid".format(label_id))
+        for attr in attributes:
+            if attr["spec_id"] not in self.db_attributes[label_id][spec_type]:
+                raise AttributeError("spec_id `{}` is invalid".format(attr["spec_id"]))
 
-        db_tracks = bulk_create(
-            db_model=models.LabeledTrack,
-            objects=db_tracks,
-            flt_param={"job_id": self.db_job.id}
-        )
+    @staticmethod
+    def _update_objects_in_db(db_model, objects, fields, flt_param):
+        """Write changed fields of stored objects with one bulk_update. Objects
+        which are absent in DB get id=None and are returned to be created."""
+        ids = [obj["id"] for obj in objects if obj["id"] is not None]
+        db_objects = db_model.objects.filter(**flt_param).in_bulk(ids)
+
+        new_objects = []
+        changed_objects = []
+        changed_fields = set()
+        for obj in objects:
+            db_obj = db_objects.get(obj["id"])
+            if db_obj is None:
+                obj["id"] = None
+                new_objects.append(obj)
+                continue
+
+            obj_changed_fields = [field for field in fields
+                if field != 'points' and getattr(db_obj, field) != obj[field]]
+            for field in obj_changed_fields:
+                setattr(db_obj, field, obj[field])
+            if 'points' in fields and not db_obj.has_points(obj['points']):
+                db_obj.set_points(obj['points'])
+                obj_changed_fields.extend(['points', 'packed_points'])
+            if obj_changed_fields:
+                changed_objects.append(db_obj)
+                changed_fields.update(obj_changed_fields)
+
+        if changed_objects:
+            db_model.objects.bulk_update(changed_objects, sorted(changed_fields))
+
+        return new_objects
 
-        for db_attrval in db_track_attrvals:
-            db_attrval.track_id = db_tracks[db_attrval.track_id].id
-        bulk_create(
-            db_model=models.LabeledTrackAttributeVal,
-            objects=db_track_attrvals,
-            flt_param={}
+    @staticmethod
+    def _update_attributes_in_db(db_model, field_id, attributes):
+        """Synchronize attribute values of stored objects (a dictionary
+        object id -> list of attributes). Only changed rows are touched."""
+        db_attrvals = _group_table_rows(
+            rows=db_model.objects.filter(**{field_id + "__in": list(attributes)}) \
+                .values_list(field_id, 'id', 'spec_id', 'value'),
+            fields=('id', 'spec_id', 'value'),
         )
 
-        for db_shape in db_shapes:
-            db_shape.track_id = db_tracks[db_shape.track_id].id
+        created_attrvals = []
+        changed_attrvals = []
+        deleted_attrvals = []
+        for obj_id, obj_attributes in attributes.items():
+            db_obj_attrvals = {db_attrval["spec_id"]: db_attrval
+                for db_attrval in db_attrvals.get(obj_id, [])}
+            for attr in obj_attributes:
+                db_attrval = db_obj_attrvals.pop(attr["spec_id"], None)
+                if db_attrval is None:
+                    created_attrvals.append(db_model(**attr, **{field_id: obj_id}))
+                elif db_attrval["value"] != attr["value"]:
+                    changed_attrvals.append(db_model(id=db_attrval["id"],
+                        value=attr["value"]))
+            deleted_attrvals.extend(db_attrval["id"]
+                for db_attrval in db_obj_attrvals.values())
+
+        if deleted_attrvals:
+            db_model.objects.filter(id__in=deleted_attrvals).delete()
+        if changed_attrvals:
+            db_model.objects.bulk_update(changed_attrvals, ['value'])
+        bulk_create(db_model=db_model, objects=created_attrvals, flt_param={})
+
+    def _update_tags_in_db(self, tags):
+        for tag in tags:
+            self._check_attributes(tag["label_id"], tag["attributes"], "all")
 
-        db_shapes = bulk_create(
-            db_model=models.TrackedShape,
-            objects=db_shapes,
-            flt_param={"track__job_id": self.db_job.id}
-        )
+        new_tags = self._update_objects_in_db(models.LabeledImage, tags,
+            fields=('frame', 'label_id', 'group'),
+            flt_param={"job_id": self.db_job.id})
+        self._update_attributes_in_db(models.LabeledImageAttributeVal, 'image_id',
+            {tag["id"]: tag["attributes"] for tag in tags if tag["id"] is not None})
+        self._save_tags_to_db(new_tags)
 
-        for db_attrval in db_shape_attrvals:
-            db_attrval.shape_id = db_shapes[db_attrval.shape_id].id
+        self.ir_data.tags = tags
 
-        bulk_create(
-            db_model=models.TrackedShapeAttributeVal,
-            objects=db_shape_attrvals,
-            flt_param={}
-        )
+    def _update_shapes_in_db(self, shapes):
+        for shape in shapes:
+            self._check_attributes(shape["label_id"], shape["attributes"], "all")
 
-        shape_idx = 0
-        for track, db_track in zip(tracks, db_tracks):
-            track["id"] = db_track.id
+        new_shapes = self._update_objects_in_db(models.LabeledShape, shapes,
+            fields=('frame', 'label_id', 'group', 'type', 'occluded', 'z_order',
+                'points'),
+            flt_param={"job_id": self.db_job.id})
+        self._update_attributes_in_db(models.LabeledShapeAttributeVal, 'shape_id',
+            {shape["id"]: shape["attributes"] for shape in shapes if shape["id"] is not None})
+        self._save_shapes_to_db(new_shapes)
+
+        self.ir_data.shapes = shapes
+
+    def _update_tracks_in_db(self, tracks):
+        for track in tracks:
+            self._check_attributes(track["label_id"], track["attributes"], "immutable")
             for shape in track["shapes"]:
-                shape["id"] = db_shapes[shape_idx].id
-                shape_idx += 1
+                self._check_attributes(track["label_id"], shape["attributes"], "mutable")
 
-        self.ir_data.tracks = tracks
+        new_tracks = self._update_objects_in_db(models.LabeledTrack, tracks,
+            fields=('frame', 'label_id', 'group'),
+            flt_param={"job_id": self.db_job.id})
+        for track in new_tracks:
+            for shape in track["shapes"]:
+                shape["id"] = None
 
-    def _save_shapes_to_db(self, shapes):
-        db_shapes = []
-        db_attrvals = []
+        stored_tracks = [track for track in tracks if track["id"] is not None]
+        self._update_attributes_in_db(models.LabeledTrackAttributeVal, 'track_id',
+            {track["id"]: track["attributes"] for track in stored_tracks})
 
+        shapes = []
+        for track in stored_tracks:
+            for shape in track["shapes"]:
+                shape["track_id"] = track["id"]
+                shapes.append(shape)
+
+        # Keyframes which are absent in the request were removed by the user
+        models.TrackedShape.objects \
+            .filter(track_id__in=[track["id"] for track in stored_tracks]) \
+            .exclude(id__in=[shape["id"] for shape in shapes if shape["id"] is not None]) \
+            .delete()
+
+        new_shapes = self._update_objects_in_db(models.TrackedShape, shapes,
+            fields=('track_id', 'frame', 'type', 'occluded', 'z_order', 'points',
+                'outside'),
+            flt_param={"track__job_id": self.db_job.id})
+        self._update_attributes_in_db(models.TrackedShapeAttributeVal, 'shape_id',
+            {shape["id"]: shape["attributes"] for shape in shapes if shape["id"] is not None})
+        self._save_tracked_shapes_to_db(new_shapes)
         for shape in shapes:
-            attributes = shape.pop("attributes", [])
-            # FIXME: need to clamp points (be sure that all of them inside the image)
-            # Should we check here or implement a validator?
-            db_shape = models.LabeledShape(job=self.db_job, **shape)
-            if db_shape.label_id not in self.db_labels:
-                raise AttributeError("label_id `{}` is invalid".format(db_shape.label_id))
-
-            for attr in attributes:
-                db_attrval = models.LabeledShapeAttributeVal(**attr)
-                if db_attrval.spec_id not in self.db_attributes[db_shape.label_id]["all"]:
-                    raise AttributeError("spec_id `{}` is invalid".format(db_attrval.spec_id))
-
-                db_attrval.shape_id = len(db_shapes)
-                db_attrvals.append(db_attrval)
-
-            db_shapes.append(db_shape)
-            shape["attributes"] = attributes
-
-        db_shapes = bulk_create(
-            db_model=models.LabeledShape,
-            objects=db_shapes,
-            flt_param={"job_id": self.db_job.id}
-        )
+            del shape["track_id"]
 
-        for db_attrval in db_attrvals:
-            db_attrval.shape_id = db_shapes[db_attrval.shape_id].id
+        self._save_tracks_to_db(new_tracks)
 
-        bulk_create(
-            db_model=models.LabeledShapeAttributeVal,
-            objects=db_attrvals,
-            flt_param={}
-        )
-
-        for shape, db_shape in zip(shapes, db_shapes):
-            shape["id"] = db_shape.id
+        self.ir_data.tracks = tracks
 
-        self.ir_data.shapes = shapes
+    def _update_in_db(self, data):
+        self.reset()
+        self._update_tags_in_db(data["tags"])
+        self._update_shapes_in_db(data["shapes"])
+        self._update_tracks_in_db(data["tracks"])
 
-    def _save_tags_to_db(self, tags):
-        db_tags = []
-        db_attrvals = []
+        return self.ir_data.tags or self.ir_data.shapes or self.ir_data.tracks
 
-        for tag in tags:
-            attributes = tag.pop("attributes", [])
-            db_tag = models.LabeledImage(job=self.db_job, **tag)
-            if db_tag.label_id not in self.db_labels:
-                raise AttributeError("label_id `{}` is invalid".format(db_tag.label_id))
-
-            for attr in attributes:
-                db_attrval = models.LabeledImageAttributeVal(**attr)
-                if db_attrval.spec_id not in self.db_attributes[db_tag.label_id]["all"]:
-                    raise AttributeError("spec_id `{}` is invalid".format(db_attrval.spec_id))
-                db_attrval.tag_id = len(db_tags)
-                db_attrvals.append(db_attrval)
-
-            db_tags.append(db_tag)
-            tag["attributes"] = attributes
-
-        db_tags = bulk_create(
-            db_model=models.LabeledImage,
-            objects=db_tags,
-            flt_param={"job_id": self.db_job.id}
-        )
+    def _get_cache_key(self, db_commit):
+        # The commit timestamp protects from stale entries if a database was
+        # recreated. Label attributes are a part of the key because their
+        # default values are inserted into annotations on reading.
+        specs = sorted((db_attr.id, db_attr.default_value)
+            for db_attributes in self.db_attributes.values()
+            for db_attr in db_attributes["all"].values())
+        specs_hash = hashlib.md5(str(specs).encode()).hexdigest()
 
-        for db_attrval in db_attrvals:
-            db_attrval.image_id = db_tags[db_attrval.tag_id].id
+        return "job:{}:{}:{}:{}".format(self.db_job.id, db_commit.version,
+            db_commit.timestamp.timestamp(), specs_hash)
 
-        bulk_create(
-            db_model=models.LabeledImageAttributeVal,
-            objects=db_attrvals,
-            flt_param={}
-        )
+    def _init_from_cache(self, db_commit):
+        data = caches["annotations"].get(self._get_cache_key(db_commit))
+        if data is None:
+            return False
 
-        for tag, db_tag in zip(tags, db_tags):
-            tag["id"] = db_tag.id
+        self.ir_data.data = json.loads(zlib.decompress(data).decode())
+        return True
 
-        self.ir_data.tags = tags
+    def _save_to_cache(self, db_commit):
+        data = zlib.compress(json.dumps(self.ir_data.data).encode())
+        caches["annotations"].set(self._get_cache_key(db_commit), data)
 
     def _commit(self):
         db_prev_commit = self.db_job.commits.last()
+        if db_prev_commit:
+            caches["annotations"].delete(self._get_cache_key(db_prev_commit))
         db_curr_commit = models.JobCommit()
         if db_prev_commit:
             db_curr_commit.version = db_prev_commit.version + 1
@@ -419,8 +669,12 @@ class JobAnnotation:
         self._commit()
 
     def update(self, data):
-        self._delete(data)
-        self._create(data)
+        # Stored objects are changed in place (their ids are kept). Only
+        # changed columns and attribute values are written, so the cost
+        # depends on the size of the request rather than the size of the job.
+        if self._update_in_db(data):
+            self._set_updated_date()
+            self.db_job.save()
         self._commit()
 
     def _delete(self, data=None):
@@ -460,7 +714,7 @@ class JobAnnotation:
 
     @staticmethod
     def _extend_attributes(attributeval_set, attribute_specs):
-        shape_attribute_specs_set = set(attr.spec_id for attr in attributeval_set)
+        shape_attribute_specs_set = set(attr["spec_id"] for attr in attributeval_set)
         for db_attr_spec in attribute_specs:
             if db_attr_spec.id not in shape_attribute_specs_set:
                 attributeval_set.append(OrderedDict([
@@ -469,157 +723,133 @@ class JobAnnotation:
                 ]))
 
     def _init_tags_from_db(self):
-        db_tags = self.db_job.labeledimage_set.prefetch_related(
-            "label",
-            "labeledimageattributeval_set"
-        ).values(
-            'id',
-            'frame',
-            'label_id',
-            'group',
-            'labeledimageattributeval__spec_id',
-            'labeledimageattributeval__value',
-            'labeledimageattributeval__id',
-        ).order_by('frame')
-
-        db_tags = _merge_table_rows(
-            rows=db_tags,
-            keys_for_merge={
-                "labeledimageattributeval_set": [
-                    'labeledimageattributeval__spec_id',
-                    'labeledimageattributeval__value',
-                    'labeledimageattributeval__id',
-                ],
-            },
-            field_id='id',
+        db_attrvals = _group_table_rows(
+            rows=models.LabeledImageAttributeVal.objects.filter(
+                image__job_id=self.db_job.id).values_list(
+                    'image_id', 'id', 'spec_id', 'value'),
+            fields=('id', 'spec_id', 'value'),
+        )
+
+        db_tags = _read_table_rows(
+            rows=self.db_job.labeledimage_set.values_list(
+                'id', 'frame', 'label_id', 'group').order_by('frame'),
+            fields=('id', 'frame', 'label_id', 'group'),
         )
 
         for db_tag in db_tags:
-            self._extend_attributes(db_tag.labeledimageattributeval_set,
-                self.db_attributes[db_tag.label_id]["all"].values())
+            db_tag["labeledimageattributeval_set"] = db_attrvals.pop(db_tag["id"], [])
+            self._extend_attributes(db_tag["labeledimageattributeval_set"],
+                self.db_attributes[db_tag["label_id"]]["all"].values())
 
         serializer = serializers.LabeledImageSerializer(db_tags, many=True)
         self.ir_data.tags = serializer.data
 
     def _init_shapes_from_db(self):
-        db_shapes = self.db_job.labeledshape_set.prefetch_related(
-            "label",
-            "labeledshapeattributeval_set"
-        ).values(
-            'id',
-            'label_id',
-            'type',
-            'frame',
-            'group',
-            'occluded',
-            'z_order',
-            'points',
-            'labeledshapeattributeval__spec_id',
-            'labeledshapeattributeval__value',
-            'labeledshapeattributeval__id',
-            ).order_by('frame')
-
-        db_shapes = _merge_table_rows(
-            rows=db_shapes,
-            keys_for_merge={
-                'labeledshapeattributeval_set': [
-                    'labeledshapeattributeval__spec_id',
-                    'labeledshapeattributeval__value',
-                    'labeledshapeattributeval__id',
-                ],
-            },
-            field_id='id',
+        db_attrvals = _group_table_rows(
+            rows=models.LabeledShapeAttributeVal.objects.filter(
+                shape__job_id=self.db_job.id).values_list(
+                    'shape_id', 'id', 'spec_id', 'value'),
+            fields=('id', 'spec_id', 'value'),
+        )
+
+        db_shapes = _read_table_rows(
+            rows=self.db_job.labeledshape_set.values_list(
+                'id', 'label_id', 'type', 'frame', 'group', 'occluded',
+                'z_order', 'points', 'packed_points').order_by('frame'),
+            fields=('id', 'label_id', 'type', 'frame', 'group', 'occluded',
+                'z_order', 'points', 'packed_points'),
         )
+
         for db_shape in db_shapes:
-            self._extend_attributes(db_shape.labeledshapeattributeval_set,
-                self.db_attributes[db_shape.label_id]["all"].values())
+            _read_packed_points(db_shape)
+            db_shape["labeledshapeattributeval_set"] = db_attrvals.pop(db_shape["id"], [])
+            self._extend_attributes(db_shape["labeledshapeattributeval_set"],
+                self.db_attributes[db_shape["label_id"]]["all"].values())
 
         serializer = serializers.LabeledShapeSerializer(db_shapes, many=True)
         self.ir_data.shapes = serializer.data
 
     def _init_tracks_from_db(self):
-        db_tracks = self.db_job.labeledtrack_set.prefetch_related(
-            "label",
-            "labeledtrackattributeval_set",
-            "trackedshape_set__trackedshapeattributeval_set"
-        ).values(
-            "id",
-            "frame",
-            "label_id",
-            "group",
-            "labeledtrackattributeval__spec_id",
-            "labeledtrackattributeval__value",
-            "labeledtrackattributeval__id",
-            "trackedshape__type",
-            "trackedshape__occluded",
-            "trackedshape__z_order",
-            "trackedshape__points",
-            "trackedshape__id",
-            "trackedshape__frame",
-            "trackedshape__outside",
-            "trackedshape__trackedshapeattributeval__spec_id",
-            "trackedshape__trackedshapeattributeval__value",
-            "trackedshape__trackedshapeattributeval__id",
-        ).order_by('id', 'trackedshape__frame')
-
-        db_tracks = _merge_table_rows(
-            rows=db_tracks,
-            keys_for_merge={
-                "labeledtrackattributeval_set": [
-                    "labeledtrackattributeval__spec_id",
-                    "labeledtrackattributeval__value",
-                    "labeledtrackattributeval__id",
-                ],
-                "trackedshape_set":[
-                    "trackedshape__type",
-                    "trackedshape__occluded",
-                    "trackedshape__z_order",
-                    "trackedshape__points",
-                    "trackedshape__id",
-                    "trackedshape__frame",
-                    "trackedshape__outside",
-                    "trackedshape__trackedshapeattributeval__spec_id",
-                    "trackedshape__trackedshapeattributeval__value",
-                    "trackedshape__trackedshapeattributeval__id",
-                ],
-            },
-            field_id="id",
+        # Every table is read by a separate flat query and rows are grouped
+        # by their foreign key. A single JOIN over all four tables returns
+        # (number of track attributes) x (number of shape attributes) rows
+        # for every tracked shape.
+        db_shape_attrvals = _group_table_rows(
+            rows=models.TrackedShapeAttributeVal.objects.filter(
+                shape__track__job_id=self.db_job.id).values_list(
+                    'shape_id', 'id', 'spec_id', 'value'),
+            fields=('id', 'spec_id', 'value'),
+        )
+
+        db_shapes = _group_table_rows(
+            rows=models.TrackedShape.objects.filter(
+                track__job_id=self.db_job.id).values_list(
+                    'track_id', 'id', 'type', 'occluded', 'z_order', 'points',
+                    'packed_points', 'frame', 'outside').order_by('track_id', 'frame'),
+            fields=('id', 'type', 'occluded', 'z_order', 'points',
+                'packed_points', 'frame', 'outside'),
+        )
+
+        db_track_attrvals = _group_table_rows(
+            rows=models.LabeledTrackAttributeVal.objects.filter(
+                track__job_id=self.db_job.id).values_list(
+                    'track_id', 'id', 'spec_id', 'value'),
+            fields=('id', 'spec_id', 'value'),
+        )
+
+        db_tracks = _read_table_rows(
+            rows=self.db_job.labeledtrack_set.values_list(
+                'id', 'frame', 'label_id', 'group').order_by('id'),
+            fields=('id', 'frame', 'label_id', 'group'),
         )
 
         for db_track in db_tracks:
-            db_track["trackedshape_set"] = _merge_table_rows(db_track["trackedshape_set"], {
-                'trackedshapeattributeval_set': [
-                    'trackedshapeattributeval__value',
-                    'trackedshapeattributeval__spec_id',
-                    'trackedshapeattributeval__id',
-                ]
-            }, 'id')
-
-            # A result table can consist many equal rows for track/shape attributes
-            # We need filter unique attributes manually
-            db_track["labeledtrackattributeval_set"] = list(set(db_track["labeledtrackattributeval_set"]))
-            self._extend_attributes(db_track.labeledtrackattributeval_set,
-                self.db_attributes[db_track.label_id]["immutable"].values())
+            db_attributes = self.db_attributes[db_track["label_id"]]
+            db_track["labeledtrackattributeval_set"] = db_track_attrvals.pop(db_track["id"], [])
+            self._extend_attributes(db_track["labeledtrackattributeval_set"],
+                db_attributes["immutable"].values())
 
+            db_track["trackedshape_set"] = db_shapes.pop(db_track["id"], [])
             for db_shape in db_track["trackedshape_set"]:
-                db_shape["trackedshapeattributeval_set"] = list(
-                    set(db_shape["trackedshapeattributeval_set"])
-                )
+                _read_packed_points(db_shape)
+                db_shape["trackedshapeattributeval_set"] = db_shape_attrvals.pop(db_shape["id"], [])
                 self._extend_attributes(db_shape["trackedshapeattributeval_set"],
-                    self.db_attributes[db_track.label_id]["mutable"].values())
+                    db_attributes["mutable"].values())
 
         serializer = serializers.LabeledTrackSerializer(db_tracks, many=True)
         self.ir_data.tracks = serializer.data
 
-    def _init_version_from_db(self):
+    def _read_from_db(self):
+        """Read annotations and return (commit, is_cached) for them"""
+        self.reset()
         db_commit = self.db_job.commits.last()
-        self.ir_data.version = db_commit.version if db_commit else 0
+        if db_commit and self._init_from_cache(db_commit):
+            return db_commit, True
 
-    def init_from_db(self):
         self._init_tags_from_db()
         self._init_shapes_from_db()
         self._init_tracks_from_db()
-        self._init_version_from_db()
+        self.ir_data.version = db_commit.version if db_commit else 0
+
+        return db_commit, False
+
+    def init_from_db(self):
+        # Every change of annotations is saved together with a new commit.
+        # If the last commit is the same after reading without the lock,
+        # all tables were read from the same state of the job.
+        for _ in range(self._READ_ATTEMPTS):
+            db_commit, is_cached = self._read_from_db()
+            if is_cached or not self.read_only or \
+                db_commit == self.db_job.commits.last():
+                break
+        else:
+            # The job is changed too often, so wait for writers
+            self.db_job = models.Job.objects.select_related('segment__task') \
+                .select_for_update().get(id=self.db_job.id)
+            db_commit, is_cached = self._read_from_db()
+
+        if db_commit and not is_cached:
+            self._save_to_cache(db_commit)
 
     @property
     def data(self):
@@ -671,6 +901,11 @@ class TaskAnnotation:
             splitted_data[jid] = _data.slice(start, stop)
 
         for jid, job_data in splitted_data.items():
+            # Jobs without objects in the request are not changed by patch
+            # actions, thus it isn't necessary to lock and commit them.
+            if action is not None and not (job_data.tags or job_data.shapes or job_data.tracks):
+                continue
+
             _data = AnnotationIR()
             if action is None:
                 _data.data = put_job_data(jid, self.user, job_data)
@@ -700,23 +935,89 @@ class TaskAnnotation:
             for db_job in self.db_jobs:
                 delete_job_data(db_job.id, self.user)
 
+    def _load_job_data(self, db_job):
+        annotation = JobAnnotation(db_job.id, self.user, read_only=True)
+        annotation.init_from_db()
+
+        return annotation.ir_data
+
+    def _load_job_data_in_thread(self, db_job):
+        # Every thread has its own DB connection and transaction
+        try:
+            with transaction.atomic():
+                return self._load_job_data(db_job)
+        finally:
+            connection.close()
+
     def init_from_db(self):
         self.reset()
 
-        for db_job in self.db_jobs:
-            annotation = JobAnnotation(db_job.id, self.user)
-            annotation.init_from_db()
-            if annotation.ir_data.version > self.ir_data.version:
-                self.ir_data.version = annotation.ir_data.version
-            db_segment = db_job.segment
-            start_frame = db_segment.start_frame
-            overlap = self.db_task.overlap
+        db_jobs = sorted(self.db_jobs, key=lambda db_job: db_job.segment.start_frame)
+        workers = min(settings.TASK_ANNOTATION_LOAD_WORKERS, len(db_jobs))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                jobs_data = list(executor.map(self._load_job_data_in_thread, db_jobs))
+        else:
+            jobs_data = [self._load_job_data(db_job) for db_job in db_jobs]
+
+        # Neighbour parts are merged pairwise (as a tree). Thus every object
+        # takes part in log(number of jobs) merges instead of being scanned
+        # by merges of all following jobs. The order of merges depends only
+        # on the order of segments, so the result is deterministic.
+        parts = [(db_job.segment.start_frame, data)
+            for db_job, data in zip(db_jobs, jobs_data)]
+        while len(parts) > 1:
+            merged_parts = []
+            for idx in range(0, len(parts) - 1, 2):
+                start_frame, data = parts[idx]
+                DataManager(data).merge(parts[idx + 1][1], parts[idx + 1][0],
+                    self.db_task.overlap)
+                merged_parts.append((start_frame, data))
+            if len(parts) % 2:
+                merged_parts.append(parts[-1])
+            parts = merged_parts
+
+        if parts:
+            self.ir_data.data = parts[0][1].data
+        self.ir_data.version = max([data.version for data in jobs_data], default=0)
+
+    def iter_from_db(self):
+        """Read jobs in segment order and yield (frame, AnnotationIR) pairs.
+        Every AnnotationIR contains merged objects which can't be changed by
+        following jobs. Objects of following parts don't have shapes before
+        the frame. Only objects inside of the overlap with the next segment
+        (and tracks which continue there) are kept in memory between jobs."""
+        data = AnnotationIR()
+        data_manager = DataManager(data)
+        db_jobs = sorted(self.db_jobs, key=lambda db_job: db_job.segment.start_frame)
+        overlap = self.db_task.overlap
+
+        for idx, db_job in enumerate(db_jobs):
+            with transaction.atomic():
+                annotation = JobAnnotation(db_job.id, self.user, read_only=True)
+                annotation.init_from_db()
+            data_manager.merge(annotation.ir_data, db_job.segment.start_frame, overlap)
+
+            if idx + 1 < len(db_jobs):
+                start_frame = db_jobs[idx + 1].segment.start_frame
+                finished = AnnotationIR(data_manager.pop_finished(start_frame))
+                # Unfinished tracks will be exported later, but their shapes
+                # can start before the next segment
+                frame = min([start_frame] + [min(track["frame"],
+                    track["shapes"][0]["frame"]) for track in data.tracks])
+                yield frame, finished
+            else:
+                yield self.db_task.size, data
 
-            self._merge_data(annotation.ir_data, start_frame, overlap)
+    def _init_version_from_db(self):
+        db_commits = models.JobCommit.objects.filter(job__segment__task_id=self.db_task.id)
+        self.ir_data.version = db_commits.aggregate(Max('version'))['version__max'] or 0
 
     def dump(self, filename, dumper, scheme, host):
+        self._init_version_from_db()
         anno_exporter = Annotation(
             annotation_ir=self.ir_data,
+            annotation_ir_parts=self.iter_from_db,
             db_task=self.db_task,
             scheme=scheme,
             host=host,
@@ -1,3 +1,4 @@
+import bisect
 import copy
 
 import numpy as np
@@ -21,6 +22,15 @@ class DataManager:
         tracks = TrackManager(self.data.tracks)
         tracks.merge(data.tracks, start_frame, overlap)
 
+    def pop_finished(self, start_frame):
+        """Remove objects which can't be changed by merging data of a segment
+        which starts from start_frame and return them as a dictionary."""
+        return {
+            "tags": TagManager(self.data.tags).pop_finished(start_frame),
+            "shapes": ShapeManager(self.data.shapes).pop_finished(start_frame),
+            "tracks": TrackManager(self.data.tracks).pop_finished(start_frame),
+        }
+
     def to_shapes(self, end_frame):
         shapes = self.data.shapes
         tracks = TrackManager(self.data.tracks)
@@ -49,6 +59,19 @@ class ObjectManager:
 
         return objects_by_frame
 
+    @staticmethod
+    def _is_finished(obj, start_frame):
+        # merge() compares only objects which are inside of the overlap
+        return obj["frame"] < start_frame
+
+    def pop_finished(self, start_frame):
+        finished = [obj for obj in self.objects
+            if self._is_finished(obj, start_frame)]
+        self.objects[:] = [obj for obj in self.objects
+            if not self._is_finished(obj, start_frame)]
+
+        return finished
+
     @staticmethod
     def _get_cost_threshold():
         raise NotImplementedError()
@@ -217,16 +240,122 @@ class ShapeManager(ObjectManager):
     def _modify_unmached_object(obj, end_frame):
         pass
 
+class InterpolatedShapes:
+    """Shapes of a track for every frame in the frame order. Keyframes are
+    kept in a sorted index, so a shape on a frame or shapes inside of a frame
+    range are found by bisect. Points of all frames between two keyframes are
+    computed by one NumPy operation when one of these frames is read for the
+    first time. Dictionaries are created only for frames which are read."""
+    def __init__(self, keyframes, end_frame):
+        # The list of keyframes is copied because shapes can be added into
+        # the track later (e.g. see _modify_unmached_object)
+        self._keyframes = list(keyframes)
+        self._frames = [shape["frame"] for shape in keyframes]
+        self._end_frame = end_frame
+        self._points = {}
+        self._counts = [self._get_interpolated_count(idx)
+            for idx in range(len(self._keyframes))]
+
+    def _get_next_keyframe(self, idx):
+        """Return a shape which ends interpolation after the keyframe"""
+        shape = self._keyframes[idx]
+        if shape["outside"]:
+            return None
+        if idx + 1 < len(self._keyframes):
+            return self._keyframes[idx + 1]
+        # TODO: Need to modify a client and a database (append "outside" shapes for polytracks)
+        if shape["type"] == models.ShapeType.RECTANGLE:
+            shape = copy.copy(shape)
+            shape["frame"] = self._end_frame
+            return shape
+
+        return None
+
+    def _get_interpolated_count(self, idx):
+        next_shape = self._get_next_keyframe(idx)
+        if next_shape is None:
+            return 0
+
+        return max(next_shape["frame"] - self._frames[idx] - 1, 0)
+
+    def _get_points(self, idx):
+        if idx not in self._points:
+            self._points[idx] = TrackManager.interpolate(self._keyframes[idx],
+                self._get_next_keyframe(idx))
+
+        return self._points[idx]
+
+    @staticmethod
+    def _make_shape(shape0, frame, points):
+        shape = copy.copy(shape0)
+        shape["attributes"] = [copy.copy(attr) for attr in shape0["attributes"]]
+        if len(points) <= 4:
+            # A segment (or a point) can't be simplified
+            shape["points"] = points.tolist()
+        else:
+            broken_line = geometry.LineString(points.reshape(-1, 2)).simplify(0.05, False)
+            shape["points"] = [x for p in broken_line.coords for x in p]
+
+        shape["keyframe"] = False
+        shape["frame"] = frame
+
+        return shape
+
+    @property
+    def start_frame(self):
+        return self._frames[0]
+
+    @property
+    def stop_frame(self):
+        """The frame after the last shape of the track"""
+        return self._frames[-1] + self._counts[-1] + 1
+
+    def get_range(self, start_frame, stop_frame=None):
+        """Iterate over shapes on frames from [start_frame, stop_frame)"""
+        first_idx = max(bisect.bisect_right(self._frames, start_frame) - 1, 0)
+        for idx in range(first_idx, len(self._keyframes)):
+            frame = self._frames[idx]
+            if stop_frame is not None and frame >= stop_frame:
+                break
+            if frame >= start_frame:
+                yield self._keyframes[idx]
+
+            # The row of points for a frame is (frame - keyframe - 1)
+            count = self._counts[idx]
+            first_row = max(start_frame - frame - 1, 0)
+            last_row = count if stop_frame is None else min(count, stop_frame - frame - 1)
+            if first_row < last_row:
+                shape0, points = self._get_points(idx)
+                for row in range(first_row, last_row):
+                    yield self._make_shape(shape0, frame + row + 1, points[row])
+
+    def get_shape(self, frame):
+        """Return the shape on the frame or None"""
+        return next(self.get_range(frame, frame + 1), None)
+
+    def __len__(self):
+        return len(self._keyframes) + sum(self._counts)
+
+    def __bool__(self):
+        return bool(self._keyframes)
+
+    def __iter__(self):
+        return self.get_range(0)
+
 class TrackManager(ObjectManager):
-    def to_shapes(self, end_frame):
+    def to_shapes(self, end_frame, start_frame=0, stop_frame=None):
+        """Convert tracks into shapes on frames from [start_frame, stop_frame).
+        Rectangles are interpolated till the end_frame if they aren't outside."""
         shapes = []
         for idx, track in enumerate(self.objects):
-            for shape in TrackManager.get_interpolated_shapes(track, 0, end_frame):
+            tracked_shapes = TrackManager.get_interpolated_shapes(track, 0, end_frame)
+            for shape in tracked_shapes.get_range(start_frame, stop_frame):
                 if not shape["outside"]:
+                    shape = copy.copy(shape)
                     shape["label_id"] = track["label_id"]
                     shape["group"] = track["group"]
                     shape["track_id"] = idx
-                    shape["attributes"] += track["attributes"]
+                    shape["attributes"] = shape["attributes"] + track["attributes"]
                     shapes.append(shape)
         return shapes
 
@@ -244,6 +373,12 @@ class TrackManager(ObjectManager):
 
         return objects_by_frame
 
+    @staticmethod
+    def _is_finished(obj, start_frame):
+        # The same condition as in _get_objects_by_frame
+        shape = obj["shapes"][-1]
+        return shape["frame"] < start_frame and shape["outside"]
+
     @staticmethod
     def _get_cost_threshold():
         return 0.5
@@ -257,9 +392,11 @@ class TrackManager(ObjectManager):
             end_frame = start_frame + overlap
             obj0_shapes = TrackManager.get_interpolated_shapes(obj0, start_frame, end_frame)
             obj1_shapes = TrackManager.get_interpolated_shapes(obj1, start_frame, end_frame)
-            obj0_shapes_by_frame = {shape["frame"]:shape for shape in obj0_shapes}
-            obj1_shapes_by_frame = {shape["frame"]:shape for shape in obj1_shapes}
-            assert obj0_shapes_by_frame and obj1_shapes_by_frame
+            assert obj0_shapes and obj1_shapes
+            obj0_shapes_by_frame = {shape["frame"]:shape
+                for shape in obj0_shapes.get_range(start_frame, end_frame)}
+            obj1_shapes_by_frame = {shape["frame"]:shape
+                for shape in obj1_shapes.get_range(start_frame, end_frame)}
 
             count, error = 0, 0
             for frame in range(start_frame, end_frame):
@@ -290,56 +427,49 @@ class TrackManager(ObjectManager):
 
     @staticmethod
     def normalize_shape(shape):
-        points = np.asarray(shape["points"]).reshape(-1, 2)
-        broken_line = geometry.LineString(points)
-        points = []
-        for off in range(0, 100, 1):
-            p = broken_line.interpolate(off / 100, True)
-            points.append(p.x)
-            points.append(p.y)
+        """Resample a broken line of the shape into 100 points placed at equal
+        distances along it (the same as LineString.interpolate does)"""
+        points = np.asarray(shape["points"], dtype=float).reshape(-1, 2)
+        lengths = np.hypot(*np.diff(points, axis=0).T)
+        distances = np.concatenate(([0], np.cumsum(lengths)))
+        offsets = np.arange(100) / 100 * distances[-1]
+        points = np.stack((
+            np.interp(offsets, distances, points[:, 0]),
+            np.interp(offsets, distances, points[:, 1]),
+        ), axis=1)
 
         shape = copy.copy(shape)
-        shape["points"] = points
+        shape["points"] = points.ravel().tolist()
 
         return shape
 
     @staticmethod
-    def get_interpolated_shapes(track, start_frame, end_frame):
-        def interpolate(shape0, shape1):
-            shapes = []
-            is_same_type = shape0["type"] == shape1["type"]
-            is_polygon = shape0["type"] == models.ShapeType.POLYGON
-            is_polyline = shape0["type"] == models.ShapeType.POLYLINE
-            is_same_size = len(shape0["points"]) == len(shape1["points"])
-            if not is_same_type or is_polygon or is_polyline or not is_same_size:
-                shape0 = TrackManager.normalize_shape(shape0)
-                shape1 = TrackManager.normalize_shape(shape1)
-
-            distance = shape1["frame"] - shape0["frame"]
-            step = np.subtract(shape1["points"], shape0["points"]) / distance
-            for frame in range(shape0["frame"] + 1, shape1["frame"]):
-                off = frame - shape0["frame"]
-                if shape1["outside"]:
-                    points = np.asarray(shape0["points"]).reshape(-1, 2)
-                else:
-                    points = (shape0["points"] + step * off).reshape(-1, 2)
-                shape = copy.deepcopy(shape0)
-                if len(points) == 1:
-                    shape["points"] = points.flatten()
-                else:
-                    broken_line = geometry.LineString(points).simplify(0.05, False)
-                    shape["points"] = [x for p in broken_line.coords for x in p]
+    def interpolate(shape0, shape1):
+        """Return the first shape (normalized if it is necessary) and the
+        matrix of points for frames between the shapes (one row per frame)"""
+        is_same_type = shape0["type"] == shape1["type"]
+        is_polygon = shape0["type"] == models.ShapeType.POLYGON
+        is_polyline = shape0["type"] == models.ShapeType.POLYLINE
+        is_same_size = len(shape0["points"]) == len(shape1["points"])
+        if not is_same_type or is_polygon or is_polyline or not is_same_size:
+            shape0 = TrackManager.normalize_shape(shape0)
+            shape1 = TrackManager.normalize_shape(shape1)
+
+        distance = shape1["frame"] - shape0["frame"]
+        points0 = np.asarray(shape0["points"], dtype=float)
+        if shape1["outside"]:
+            points = np.tile(points0, (max(distance - 1, 0), 1))
+        else:
+            step = np.subtract(shape1["points"], points0) / distance
+            points = points0 + step * np.arange(1, distance)[:, np.newaxis]
 
-                shape["keyframe"] = False
-                shape["frame"] = frame
-                shapes.append(shape)
-            return shapes
+        return shape0, points
 
+    @staticmethod
+    def get_interpolated_shapes(track, start_frame, end_frame):
         if track.get("interpolated_shapes"):
             return track["interpolated_shapes"]
 
-        # TODO: should be return an iterator?
-        shapes = []
         curr_frame = track["shapes"][0]["frame"]
         prev_shape = {}
         for shape in track["shapes"]:
@@ -348,20 +478,12 @@ class TrackManager(ObjectManager):
                 for attr in prev_shape["attributes"]:
                     if attr["spec_id"] not in map(lambda el: el["spec_id"], shape["attributes"]):
                         shape["attributes"].append(copy.deepcopy(attr))
-                if not prev_shape["outside"]:
-                    shapes.extend(interpolate(prev_shape, shape))
 
             shape["keyframe"] = True
-            shapes.append(shape)
             curr_frame = shape["frame"]
             prev_shape = shape
 
-        # TODO: Need to modify a client and a database (append "outside" shapes for polytracks)
-        if not prev_shape["outside"] and prev_shape["type"] == models.ShapeType.RECTANGLE:
-            shape = copy.copy(prev_shape)
-            shape["frame"] = end_frame
-            shapes.extend(interpolate(prev_shape, shape))
-
+        shapes = InterpolatedShapes(track["shapes"], end_frame)
         track["interpolated_shapes"] = shapes
 
         return shapes
@@ -0,0 +1,184 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Storage of task frames. By default every frame is a JPEG file (see
+Task.get_frame_path). If Task.chunk_size isn't zero, frames are packed into
+chunks: every chunk is a file with concatenated JPEG images of chunk_size
+consecutive frames and an index file with offsets of the images. Downscaled
+previews of frames (Task.preview_levels) are stored in the same layout."""
+
+import os
+import tarfile
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# Offsets of images inside of a chunk file (one more than images)
+_OFFSET_DTYPE = np.dtype('<u8')
+
+class FrameWriter:
+    """Write JPEG images of frames one by one in the order of frames"""
+    def __init__(self, db_task, level=0):
+        self._db_task = db_task
+        self._level = level
+
+    def write(self, frame, data, previews=()):
+        path = self._db_task.get_frame_path(frame, self._level)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as frame_file:
+            frame_file.write(data)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class ChunkWriter(FrameWriter):
+    def __init__(self, db_task, level=0):
+        super().__init__(db_task, level)
+        self._chunk = None
+        self._chunk_file = None
+        self._offsets = []
+
+    def write(self, frame, data, previews=()):
+        chunk = frame // self._db_task.chunk_size
+        if chunk != self._chunk:
+            self.close()
+            path = self._db_task.get_chunk_path(chunk, self._level)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._chunk = chunk
+            self._chunk_file = open(path, 'wb')
+            self._offsets = [0]
+
+        self._chunk_file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def close(self):
+        if self._chunk_file is not None:
+            self._chunk_file.close()
+            self._chunk_file = None
+            np.asarray(self._offsets, dtype=_OFFSET_DTYPE).tofile(
+                self._db_task.get_chunk_index_path(self._chunk, self._level))
+
+def make_preview(data, level, quality):
+    """Downscale the JPEG image 2**level times. JPEG images can be decoded
+    directly in a smaller scale (see PIL.Image.draft), so it is cheap."""
+    image = Image.open(BytesIO(data))
+    size = (max(image.width >> level, 1), max(image.height >> level, 1))
+    image.draft('RGB', size)
+    image = image.convert('RGB')
+    if image.size != size:
+        image = image.resize(size, Image.BILINEAR)
+
+    preview = BytesIO()
+    image.save(preview, format='JPEG', quality=quality)
+    return preview.getvalue()
+
+def make_previews(data, levels, quality):
+    """JPEG images of levels 1..levels of the frame for PyramidWriter.write()"""
+    return [make_preview(data, level, quality) for level in range(1, levels + 1)]
+
+class PyramidWriter(FrameWriter):
+    """Write frames and their previews for all levels of the task. Previews
+    are made by the caller (see make_previews), so they can be made by
+    processes which compress frames."""
+    def __init__(self, db_task):
+        super().__init__(db_task)
+        writer_class = ChunkWriter if db_task.chunk_size else FrameWriter
+        self._writers = [writer_class(db_task, level)
+            for level in range(db_task.preview_levels + 1)]
+
+    def write(self, frame, data, previews=()):
+        if len(previews) != len(self._writers) - 1:
+            raise ValueError("Frame {} has {} previews instead of {}".format(
+                frame, len(previews), len(self._writers) - 1))
+
+        self._writers[0].write(frame, data)
+        for writer, preview in zip(self._writers[1:], previews):
+            writer.write(frame, preview)
+
+    def close(self):
+        for writer in self._writers:
+            writer.close()
+
+def get_frame_writer(db_task):
+    if db_task.preview_levels:
+        return PyramidWriter(db_task)
+    return ChunkWriter(db_task) if db_task.chunk_size else FrameWriter(db_task)
+
+def get_level(db_task, level):
+    """The closest level which the task has"""
+    return min(max(int(level), 0), db_task.preview_levels)
+
+def get_chunk_offsets(db_task, chunk, level=0):
+    return np.fromfile(db_task.get_chunk_index_path(chunk, level), dtype=_OFFSET_DTYPE)
+
+def read_frame(db_task, frame, level=0):
+    """Return the JPEG image of the frame as bytes"""
+    frame = int(frame)
+    level = get_level(db_task, level)
+    if not db_task.chunk_size:
+        with open(db_task.get_frame_path(frame, level), 'rb') as frame_file:
+            return frame_file.read()
+
+    chunk, idx = divmod(frame, db_task.chunk_size)
+    with open(db_task.get_chunk_index_path(chunk, level), 'rb') as index_file:
+        index_file.seek(idx * _OFFSET_DTYPE.itemsize)
+        offsets = np.frombuffer(index_file.read(2 * _OFFSET_DTYPE.itemsize),
+            dtype=_OFFSET_DTYPE)
+    if len(offsets) != 2:
+        raise FileNotFoundError("Frame {} doesn't exist".format(frame))
+
+    with open(db_task.get_chunk_path(chunk, level), 'rb') as chunk_file:
+        chunk_file.seek(int(offsets[0]))
+        return chunk_file.read(int(offsets[1] - offsets[0]))
+
+def open_frame(db_task, frame, level=0):
+    """Return a binary file object with the JPEG image of the frame"""
+    if not db_task.chunk_size:
+        return open(db_task.get_frame_path(frame, get_level(db_task, level)), 'rb')
+    return BytesIO(read_frame(db_task, frame, level))
+
+def check_frames(db_task, start_frame, stop_frame, level=0):
+    """Raise FileNotFoundError if some of frames [start_frame, stop_frame]
+    aren't stored. A stream of frames (see iter_tar) can't report an error
+    after it has been started, so it is checked beforehand."""
+    level = get_level(db_task, level)
+    if not db_task.chunk_size:
+        for frame in range(start_frame, stop_frame + 1):
+            if not os.path.isfile(db_task.get_frame_path(frame, level)):
+                raise FileNotFoundError("Frame {} doesn't exist".format(frame))
+        return
+
+    chunk_size = db_task.chunk_size
+    for chunk in range(start_frame // chunk_size, stop_frame // chunk_size + 1):
+        last_idx = min(stop_frame, (chunk + 1) * chunk_size - 1) - chunk * chunk_size
+        offsets = get_chunk_offsets(db_task, chunk, level)
+        if len(offsets) < last_idx + 2 or \
+                os.path.getsize(db_task.get_chunk_path(chunk, level)) < offsets[last_idx + 1]:
+            raise FileNotFoundError("Frame {} doesn't exist".format(
+                chunk * chunk_size + last_idx))
+
+def iter_tar(db_task, start_frame, stop_frame, level=0):
+    """Yield parts of an uncompressed tar stream with JPEG images of frames
+    [start_frame, stop_frame]. Members are named <frame>.jpg."""
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w|') as tar:
+        for frame in range(start_frame, stop_frame + 1):
+            data = read_frame(db_task, frame, level)
+            info = tarfile.TarInfo("{}.jpg".format(frame))
+            info.size = len(data)
+            tar.addfile(info, BytesIO(data))
+
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+    yield buffer.getvalue()
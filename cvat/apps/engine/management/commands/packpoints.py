@@ -0,0 +1,51 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cvat.apps.engine import models
+
+class Command(BaseCommand):
+    help = 'Convert points of stored shapes into packed float32 values (or back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--unpack', action='store_true',
+            help='convert packed points back into comma-separated text')
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help='number of shapes which are converted in one transaction')
+
+    def handle(self, *args, **options):
+        for db_model in [models.LabeledShape, models.TrackedShape]:
+            queryset = db_model.objects.filter(
+                packed_points__isnull=not options['unpack']) \
+                .only('id', 'points', 'packed_points').order_by('id')
+
+            count = 0
+            last_id = 0
+            while True:
+                with transaction.atomic():
+                    db_shapes = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+                    if not db_shapes:
+                        break
+
+                    for db_shape in db_shapes:
+                        points = db_shape.get_points()
+                        if options['unpack']:
+                            db_shape.points = points
+                            db_shape.packed_points = None
+                        else:
+                            db_shape.points = []
+                            db_shape.packed_points = points
+                    db_model.objects.bulk_update(db_shapes, ['points', 'packed_points'])
+
+                count += len(db_shapes)
+                last_id = db_shapes[-1].id
+
+            self.stdout.write("{}: {} shapes were converted".format(
+                db_model.__name__, count))
+
+        # Cached annotations contain points in the previous format
+        caches['annotations'].clear()
@@ -1,9 +1,13 @@
+import io
 import os
+import tarfile
 import tempfile
 import shutil
+import subprocess
+import zipfile
+from contextlib import ExitStack
 import numpy as np
 
-from ffmpy import FFmpeg
 from pyunpack import Archive
 from PIL import Image
 
@@ -21,6 +25,68 @@ def get_mime(name):
 
     return 'unknown'
 
+def compress_image(source_path, dest_file, quality):
+    image = Image.open(source_path)
+    # Ensure image data fits into 8bit per pixel before RGB conversion as PIL clips values on conversion
+    if image.mode == "I":
+        # Image mode is 32bit integer pixels.
+        # Autoscale pixels by factor 2**8 / im_data.max() to fit into 8bit
+        im_data = np.array(image)
+        im_data = im_data * (2**8 / im_data.max())
+        image = Image.fromarray(im_data.astype(np.int32))
+    image = image.convert('RGB')
+    image.save(dest_file, format='JPEG', quality=quality, optimize=True)
+    height = image.height
+    width = image.width
+    image.close()
+    return width, height
+
+# Luminance quantization table of the JPEG standard. IJG encoders scale it
+# by the quality, so the quality of an image can be estimated back.
+_STD_LUMINANCE_TABLE = [
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99,
+]
+_EXIF_ORIENTATION_TAG = 0x0112
+
+def estimate_jpeg_quality(image):
+    """IJG quality (1-100) of the opened JPEG image by its quantization table"""
+    scale = 100 * sum(image.quantization[0]) / sum(_STD_LUMINANCE_TABLE)
+    return 5000 / scale if scale >= 100 else (200 - scale) / 2
+
+def _get_exif_orientation(image):
+    try:
+        exif = image._getexif() or {}
+    except Exception:
+        return None # broken EXIF data
+    return exif.get(_EXIF_ORIENTATION_TAG, 1)
+
+def copy_compressed_image(source, dest_file, quality, quality_margin, max_file_size):
+    """Copy the source image as is if it is a baseline RGB JPEG image which
+    isn't rotated by EXIF, isn't larger than max_file_size bytes and its
+    quality isn't higher than quality + quality_margin. Only the header of
+    the image is read. The source is a path or a seekable file object.
+    Return (width, height) or None if it isn't copied."""
+    with ExitStack() as stack:
+        if isinstance(source, str):
+            source = stack.enter_context(open(source, 'rb'))
+        if source.seek(0, io.SEEK_END) > max_file_size:
+            return None
+
+        source.seek(0)
+        image = Image.open(source)
+        if image.format != 'JPEG' or image.mode != 'RGB' \
+            or image.info.get('progressive') \
+            or _get_exif_orientation(image) != 1 \
+            or round(estimate_jpeg_quality(image)) > quality + quality_margin:
+            return None
+
+        source.seek(0)
+        shutil.copyfileobj(source, dest_file)
+        return image.size
+
 class MediaExtractor:
     def __init__(self, source_path, dest_path, image_quality, step, start, stop):
         self._source_path = source_path
@@ -56,21 +122,15 @@ class ImageListExtractor(MediaExtractor):
     def __len__(self):
         return len(self._source_path)
 
-    def save_image(self, k, dest_path):
-        image = Image.open(self[k])
-        # Ensure image data fits into 8bit per pixel before RGB conversion as PIL clips values on conversion
-        if image.mode == "I":
-            # Image mode is 32bit integer pixels.
-            # Autoscale pixels by factor 2**8 / im_data.max() to fit into 8bit
-            im_data = np.array(image)
-            im_data = im_data * (2**8 / im_data.max())
-            image = Image.fromarray(im_data.astype(np.int32))
-        image = image.convert('RGB')
-        image.save(dest_path, quality=self._image_quality, optimize=True)
-        height = image.height
-        width = image.width
-        image.close()
-        return width, height
+    def save_image(self, k, dest_file):
+        source, quality = self.get_compress_args(k)
+        return compress_image(source, dest_file, quality)
+
+    def get_compress_args(self, k):
+        """Arguments of compress_image() for the frame except of the
+        destination. It allows to compress frames in other processes
+        (see task._save_frames). The source is a path or a file object."""
+        return self[k], self._image_quality
 
 class PDFExtractor(MediaExtractor):
     def __init__(self, source_path, dest_path, image_quality, step=1, start=0, stop=0):
@@ -118,8 +178,9 @@ class PDFExtractor(MediaExtractor):
     def __len__(self):
         return self._length
 
-    def save_image(self, k, dest_path):
-        shutil.copyfile(self[k], dest_path)
+    def save_image(self, k, dest_file):
+        with open(self[k], 'rb') as source_file:
+            shutil.copyfileobj(source_file, dest_file)
         return self._dimensions[k]
 
 #Note step, start, stop have no affect
@@ -140,26 +201,150 @@ class DirectoryExtractor(ImageListExtractor):
             stop=0,
         )
 
+class _ZipReader:
+    def __init__(self, path):
+        self._zip = zipfile.ZipFile(path)
+
+    def get_names(self):
+        return [info.filename for info in self._zip.infolist()
+            if not info.filename.endswith('/')]
+
+    def read(self, name):
+        return self._zip.read(name)
+
+    def close(self):
+        self._zip.close()
+
+class _TarReader:
+    def __init__(self, path):
+        self._tar = tarfile.open(path)
+        self._members = [member for member in self._tar.getmembers() if member.isfile()]
+        self._members_by_name = {member.name: member for member in self._members}
+
+    def get_names(self):
+        return [member.name for member in self._members]
+
+    def read(self, name):
+        with self._tar.extractfile(self._members_by_name[name]) as member_file:
+            return member_file.read()
+
+    def is_compressed(self):
+        return not isinstance(self._tar.fileobj, io.BufferedReader)
+
+    def close(self):
+        self._tar.close()
+
+def _open_archive_reader(path, names_filter):
+    """Return a reader of the zip or tar archive if files can be read from it
+    in the sorted order of names without extraction, otherwise None. Members
+    of a compressed tar can't be read in other order than they are stored
+    without decompressing the archive from the beginning for every one."""
+    if zipfile.is_zipfile(path):
+        return _ZipReader(path)
+    if tarfile.is_tarfile(path):
+        reader = _TarReader(path)
+        names = [os.path.normpath(name) for name in reader.get_names()
+            if names_filter(name)]
+        if not reader.is_compressed() or names == sorted(names):
+            return reader
+        reader.close()
+    return None
+
 #Note step, start, stop have no affect
 class ArchiveExtractor(DirectoryExtractor):
+    """Images of zip and tar archives are read directly from the archive (see
+    _open_archive_reader), other archives are extracted into dest_path.
+    Paths of images are the same in both cases."""
     def __init__(self, source_path, dest_path, image_quality, step=1, start=0, stop=0):
-        Archive(source_path[0]).extractall(dest_path)
-        super().__init__(
-            source_path=[dest_path],
-            dest_path=dest_path,
-            image_quality=image_quality,
-            step=1,
-            start=0,
-            stop=0,
-        )
+        self._reader = _open_archive_reader(source_path[0],
+            lambda name: get_mime(name) == 'image')
+        if self._reader is None:
+            Archive(source_path[0]).extractall(dest_path)
+            super().__init__(
+                source_path=[dest_path],
+                dest_path=dest_path,
+                image_quality=image_quality,
+                step=1,
+                start=0,
+                stop=0,
+            )
+        else:
+            self._names = {}
+            for name in self._reader.get_names():
+                path = os.path.normpath(os.path.join(dest_path, name))
+                if get_mime(path) == 'image':
+                    self._names[path] = name
+            ImageListExtractor.__init__(self,
+                source_path=list(self._names),
+                dest_path=dest_path,
+                image_quality=image_quality,
+            )
+
+    def get_compress_args(self, k):
+        if self._reader is None:
+            return super().get_compress_args(k)
+        return io.BytesIO(self._reader.read(self._names[self[k]])), self._image_quality
+
+    def __del__(self):
+        if getattr(self, '_reader', None) is not None:
+            self._reader.close()
+
+def _get_jpeg_length(data):
+    """Return the length of the first JPEG image in the data or 0 if the
+    image isn't complete yet. Marker segments are skipped by their lengths,
+    inside of entropy-coded data 0xFF bytes are stuffed by 0x00 or followed
+    by restart markers, so the end of image marker can't appear there."""
+    if len(data) >= 2 and data[:2] != b'\xff\xd8':
+        raise ValueError("Invalid JPEG stream")
+
+    pos = 2 # after the start of image marker
+    while pos + 2 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Invalid JPEG stream")
+        marker = data[pos + 1]
+        if marker == 0xD9: # end of image
+            return pos + 2
+        if marker == 0xFF: # fill byte
+            pos += 1
+            continue
+        if pos + 4 > len(data):
+            return 0
+
+        pos += 2 + (data[pos + 2] << 8 | data[pos + 3])
+        if marker == 0xDA: # start of scan, entropy-coded data follows
+            while True:
+                pos = data.find(b'\xff', pos)
+                if pos < 0 or pos + 1 >= len(data):
+                    return 0
+                if data[pos + 1] != 0 and not 0xD0 <= data[pos + 1] <= 0xD7:
+                    break
+                pos += 2
+
+    return 0
+
+def split_jpeg_stream(chunks):
+    """Split a stream of concatenated JPEG images (e.g. the output of ffmpeg
+    with image2pipe format) which is read by chunks into separate images"""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        length = _get_jpeg_length(buffer)
+        while length:
+            yield bytes(buffer[:length])
+            del buffer[:length]
+            length = _get_jpeg_length(buffer)
+
+    if buffer:
+        raise ValueError("Unexpected end of JPEG stream")
 
 class VideoExtractor(MediaExtractor):
+    # Size of chunks which are read from the output of ffmpeg
+    _chunk_size = 1 << 20
+
     def __init__(self, source_path, dest_path, image_quality, step=1, start=0, stop=0):
-        from cvat.apps.engine.log import slogger
-        _dest_path = tempfile.mkdtemp(prefix='cvat-', suffix='.data')
         super().__init__(
             source_path=source_path[0],
-            dest_path=_dest_path,
+            dest_path=dest_path,
             image_quality=image_quality,
             step=step,
             start=start,
@@ -168,9 +353,8 @@ class VideoExtractor(MediaExtractor):
         # translate inversed range 1:95 to 2:32
         translated_quality = 96 - self._image_quality
         translated_quality = round((((translated_quality - 1) * (31 - 2)) / (95 - 1)) + 2)
-        self._tmp_output = tempfile.mkdtemp(prefix='cvat-', suffix='.data')
-        target_path = os.path.join(self._tmp_output, '%d.jpg')
-        output_opts = '-start_number 0 -b:v 10000k -vsync 0 -an -y -q:v ' + str(translated_quality)
+        self._output_opts = ['-b:v', '10000k', '-vsync', '0', '-an',
+            '-q:v', str(translated_quality)]
         filters = ''
         if self._stop > 0:
             filters = 'between(n,' + str(self._start) + ',' + str(self._stop) + ')'
@@ -179,36 +363,52 @@ class VideoExtractor(MediaExtractor):
         if self._step > 1:
             filters += ('*' if filters else '') + 'not(mod(n-' + str(self._start) + ',' + str(self._step) + '))'
         if filters:
-            output_opts += " -vf select=\"'" + filters + "'\""
-
-        ff = FFmpeg(
-            inputs  = {self._source_path: None},
-            outputs = {target_path: output_opts})
-
-        slogger.glob.info("FFMpeg cmd: {} ".format(ff.cmd))
-        ff.run()
-
-    def _getframepath(self, k):
-        return "{0}/{1}.jpg".format(self._tmp_output, k)
+            self._output_opts += ['-vf', "select='" + filters + "'"]
 
-    def __iter__(self):
-        i = 0
-        while os.path.exists(self._getframepath(i)):
-            yield self._getframepath(i)
-            i += 1
+        self._length = self._get_length()
 
-    def __del__(self):
-        if self._tmp_output:
-            shutil.rmtree(self._tmp_output)
+    def _get_length(self):
+        """Number of selected frames by the container metadata (0 if the
+        container doesn't have it). The real number of frames is known
+        only after decoding (see save_frames)."""
+        try:
+            output = subprocess.check_output(['ffprobe', '-v', 'error',
+                '-select_streams', 'v:0', '-show_entries', 'stream=nb_frames',
+                '-of', 'default=nokey=1:noprint_wrappers=1', self._source_path])
+            frames = int(output.decode().split()[0])
+        except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+            return 0
 
-    def __getitem__(self, k):
-        return self._getframepath(k)
+        stop = min(self._stop, frames - 1) if self._stop > 0 else frames - 1
+        return max(0, (stop - self._start) // self._step + 1)
 
     def __len__(self):
-        return len(os.listdir(self._tmp_output))
+        return self._length
 
-    def save_image(self, k, dest_path):
-        shutil.copyfile(self[k], dest_path)
+    def iter_frames(self):
+        """Decode selected frames by ffmpeg and yield JPEG images of them
+        while the video is being decoded (without a temporary directory)"""
+        from cvat.apps.engine.log import slogger
+        cmd = ['ffmpeg', '-i', self._source_path] + self._output_opts + \
+            ['-f', 'image2pipe', '-vcodec', 'mjpeg', '-']
+        slogger.glob.info("FFMpeg cmd: {} ".format(subprocess.list2cmdline(cmd)))
+
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+            try:
+                chunks = iter(lambda: process.stdout.read(self._chunk_size), b'')
+                yield from split_jpeg_stream(chunks)
+                returncode = process.wait()
+            finally:
+                process.stdout.close()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+
+            if returncode:
+                stderr.seek(0)
+                raise Exception("FFMpeg failed: {}".format(
+                    stderr.read().decode(errors='replace')))
 
 def _is_archive(path):
     mime = mimetypes.guess_type(path)
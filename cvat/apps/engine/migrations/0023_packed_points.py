@@ -0,0 +1,24 @@
+# Generated by Django 2.2.4 on 2026-10-18 02:04
+
+import cvat.apps.engine.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0022_merge_20190829_0951'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='labeledshape',
+            name='packed_points',
+            field=cvat.apps.engine.models.PackedFloatArrayField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='trackedshape',
+            name='packed_points',
+            field=cvat.apps.engine.models.PackedFloatArrayField(default=None, null=True),
+        ),
+    ]
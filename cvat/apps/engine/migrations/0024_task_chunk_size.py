@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0023_packed_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='chunk_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
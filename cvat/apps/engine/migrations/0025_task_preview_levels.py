@@ -0,0 +1,18 @@
+# Generated by Django 2.2.4 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('engine', '0024_task_chunk_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='preview_levels',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
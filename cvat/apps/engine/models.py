@@ -8,6 +8,7 @@ import re
 import shlex
 import os
 
+import numpy as np
 from django.db import models
 from django.conf import settings
 
@@ -57,19 +58,40 @@ class Task(models.Model):
     frame_filter = models.CharField(max_length=256, default="", blank=True)
     status = models.CharField(max_length=32, choices=StatusChoice.choices(),
         default=StatusChoice.ANNOTATION)
+    # Number of frames in one chunk file. Zero means that every frame is
+    # stored in its own file (see engine/frames.py).
+    chunk_size = models.PositiveIntegerField(default=0)
+    # Number of downscaled copies of frames, the level k is 2**k times
+    # smaller than the original frame (level 0)
+    preview_levels = models.PositiveSmallIntegerField(default=0)
 
     # Extend default permission model
     class Meta:
         default_permissions = ()
 
-    def get_frame_path(self, frame):
+    def get_frame_path(self, frame, level=0):
         d1 = str(int(frame) // 10000)
         d2 = str(int(frame) // 100)
-        path = os.path.join(self.get_data_dirname(), d1, d2,
+        path = os.path.join(self.get_level_dirname(level), d1, d2,
             str(frame) + '.jpg')
 
         return path
 
+    def get_chunk_path(self, chunk, level=0):
+        return os.path.join(self.get_level_dirname(level), "chunks",
+            str(int(chunk)) + '.mjpeg')
+
+    def get_chunk_index_path(self, chunk, level=0):
+        return os.path.join(self.get_level_dirname(level), "chunks",
+            str(int(chunk)) + '.index')
+
+    def get_level_dirname(self, level):
+        # Previews are outside of the data directory because some
+        # applications use all images inside of it
+        if level:
+            return os.path.join(self.get_task_dirname(), "previews", str(int(level)))
+        return self.get_data_dirname()
+
     def get_frame_step(self):
         match = re.search("step\s*=\s*([1-9]\d*)", self.frame_filter)
         return int(match.group(1)) if match else 1
@@ -89,6 +111,9 @@ class Task(models.Model):
     def get_image_meta_cache_path(self):
         return os.path.join(self.get_task_dirname(), "image_meta.cache")
 
+    def get_download_manifest_path(self):
+        return os.path.join(self.get_task_dirname(), "download.manifest")
+
     def get_task_dirname(self):
         return os.path.join(settings.DATA_ROOT, str(self.id))
 
@@ -268,6 +293,8 @@ class FloatArrayField(models.TextField):
     def from_db_value(self, value, expression, connection):
             if value is None:
                 return value
+            if not value:
+                return []
             return [float(v) for v in value.split(self.separator)]
 
     def to_python(self, value):
@@ -279,16 +306,61 @@ class FloatArrayField(models.TextField):
     def get_prep_value(self, value):
         return self.separator.join(map(str, value))
 
+class PackedFloatArrayField(models.BinaryField):
+    """Array of float32 values packed as little-endian bytes"""
+    dtype = np.dtype('<f4')
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return np.frombuffer(value, dtype=self.dtype).tolist()
+
+    def to_python(self, value):
+        if isinstance(value, list):
+            return value
+
+        return self.from_db_value(value, None, None)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return super().get_prep_value(np.asarray(value, dtype=self.dtype).tobytes())
+
 class Shape(models.Model):
     type = models.CharField(max_length=16, choices=ShapeType.choices())
     occluded = models.BooleanField(default=False)
     z_order = models.IntegerField(default=0)
     points = FloatArrayField()
+    # Points are stored in one of two columns. If packed_points isn't NULL,
+    # it has priority (see settings.ANNOTATION_PACKED_POINTS).
+    packed_points = PackedFloatArrayField(null=True, default=None)
 
     class Meta:
         abstract = True
         default_permissions = ()
 
+    def get_points(self):
+        if self.packed_points is not None:
+            return self.packed_points
+        return self.points
+
+    def has_points(self, points):
+        """Whether the stored points are equal to the points in the precision
+        in which set_points() stores them"""
+        if settings.ANNOTATION_PACKED_POINTS:
+            dtype = PackedFloatArrayField.dtype
+            return np.array_equal(np.asarray(self.get_points(), dtype=dtype),
+                np.asarray(points, dtype=dtype))
+        return self.get_points() == points
+
+    def set_points(self, points):
+        if settings.ANNOTATION_PACKED_POINTS:
+            self.points = []
+            self.packed_points = points
+        else:
+            self.points = points
+            self.packed_points = None
+
 class LabeledImage(Annotation):
     pass
 
@@ -206,9 +206,10 @@ class TaskSerializer(WriteOnceMixin, serializers.ModelSerializer):
         fields = ('url', 'id', 'name', 'size', 'mode', 'owner', 'assignee',
             'bug_tracker', 'created_date', 'updated_date', 'overlap',
             'segment_size', 'z_order', 'status', 'labels', 'segments',
-            'image_quality', 'start_frame', 'stop_frame', 'frame_filter')
+            'image_quality', 'start_frame', 'stop_frame', 'frame_filter',
+            'chunk_size', 'preview_levels')
         read_only_fields = ('size', 'mode', 'created_date', 'updated_date',
-            'status')
+            'status', 'chunk_size', 'preview_levels')
         write_once_fields = ('overlap', 'segment_size', 'image_quality')
         ordering = ['-id']
 
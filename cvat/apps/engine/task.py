@@ -6,13 +6,24 @@
 import os
 import sys
 import rq
+import time
 import shutil
+import hashlib
+from collections import Counter
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from io import BytesIO
+import numpy as np
 from PIL import Image
 from traceback import print_exception
-from ast import literal_eval
-from urllib import error as urlerror
+from contextlib import ExitStack
+from functools import lru_cache, partial
 from urllib import parse as urlparse
 from urllib import request as urlrequest
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows
 
 import mimetypes
 _SCRIPT_DIR = os.path.realpath(os.path.dirname(__file__))
@@ -20,13 +31,16 @@ _MEDIA_MIMETYPES_FILE = os.path.join(_SCRIPT_DIR, "media.mimetypes")
 mimetypes.init(files=[_MEDIA_MIMETYPES_FILE])
 
 import django_rq
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from django.db import transaction
-from distutils.dir_util import copy_tree
 
-from . import models
+from . import frames, models
 from .log import slogger
-from cvat.apps.engine.media_extractors import get_mime, MEDIA_TYPES
+from .utils import iter_chunks, map_in_order
+from cvat.apps.engine.media_extractors import (get_mime, compress_image,
+    copy_compressed_image, MEDIA_TYPES)
 
 ############################# Low Level server API
 
@@ -48,46 +62,49 @@ def rq_handler(job, exc_type, exc_value, traceback):
 ############################# Internal implementation for server API
 
 
-def make_image_meta_cache(db_task):
-    with open(db_task.get_image_meta_cache_path(), 'w') as meta_file:
-        cache = {
-            'original_size': []
-        }
+# Sizes of original images are stored as (width, height) rows
+_IMAGE_META_DTYPE = np.dtype('<u4')
+# Number of tasks which image meta caches are kept in memory
+_IMAGE_META_CACHE_SIZE = 128
 
+def make_image_meta_cache(db_task, sizes=None):
+    """Save sizes of original images of the task into an .npy file with an
+    (N, 2) array of (width, height). A video has one size. If sizes aren't
+    passed, they are read from the database."""
+    if sizes is None:
         if db_task.mode == 'interpolation':
-            image = Image.open(db_task.get_frame_path(0))
-            cache['original_size'].append({
-                'width': image.size[0],
-                'height': image.size[1]
-            })
-            image.close()
+            sizes = [(db_task.video.width, db_task.video.height)]
         else:
-            filenames = []
-            for root, _, files in os.walk(db_task.get_upload_dirname()):
-                fullnames = map(lambda f: os.path.join(root, f), files)
-                images = filter(lambda x: get_mime(x) == 'image', fullnames)
-                filenames.extend(images)
-            filenames.sort()
-
-            for image_path in filenames:
-                image = Image.open(image_path)
-                cache['original_size'].append({
-                    'width': image.size[0],
-                    'height': image.size[1]
-                })
-                image.close()
-
-        meta_file.write(str(cache))
-
-
-def get_image_meta_cache(db_task):
+            sizes = db_task.image_set.order_by('frame').values_list('width', 'height')
+    sizes = np.array(list(sizes), dtype=_IMAGE_META_DTYPE).reshape(-1, 2)
+
+    # The file can be read concurrently, so it is replaced atomically
+    path = db_task.get_image_meta_cache_path()
+    with open(path + '.tmp', 'wb') as meta_file:
+        np.save(meta_file, sizes)
+    os.replace(path + '.tmp', path)
+
+@lru_cache(maxsize=_IMAGE_META_CACHE_SIZE)
+def _load_image_meta_cache(path, mtime):
+    sizes = np.load(path)
+    sizes.flags.writeable = False
+    return sizes
+
+def get_image_sizes(db_task):
+    """Read-only (N, 2) array of (width, height) of original images"""
+    path = db_task.get_image_meta_cache_path()
     try:
-        with open(db_task.get_image_meta_cache_path()) as meta_cache_file:
-            return literal_eval(meta_cache_file.read())
-    except Exception:
+        return _load_image_meta_cache(path, os.stat(path).st_mtime_ns)
+    except (OSError, ValueError):
+        # There is no cache or it is in the old format (repr of a dict)
         make_image_meta_cache(db_task)
-        with open(db_task.get_image_meta_cache_path()) as meta_cache_file:
-            return literal_eval(meta_cache_file.read())
+        return _load_image_meta_cache(path, os.stat(path).st_mtime_ns)
+
+def get_image_meta_cache(db_task):
+    return {
+        'original_size': [{'width': width, 'height': height}
+            for width, height in get_image_sizes(db_task).tolist()]
+    }
 
 # left to our code back compatibility
 def _get_mime(name):
@@ -114,21 +131,62 @@ def _get_mime(name):
             return 'unknown'
 
 
+# ioctl request of Linux which clones a file by copy-on-write (reflink)
+_FICLONE = 0x40049409
+
+def _reflink(source_path, target_path):
+    if fcntl is None:
+        raise OSError("Reflinks aren't supported on the platform")
+    with open(source_path, 'rb') as source_file, open(target_path, 'wb') as target_file:
+        fcntl.ioctl(target_file.fileno(), _FICLONE, source_file.fileno())
+
+_LINK_FUNCTIONS = {
+    'reflink': _reflink,
+    'hardlink': os.link,
+    'symlink': os.symlink,
+}
+
+def _import_file(source_path, target_path):
+    """Link the share file into the upload directory by the first method from
+    SHARE_IMPORT_LINKS which works, copy it otherwise. Return the method."""
+    for method in settings.SHARE_IMPORT_LINKS:
+        try:
+            _LINK_FUNCTIONS[method](source_path, target_path)
+            return method
+        except OSError:
+            # e.g. another file system or no support of reflinks
+            if os.path.lexists(target_path):
+                os.remove(target_path)
+    shutil.copyfile(source_path, target_path)
+    return 'copy'
+
 def _copy_data_from_share(server_files, upload_dir):
     job = rq.get_current_job()
     job.meta['status'] = 'Data are being copied from share..'
     job.save_meta()
 
+    # Files of directories are imported one by one, because extractors
+    # don't walk into symlinks to directories
+    files = []
     for path in server_files:
-        source_path = os.path.join(settings.SHARE_ROOT, os.path.normpath(path))
+        source_path = os.path.abspath(os.path.join(settings.SHARE_ROOT, os.path.normpath(path)))
         target_path = os.path.join(upload_dir, path)
         if os.path.isdir(source_path):
-            copy_tree(source_path, target_path)
+            for root, _, names in os.walk(source_path, followlinks=True):
+                target_dir = os.path.normpath(os.path.join(target_path,
+                    os.path.relpath(root, source_path)))
+                files.extend((os.path.join(root, name), os.path.join(target_dir, name))
+                    for name in names)
         else:
-            target_dir = os.path.dirname(target_path)
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir)
-            shutil.copyfile(source_path, target_path)
+            files.append((source_path, target_path))
+
+    for target_dir in set(os.path.dirname(target_path) for _, target_path in files):
+        os.makedirs(target_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=settings.SHARE_IMPORT_WORKERS) as executor:
+        methods = Counter(executor.map(lambda args: _import_file(*args), files))
+    slogger.glob.info("Files are imported from share: {}".format(
+        ", ".join("{} {}".format(count, method) for method, count in methods.items())))
 
 def _save_task_to_db(db_task):
     job = rq.get_current_job()
@@ -231,32 +289,229 @@ def _validate_data(data):
 
     return counter
 
-def _download_data(urls, upload_dir):
+# Every update of a job status is a round-trip to redis, thus progress
+# is updated not more often than once per the interval (s)
+_STATUS_UPDATE_INTERVAL = 1
+
+# Remote files are read by blocks of the size (bytes)
+_DOWNLOAD_BLOCK_SIZE = 1 << 20
+# Timeout (s) of connecting to a server and of waiting for a block
+_DOWNLOAD_TIMEOUT = 60
+# Attempts to download a file after connection errors and 5xx/429 responses.
+# The delay (s) before the next attempt is doubled every time.
+_DOWNLOAD_ATTEMPTS = 3
+_DOWNLOAD_RETRY_DELAY = 1
+_RETRIABLE_ERRORS = (requests.ConnectionError, requests.Timeout,
+    requests.exceptions.ChunkedEncodingError)
+
+def _get_file_hash(path):
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(_DOWNLOAD_BLOCK_SIZE), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def _read_download_manifest(manifest_path, upload_dir):
+    """Return {url: entry} of files which were downloaded by a previous run
+    and haven't been changed since. The manifest has a JSON entry per line,
+    the last entry of a URL is used."""
+    manifest = {}
+    try:
+        with open(manifest_path) as manifest_file:
+            for line in manifest_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # the line was being written at a failure
+                manifest[entry['url']] = entry
+    except OSError:
+        return {}
+
+    def is_downloaded(entry):
+        path = os.path.join(upload_dir, entry['name'])
+        return os.path.isfile(path) and os.path.getsize(path) == entry['size'] \
+            and _get_file_hash(path) == entry['sha256']
+
+    return {url: entry for url, entry in manifest.items() if is_downloaded(entry)}
+
+def _download_file(session, url, path):
+    """Download the file by the session, return its size and SHA-256. The file
+    is written under a temporary name, thus a partial file is never left."""
+    slogger.glob.info("Downloading: {}".format(url))
+    for attempt in range(_DOWNLOAD_ATTEMPTS):
+        if attempt:
+            time.sleep(_DOWNLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+        is_last_attempt = attempt == _DOWNLOAD_ATTEMPTS - 1
+        try:
+            with session.get(url, stream=True, timeout=_DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                file_hash = hashlib.sha256()
+                size = 0
+                with open(path + '.part', 'wb') as tfp:
+                    for block in response.iter_content(_DOWNLOAD_BLOCK_SIZE):
+                        tfp.write(block)
+                        file_hash.update(block)
+                        size += len(block)
+            os.replace(path + '.part', path)
+            return size, file_hash.hexdigest()
+        except requests.HTTPError as err:
+            code = err.response.status_code
+            if is_last_attempt or (code < 500 and code != 429):
+                raise Exception("Failed to download " + url + ". " + str(code) + ' - ' + err.response.reason)
+        except _RETRIABLE_ERRORS as err:
+            if is_last_attempt:
+                raise Exception("Failed to download " + url + ". " + str(err))
+        except requests.RequestException as err:
+            raise Exception("Invalid URL: " + url + ". " + str(err))
+        slogger.glob.warning("Download of {} will be retried".format(url))
+
+def _download_data(urls, upload_dir, manifest_path):
+    """Download remote files into the upload directory by a pool of threads.
+    Downloaded files are recorded in the manifest, so a next run skips files
+    which have already arrived. Files are downloaded even if some of them
+    fail, the first error is raised at the end."""
     job = rq.get_current_job()
-    local_files = {}
+    names = {}
     for url in urls:
         name = os.path.basename(urlrequest.url2pathname(urlparse.urlparse(url).path))
-        if name in local_files:
+        if name in names:
             raise Exception("filename collision: {}".format(name))
-        slogger.glob.info("Downloading: {}".format(url))
-        job.meta['status'] = '{} is being downloaded..'.format(url)
-        job.save_meta()
-
-        req = urlrequest.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-        try:
-            with urlrequest.urlopen(req) as fp, open(os.path.join(upload_dir, name), 'wb') as tfp:
-                while True:
-                    block = fp.read(8192)
-                    if not block:
-                        break
-                    tfp.write(block)
-        except urlerror.HTTPError as err:
-            raise Exception("Failed to download " + url + ". " + str(err.code) + ' - ' + err.reason)
-        except urlerror.URLError as err:
-            raise Exception("Invalid URL: " + url + ". " + err.reason)
-
-        local_files[name] = True
-    return list(local_files.keys())
+        names[name] = url
+    names = {url: name for name, url in names.items()}
+
+    downloaded = {url: entry for url, entry in
+        _read_download_manifest(manifest_path, upload_dir).items()
+        if names.get(url) == entry['name']}
+    if downloaded:
+        slogger.glob.info("{} remote files have already been downloaded".format(len(downloaded)))
+
+    workers = settings.REMOTE_FILES_DOWNLOAD_WORKERS
+    error = None
+    last_update = 0
+    with requests.Session() as session, \
+        ThreadPoolExecutor(max_workers=workers) as executor, \
+        open(manifest_path, 'a') as manifest_file:
+        # Connections to the same host are kept alive and reused by threads
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = 'Mozilla/5.0'
+
+        futures = {executor.submit(_download_file, session, url,
+            os.path.join(upload_dir, names[url])): url
+            for url in urls if url not in downloaded}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                size, sha256 = future.result()
+            except Exception as ex:
+                error = error or ex
+                continue
+
+            downloaded[url] = {'url': url, 'name': names[url], 'size': size, 'sha256': sha256}
+            manifest_file.write(json.dumps(downloaded[url]) + '\n')
+            manifest_file.flush()
+            if time.monotonic() - last_update >= _STATUS_UPDATE_INTERVAL:
+                last_update = time.monotonic()
+                job.meta['status'] = '{} of {} remote files are downloaded...'.format(
+                    len(downloaded), len(urls))
+                job.save_meta()
+
+    if error is not None:
+        raise error
+
+    return [names[url] for url in urls]
+
+# Number of frames which are sent to a compression process at once
+_COMPRESSION_CHUNK_SIZE = 8
+
+def _compress_frame(frame, args, passthrough=None, previews=None):
+    source, quality = args
+    dest_file = BytesIO()
+    size = None
+    if passthrough is not None:
+        size = copy_compressed_image(source, dest_file, quality, *passthrough)
+    is_copied = size is not None
+    width, height = size or compress_image(source, dest_file, quality)
+    data = dest_file.getvalue()
+    frame_previews = frames.make_previews(data, *previews) if previews else []
+    return frame, width, height, data, frame_previews, is_copied
+
+def _compress_frames(frames_args, passthrough=None, previews=None):
+    return [_compress_frame(frame, args, passthrough, previews)
+        for frame, args in frames_args]
+
+def _add_previews(items, previews=None):
+    """Append previews of the frame to (frame, data, ...) items"""
+    return [item + (frames.make_previews(item[1], *previews) if previews else [],)
+        for item in items]
+
+def _get_passthrough():
+    """Arguments of copy_compressed_image() from settings or None"""
+    if settings.IMAGE_PASSTHROUGH_QUALITY_MARGIN is None:
+        return None
+    return (settings.IMAGE_PASSTHROUGH_QUALITY_MARGIN,
+        settings.IMAGE_PASSTHROUGH_MAX_FILE_SIZE)
+
+def _save_frames(extractor, writer, start_frame, workers, passthrough=None,
+        previews=None):
+    """Save frames of the extractor by the writer starting from start_frame.
+    Yield (frame, width, height, is_copied) in the order of frames. Images
+    are compressed by a pool of processes if there are several workers.
+    JPEG images are copied as is if they fit the passthrough arguments
+    (see copy_compressed_image), is_copied is None for frames which can't
+    be copied (video frames and rendered images).
+    Previews of frames are made by the same processes if previews are
+    (levels, quality) (see frames.make_previews)."""
+    with ExitStack() as stack:
+        executor = None
+        if workers > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        def process(func, items):
+            # Items are sent to the processes by chunks, results are in order
+            chunks = iter_chunks(items, _COMPRESSION_CHUNK_SIZE)
+            if executor is None:
+                results = map(func, chunks)
+            else:
+                results = map_in_order(executor, func, chunks, 2 * workers)
+            for chunk in results:
+                yield from chunk
+
+        if hasattr(extractor, 'iter_frames'):
+            # Video frames are saved while the video is being decoded, their
+            # size is the same and it is read from the first frame
+            items = ((frame, data) for frame, data in
+                enumerate(extractor.iter_frames(), start_frame))
+            if previews:
+                items = process(partial(_add_previews, previews=previews), items)
+            for frame, data, *frame_previews in items:
+                writer.write(frame, data, *frame_previews)
+                yield frame, None, None, None
+        elif hasattr(extractor, 'get_compress_args'):
+            # Sources are read here while previous frames are being compressed
+            frame_numbers = range(start_frame, start_frame + len(extractor))
+            args = ((frame, extractor.get_compress_args(frame - start_frame))
+                for frame in frame_numbers)
+            compress = partial(_compress_frames, passthrough=passthrough,
+                previews=previews)
+            for frame, width, height, data, frame_previews, is_copied in \
+                process(compress, args):
+                writer.write(frame, data, frame_previews)
+                yield frame, width, height, is_copied
+        else:
+            def save_images():
+                for k in range(len(extractor)):
+                    dest_file = BytesIO()
+                    width, height = extractor.save_image(k, dest_file)
+                    yield start_frame + k, dest_file.getvalue(), width, height
+
+            items = save_images()
+            if previews:
+                items = process(partial(_add_previews, previews=previews), items)
+            for frame, data, width, height, *frame_previews in items:
+                writer.write(frame, data, *frame_previews)
+                # Rendered images (e.g. PDF pages) can't be copied as is
+                yield frame, width, height, None
 
 @transaction.atomic
 def _create_thread(tid, data):
@@ -269,7 +524,8 @@ def _create_thread(tid, data):
     upload_dir = db_task.get_upload_dirname()
 
     if data['remote_files']:
-        data['remote_files'] = _download_data(data['remote_files'], upload_dir)
+        data['remote_files'] = _download_data(data['remote_files'], upload_dir,
+            db_task.get_download_manifest_path())
 
     media = _validate_data(data)
 
@@ -299,40 +555,57 @@ def _create_thread(tid, data):
         db_task.mode = MEDIA_TYPES[media_type]['mode']
         extractors.append(extractor)
 
-    for extractor in extractors:
-        for frame, image_orig_path in enumerate(extractor):
-            image_dest_path = db_task.get_frame_path(db_task.size)
-            dirname = os.path.dirname(image_dest_path)
-
-            if not os.path.exists(dirname):
-                os.makedirs(dirname)
-
-            if db_task.mode == 'interpolation':
-                extractor.save_image(frame, image_dest_path)
-            else:
-                width, height = extractor.save_image(frame, image_dest_path)
-                db_images.append(models.Image(
-                    task=db_task,
-                    path=image_orig_path,
-                    frame=db_task.size,
-                    width=width, height=height))
-
-            db_task.size += 1
-            progress = frame * 100 // length
-            job.meta['status'] = 'Images are being compressed... {}%'.format(progress)
-            job.save_meta()
+    db_task.chunk_size = settings.FRAME_CHUNK_SIZE
+    db_task.preview_levels = settings.FRAME_PREVIEW_LEVELS
+    last_update = 0
+    copied_frames = Counter()
+    previews = None
+    if db_task.preview_levels:
+        previews = (db_task.preview_levels, db_task.image_quality)
+    with frames.get_frame_writer(db_task) as writer:
+        for extractor in extractors:
+            start_frame = db_task.size
+            for frame, width, height, is_copied in _save_frames(extractor, writer,
+                start_frame, settings.IMAGE_COMPRESSION_WORKERS, _get_passthrough(),
+                previews):
+                if is_copied is not None:
+                    copied_frames[is_copied] += 1
+                if db_task.mode == 'annotation':
+                    db_images.append(models.Image(
+                        task=db_task,
+                        path=extractor[frame - start_frame],
+                        frame=frame,
+                        width=width, height=height))
+
+                db_task.size += 1
+                if time.monotonic() - last_update >= _STATUS_UPDATE_INTERVAL:
+                    last_update = time.monotonic()
+                    # The number of video frames can be unknown before decoding
+                    if length:
+                        progress = '{}%'.format(min(frame * 100 // length, 100))
+                    else:
+                        progress = '{} frames'.format(frame)
+                    job.meta['status'] = 'Images are being compressed... {}'.format(progress)
+                    job.save_meta()
 
     if db_task.mode == 'interpolation':
-        image = Image.open(db_task.get_frame_path(0))
-        models.Video.objects.create(
-            task=db_task,
-            path=extractors[0].get_source_name(),
-            width=image.width, height=image.height)
-        image.close()
+        with frames.open_frame(db_task, 0) as frame_file:
+            image = Image.open(frame_file)
+            models.Video.objects.create(
+                task=db_task,
+                path=extractors[0].get_source_name(),
+                width=image.width, height=image.height)
+            sizes = [image.size]
+            image.close()
         if db_task.stop_frame == 0:
             db_task.stop_frame = db_task.start_frame + (db_task.size - 1) * db_task.get_frame_step()
     else:
         models.Image.objects.bulk_create(db_images)
+        sizes = [(db_image.width, db_image.height) for db_image in db_images]
+    make_image_meta_cache(db_task, sizes)
 
     slogger.glob.info("Founded frames {} for task #{}".format(db_task.size, tid))
+    if copied_frames:
+        slogger.glob.info("Images of task #{}: {} copied as is, {} re-encoded".format(
+            tid, copied_frames[True], copied_frames[False]))
     _save_task_to_db(db_task)
@@ -0,0 +1,498 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import shutil
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from cvat.apps.annotation.annotation import Annotation, AnnotationIR
+from cvat.apps.engine import annotation, models
+from cvat.apps.engine.models import (Task, Segment, Job, Image, Label,
+    AttributeSpec, AttributeType)
+
+
+def create_db_task(size, segment_size, overlap):
+    db_task = Task.objects.create(name="task", size=size, mode="annotation",
+        segment_size=segment_size, overlap=overlap)
+    shutil.rmtree(db_task.get_task_dirname(), ignore_errors=True)
+    os.makedirs(db_task.get_upload_dirname())
+    os.makedirs(db_task.get_data_dirname())
+
+    for frame in range(size):
+        Image.objects.create(task=db_task, path="{}.jpg".format(frame),
+            frame=frame, width=800, height=600)
+
+    segment_step = segment_size - overlap
+    for start_frame in range(0, size, segment_step):
+        stop_frame = min(start_frame + segment_size - 1, size - 1)
+        db_segment = Segment.objects.create(task=db_task,
+            start_frame=start_frame, stop_frame=stop_frame)
+        Job.objects.create(segment=db_segment)
+        if stop_frame == size - 1:
+            break
+
+    db_label = Label.objects.create(task=db_task, name="car")
+    AttributeSpec.objects.create(label=db_label, name="model", mutable=False,
+        input_type=AttributeType.TEXT, default_value="mazda", values="")
+    AttributeSpec.objects.create(label=db_label, name="parked", mutable=True,
+        input_type=AttributeType.CHECKBOX, default_value="false", values="")
+
+    return db_task
+
+def generate_shape(frame, label_id, offset=0, **kwargs):
+    shape = {
+        "id": None,
+        "frame": frame,
+        "label_id": label_id,
+        "group": 0,
+        "type": "rectangle",
+        "occluded": False,
+        "z_order": 0,
+        "points": [10.0 + offset, 10.0, 100.0 + offset, 200.0],
+        "attributes": [],
+    }
+    shape.update(kwargs)
+    return shape
+
+def generate_track(frames, label_id, offset=0, outside_frame=None):
+    shapes = []
+    for frame in frames:
+        shape = generate_shape(frame, label_id, offset + frame, outside=False)
+        for key in ["label_id", "group"]:
+            shape.pop(key)
+        shapes.append(shape)
+    if outside_frame is not None:
+        shape = generate_shape(outside_frame, label_id, offset + outside_frame,
+            outside=True)
+        for key in ["label_id", "group"]:
+            shape.pop(key)
+        shapes.append(shape)
+
+    return {
+        "id": None,
+        "frame": frames[0],
+        "label_id": label_id,
+        "group": 0,
+        "attributes": [],
+        "shapes": shapes,
+    }
+
+class TaskAnnotationStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="user")
+        self.db_task = create_db_task(size=30, segment_size=10, overlap=5)
+        label_id = self.db_task.label_set.first().id
+
+        # Objects inside of overlaps are duplicated in neighbour jobs to be
+        # merged. Some tracks continue through several segments.
+        db_jobs = Job.objects.filter(segment__task=self.db_task) \
+            .select_related("segment").order_by("segment__start_frame")
+        for idx, db_job in enumerate(db_jobs):
+            start = db_job.segment.start_frame
+            stop = db_job.segment.stop_frame
+            data = {
+                "version": 0,
+                "tags": [{
+                    "id": None,
+                    "frame": start + 1,
+                    "label_id": label_id,
+                    "group": 0,
+                    "attributes": [],
+                }],
+                "shapes": [generate_shape(frame, label_id, 100 * idx)
+                    for frame in range(start, stop + 1, 3)],
+                "tracks": [
+                    generate_track(list(range(start, stop + 1)), label_id),
+                    generate_track([start, start + 2], label_id, 50 * idx + 300,
+                        outside_frame=start + 4),
+                ],
+            }
+            annotation.put_job_data(db_job.id, self.user, data)
+
+    def _export(self, make_exporter):
+        # Export properties modify annotations (e.g. add track attributes to
+        # interpolated shapes). Thus every property gets its own exporter.
+        def _key(item):
+            return repr(item)
+
+        frames = [(frame.frame, frame.name,
+            sorted(map(_key, frame.labeled_shapes)), sorted(map(_key, frame.tags)))
+            for frame in make_exporter().group_by_frame()]
+        tracks = sorted(map(_key, make_exporter().tracks))
+        shapes = sorted(map(_key, make_exporter().shapes))
+        tags = sorted(map(_key, make_exporter().tags))
+
+        return frames, tracks, shapes, tags
+
+    def _make_exporter(self):
+        task_annotation = annotation.TaskAnnotation(self.db_task.id, self.user)
+        task_annotation.init_from_db()
+        return Annotation(annotation_ir=task_annotation.ir_data,
+            db_task=task_annotation.db_task)
+
+    def _make_stream_exporter(self):
+        task_annotation = annotation.TaskAnnotation(self.db_task.id, self.user)
+        return Annotation(annotation_ir=AnnotationIR(),
+            annotation_ir_parts=task_annotation.iter_from_db,
+            db_task=task_annotation.db_task)
+
+    def test_stream_is_equal_to_merged_data(self):
+        expected = self._export(self._make_exporter)
+        actual = self._export(self._make_stream_exporter)
+
+        self.assertEqual(sorted(expected[0]), actual[0])
+        self.assertEqual(expected[1:], actual[1:])
+
+    def test_frames_are_grouped_by_windows(self):
+        def _make_exporter(window):
+            exporter = self._make_stream_exporter()
+            exporter._FRAME_WINDOW = window
+            return exporter
+
+        expected = self._export(lambda: _make_exporter(window=1000))
+        actual = self._export(lambda: _make_exporter(window=3))
+
+        self.assertEqual(expected, actual)
+
+    def test_tracks_and_shapes_are_read_once(self):
+        _, tracks, shapes, _ = self._export(self._make_stream_exporter)
+        init_from_db = annotation.JobAnnotation.init_from_db
+        with mock.patch.object(annotation.JobAnnotation, "init_from_db",
+                autospec=True, side_effect=init_from_db) as job_init_from_db:
+            objects = list(self._make_stream_exporter().tracks_and_shapes)
+
+        self.assertEqual(job_init_from_db.call_count,
+            self.db_task.segment_set.count())
+        self.assertEqual(sorted(map(repr, objects)), sorted(tracks + shapes))
+
+    def test_stream_keeps_only_overlap_in_memory(self):
+        task_annotation = annotation.TaskAnnotation(self.db_task.id, self.user)
+        parts = list(task_annotation.iter_from_db())
+        db_segments = self.db_task.segment_set.order_by("start_frame")
+
+        self.assertEqual(len(parts), len(db_segments))
+        for (frame, part), db_segment in zip(parts[:-1], db_segments[1:]):
+            self.assertLessEqual(frame, db_segment.start_frame)
+            for shape in part.shapes:
+                self.assertLess(shape["frame"], db_segment.start_frame)
+
+class TaskAnnotationParallelLoadTestCase(TransactionTestCase):
+    # Jobs are read by other threads with their own DB connections, so test
+    # data must be committed.
+    def setUp(self):
+        TaskAnnotationStreamTestCase.setUp(self)
+
+    def _get_data(self, workers):
+        with self.settings(TASK_ANNOTATION_LOAD_WORKERS=workers):
+            task_annotation = annotation.TaskAnnotation(self.db_task.id, self.user)
+            task_annotation.init_from_db()
+            data = task_annotation.data
+            for track in data["tracks"]:
+                track.pop("interpolated_shapes", None)
+            return data
+
+    def test_parallel_load_is_deterministic(self):
+        expected = self._get_data(workers=1)
+        self.assertTrue(expected["tracks"])
+        for _ in range(3):
+            self.assertEqual(self._get_data(workers=4), expected)
+
+class JobAnnotationUpdateTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="user")
+        self.db_task = create_db_task(size=20, segment_size=20, overlap=0)
+        self.db_job = Job.objects.get(segment__task=self.db_task)
+        label_id = self.db_task.label_set.first().id
+        self.attrs = {db_attr.name: db_attr.id
+            for db_attr in AttributeSpec.objects.filter(label__task=self.db_task)}
+
+        shape = generate_shape(0, label_id, attributes=[
+            {"spec_id": self.attrs["model"], "value": "bmw"}])
+        track = generate_track([0, 5, 10], label_id)
+        for shape_idx, track_shape in enumerate(track["shapes"]):
+            track_shape["attributes"] = [{"spec_id": self.attrs["parked"],
+                "value": "true" if shape_idx else "false"}]
+        annotation.put_job_data(self.db_job.id, self.user, {
+            "version": 0,
+            "tags": [],
+            "shapes": [shape, generate_shape(1, label_id)],
+            "tracks": [track],
+        })
+        self.data = self._get_data()
+
+    def _get_data(self):
+        return annotation.get_job_data(self.db_job.id, self.user)
+
+    def test_update_keeps_ids(self):
+        shape = self.data["shapes"][0]
+        shape["points"] = [1.0, 2.0, 3.0, 4.0]
+        shape["attributes"][0]["value"] = "audi"
+        track = self.data["tracks"][0]
+        track["shapes"][1]["occluded"] = True
+
+        data = annotation.patch_job_data(self.db_job.id, self.user,
+            {"version": 1, "tags": [], "shapes": [shape], "tracks": [track]},
+            "update")
+        self.assertEqual(data["shapes"][0]["id"], shape["id"])
+        self.assertEqual(data["tracks"][0]["id"], track["id"])
+
+        data = self._get_data()
+        self.assertEqual(data["shapes"][0], shape)
+        self.assertEqual(data["shapes"][1], self.data["shapes"][1])
+        self.assertEqual(data["tracks"][0], track)
+
+    def test_update_changes_only_modified_rows(self):
+        shape = self.data["shapes"][0]
+        shape["frame"] = 3
+        db_attrval = models.LabeledShapeAttributeVal.objects.get(
+            shape_id=shape["id"], spec_id=self.attrs["model"])
+
+        annotation.patch_job_data(self.db_job.id, self.user,
+            {"version": 1, "tags": [], "shapes": [shape], "tracks": []},
+            "update")
+        self.assertEqual(models.LabeledShapeAttributeVal.objects.get(
+            shape_id=shape["id"], spec_id=self.attrs["model"]).id, db_attrval.id)
+        self.assertEqual(models.LabeledShape.objects.get(id=shape["id"]).frame, 3)
+
+    def test_update_track_keyframes(self):
+        track = self.data["tracks"][0]
+        removed_shape = track["shapes"].pop(1)
+        new_shape = dict(track["shapes"][0], id=None, frame=15,
+            attributes=[{"spec_id": self.attrs["parked"], "value": "true"}])
+        track["shapes"].append(new_shape)
+
+        data = annotation.patch_job_data(self.db_job.id, self.user,
+            {"version": 1, "tags": [], "shapes": [], "tracks": [track]},
+            "update")
+        self.assertIsNotNone(data["tracks"][0]["shapes"][-1]["id"])
+        self.assertFalse(models.TrackedShape.objects.filter(
+            id=removed_shape["id"]).exists())
+
+        data = self._get_data()
+        self.assertEqual([shape["frame"] for shape in data["tracks"][0]["shapes"]],
+            [0, 10, 15])
+        self.assertEqual(data["tracks"][0]["shapes"][-1]["attributes"],
+            new_shape["attributes"])
+
+    def test_update_unknown_object_creates_it(self):
+        shape = dict(self.data["shapes"][1], id=10 ** 6, frame=7)
+
+        data = annotation.patch_job_data(self.db_job.id, self.user,
+            {"version": 1, "tags": [], "shapes": [shape], "tracks": []},
+            "update")
+        self.assertNotEqual(data["shapes"][0]["id"], None)
+        self.assertEqual(len(self._get_data()["shapes"]), 3)
+
+    def test_update_with_invalid_attribute(self):
+        shape = self.data["shapes"][0]
+        shape["attributes"][0]["spec_id"] = 10 ** 6
+
+        with self.assertRaises(AttributeError):
+            annotation.patch_job_data(self.db_job.id, self.user,
+                {"version": 1, "tags": [], "shapes": [shape], "tracks": []},
+                "update")
+
+class JobAnnotationReadOnlyTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="user")
+        self.db_task = create_db_task(size=20, segment_size=20, overlap=0)
+        self.db_job = Job.objects.get(segment__task=self.db_task)
+        self.label_id = self.db_task.label_set.first().id
+        annotation.put_job_data(self.db_job.id, self.user, {
+            "version": 0,
+            "tags": [],
+            "shapes": [generate_shape(0, self.label_id)],
+            "tracks": [generate_track([0, 5], self.label_id)],
+        })
+
+    def _read(self, changes):
+        """Read the job without the lock, the job is changed by another
+        "request" while the first 'changes' reads of tracks are in progress"""
+        init_tracks_from_db = annotation.JobAnnotation._init_tracks_from_db
+        calls = []
+
+        def _init_tracks_and_change(job_annotation):
+            init_tracks_from_db(job_annotation)
+            calls.append(job_annotation.read_only)
+            if len(calls) <= changes:
+                annotation.patch_job_data(self.db_job.id, self.user, {
+                    "version": 0, "tags": [], "tracks": [],
+                    "shapes": [generate_shape(len(calls), self.label_id)],
+                }, "create")
+
+        with mock.patch.object(annotation.JobAnnotation, "_init_tracks_from_db",
+                autospec=True, side_effect=_init_tracks_and_change):
+            data = annotation.get_job_data(self.db_job.id, self.user)
+
+        return data, len(calls)
+
+    def test_read_without_changes(self):
+        data, reads = self._read(changes=0)
+        self.assertEqual(reads, 1)
+        self.assertEqual(data["version"], 1)
+        self.assertEqual(len(data["shapes"]), 1)
+
+    def test_read_is_repeated_if_job_is_changed(self):
+        data, reads = self._read(changes=1)
+        self.assertEqual(reads, 2)
+        self.assertEqual(data["version"], 2)
+        self.assertEqual(len(data["shapes"]), 2)
+
+    def test_read_with_lock_if_job_is_changed_often(self):
+        attempts = annotation.JobAnnotation._READ_ATTEMPTS
+        data, reads = self._read(changes=attempts)
+        self.assertEqual(reads, attempts + 1)
+        self.assertEqual(data["version"], attempts + 1)
+        self.assertEqual(len(data["shapes"]), attempts + 1)
+
+class PackedPointsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="user")
+        self.db_task = create_db_task(size=20, segment_size=20, overlap=0)
+        self.db_job = Job.objects.get(segment__task=self.db_task)
+        label_id = self.db_task.label_set.first().id
+
+        # All values are exactly representable by float32
+        shape = generate_shape(0, label_id, type="polygon",
+            points=[0.5, 1.25, 100.0, 200.75, 1920.0, 1080.5])
+        track = generate_track([0, 5, 10], label_id)
+        self.data = {"version": 0, "tags": [], "shapes": [shape], "tracks": [track]}
+
+    def _get_data(self):
+        return annotation.get_job_data(self.db_job.id, self.user)
+
+    def _get_points(self, data):
+        return [shape["points"] for shape in data["shapes"]] + \
+            [shape["points"] for track in data["tracks"] for shape in track["shapes"]]
+
+    def test_put_packed_points(self):
+        with self.settings(ANNOTATION_PACKED_POINTS=True):
+            annotation.put_job_data(self.db_job.id, self.user, self.data)
+
+        db_shape = models.LabeledShape.objects.get(job=self.db_job)
+        self.assertEqual(db_shape.points, [])
+        self.assertEqual(len(db_shape.packed_points), 6)
+        self.assertEqual(self._get_points(self._get_data()),
+            self._get_points(self.data))
+
+    def test_read_mixed_formats(self):
+        annotation.put_job_data(self.db_job.id, self.user, self.data)
+        data = self._get_data()
+        data["shapes"][0]["points"] = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+        with self.settings(ANNOTATION_PACKED_POINTS=True):
+            annotation.patch_job_data(self.db_job.id, self.user,
+                {"version": 1, "tags": [], "shapes": data["shapes"], "tracks": []},
+                "update")
+
+        self.assertIsNone(models.TrackedShape.objects.first().packed_points)
+        self.assertEqual(self._get_points(self._get_data()),
+            self._get_points(data))
+
+    def test_update_with_same_packed_points(self):
+        self.data["shapes"][0]["points"] = [0.1, 0.2, 100.3, 200.4, 1920.1, 1080.7]
+        with self.settings(ANNOTATION_PACKED_POINTS=True):
+            data = annotation.put_job_data(self.db_job.id, self.user, self.data)
+            self.assertEqual(data["shapes"][0]["points"], self.data["shapes"][0]["points"])
+            with mock.patch.object(models.LabeledShape.objects,
+                    "bulk_update") as bulk_update:
+                annotation.patch_job_data(self.db_job.id, self.user,
+                    {"version": 1, "tags": [], "shapes": data["shapes"], "tracks": []},
+                    "update")
+
+        bulk_update.assert_not_called()
+
+    def test_packpoints_command(self):
+        annotation.put_job_data(self.db_job.id, self.user, self.data)
+        expected = self._get_points(self._get_data())
+
+        call_command("packpoints", stdout=StringIO())
+        self.assertFalse(models.TrackedShape.objects.filter(
+            packed_points__isnull=True).exists())
+        self.assertEqual(self._get_points(self._get_data()), expected)
+
+        call_command("packpoints", "--unpack", stdout=StringIO())
+        self.assertFalse(models.LabeledShape.objects.filter(
+            packed_points__isnull=False).exists())
+        self.assertEqual(self._get_points(self._get_data()), expected)
+
+class CopyStreamTestCase(TestCase):
+    def setUp(self):
+        db_task = create_db_task(size=20, segment_size=20, overlap=0)
+        self.db_job = Job.objects.get(segment__task=db_task)
+        self.label_id = db_task.label_set.first().id
+        self.fields = models.LabeledShapeAttributeVal._meta.concrete_fields
+
+    def _read(self, stream, size):
+        chunks = []
+        chunk = stream.read(size)
+        while chunk:
+            chunks.append(chunk)
+            chunk = stream.read(size)
+
+        return "".join(chunks)
+
+    def test_encode_rows(self):
+        db_attrvals = [
+            models.LabeledShapeAttributeVal(id=1, spec_id=2, shape_id=3,
+                value="a\tb\\c\nd"),
+            models.LabeledShapeAttributeVal(id=None, spec_id=2, shape_id=4,
+                value=""),
+        ]
+        stream = annotation._CopyStream(self.fields, db_attrvals)
+
+        self.assertEqual(stream.read(), "1\t2\ta\\tb\\\\c\\nd\t3\n"
+            "\\N\t2\t\t4\n")
+        self.assertEqual(stream.read(), "")
+
+    def test_encode_shapes(self):
+        db_shape = models.LabeledShape(id=5, job=self.db_job,
+            label_id=self.label_id, frame=1, group=0, type="rectangle",
+            occluded=True, z_order=0)
+        with self.settings(ANNOTATION_PACKED_POINTS=True):
+            db_shape.set_points([1.0, 2.0])
+        fields = {field.column: idx for idx, field in
+            enumerate(models.LabeledShape._meta.concrete_fields)}
+        row = annotation._CopyStream(models.LabeledShape._meta.concrete_fields,
+            [db_shape]).read().rstrip("\n").split("\t")
+
+        self.assertEqual(row[fields["occluded"]], "t")
+        self.assertEqual(row[fields["points"]], "")
+        self.assertEqual(row[fields["packed_points"]],
+            "\\\\x0000803f00000040")
+
+    def test_copy_create_makes_objects_on_demand(self):
+        made = []
+        def _make_attrvals():
+            for idx in range(3):
+                made.append(idx)
+                yield models.LabeledShapeAttributeVal(spec_id=1, shape_id=idx,
+                    value=str(idx))
+
+        copied = []
+        cursor = mock.MagicMock()
+        cursor.fetchall.return_value = [(10, ), (11, ), (12, )]
+        cursor.copy_expert.side_effect = lambda sql, stream: \
+            copied.append((list(made), self._read(stream, 8)))
+        with mock.patch.object(annotation, "connection") as connection:
+            connection.cursor.return_value.__enter__.return_value = cursor
+            connection.ops.quote_name.side_effect = '"{}"'.format
+            ids = annotation.copy_create(models.LabeledShapeAttributeVal,
+                _make_attrvals(), 3)
+
+        self.assertEqual(ids, [10, 11, 12])
+        self.assertEqual(copied, [([], "10\t1\t0\t0\n11\t1\t1\t1\n12\t1\t2\t2\n")])
+
+    def test_read_by_chunks(self):
+        db_attrvals = [models.LabeledShapeAttributeVal(id=idx, spec_id=1,
+            shape_id=idx, value=str(idx) * 10) for idx in range(100)]
+        expected = annotation._CopyStream(self.fields, db_attrvals).read()
+
+        for size in [1, 7, 64, 8192]:
+            self.assertEqual(self._read(annotation._CopyStream(self.fields,
+                db_attrvals), size), expected)
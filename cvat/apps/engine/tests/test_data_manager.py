@@ -0,0 +1,155 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import copy
+
+import numpy as np
+from django.test import SimpleTestCase
+from hypothesis import given, settings, strategies as st
+from shapely import geometry
+
+from cvat.apps.engine.data_manager import TrackManager
+
+
+# The implementation of interpolation which processed frames one by one. It is
+# kept here to check that the vectorized one gives the same results.
+def _normalize_shape(shape):
+    points = np.asarray(shape["points"]).reshape(-1, 2)
+    broken_line = geometry.LineString(points)
+    points = []
+    for off in range(0, 100, 1):
+        p = broken_line.interpolate(off / 100, True)
+        points.append(p.x)
+        points.append(p.y)
+
+    shape = copy.copy(shape)
+    shape["points"] = points
+
+    return shape
+
+def _get_interpolated_shapes(track, start_frame, end_frame):
+    def interpolate(shape0, shape1):
+        shapes = []
+        is_same_type = shape0["type"] == shape1["type"]
+        is_polygon = shape0["type"] == "polygon"
+        is_polyline = shape0["type"] == "polyline"
+        is_same_size = len(shape0["points"]) == len(shape1["points"])
+        if not is_same_type or is_polygon or is_polyline or not is_same_size:
+            shape0 = _normalize_shape(shape0)
+            shape1 = _normalize_shape(shape1)
+
+        distance = shape1["frame"] - shape0["frame"]
+        step = np.subtract(shape1["points"], shape0["points"]) / distance
+        for frame in range(shape0["frame"] + 1, shape1["frame"]):
+            off = frame - shape0["frame"]
+            if shape1["outside"]:
+                points = np.asarray(shape0["points"]).reshape(-1, 2)
+            else:
+                points = (shape0["points"] + step * off).reshape(-1, 2)
+            shape = copy.deepcopy(shape0)
+            if len(points) == 1:
+                shape["points"] = points.flatten()
+            else:
+                broken_line = geometry.LineString(points).simplify(0.05, False)
+                shape["points"] = [x for p in broken_line.coords for x in p]
+
+            shape["keyframe"] = False
+            shape["frame"] = frame
+            shapes.append(shape)
+        return shapes
+
+    shapes = []
+    prev_shape = {}
+    for shape in track["shapes"]:
+        if prev_shape:
+            for attr in prev_shape["attributes"]:
+                if attr["spec_id"] not in map(lambda el: el["spec_id"], shape["attributes"]):
+                    shape["attributes"].append(copy.deepcopy(attr))
+            if not prev_shape["outside"]:
+                shapes.extend(interpolate(prev_shape, shape))
+
+        shape["keyframe"] = True
+        shapes.append(shape)
+        prev_shape = shape
+
+    if not prev_shape["outside"] and prev_shape["type"] == "rectangle":
+        shape = copy.copy(prev_shape)
+        shape["frame"] = end_frame
+        shapes.extend(interpolate(prev_shape, shape))
+
+    return shapes
+
+_POINTS_COUNT = {
+    "rectangle": st.just(2),
+    "points": st.integers(min_value=2, max_value=5),
+    "polyline": st.integers(min_value=2, max_value=10),
+    "polygon": st.integers(min_value=3, max_value=10),
+}
+
+@st.composite
+def _tracks(draw):
+    shape_type = draw(st.sampled_from(sorted(_POINTS_COUNT)))
+    # Single points can't be normalized, so all keyframes have one point
+    points_count = _POINTS_COUNT[shape_type]
+    if shape_type == "points" and draw(st.booleans()):
+        points_count = st.just(1)
+    frames = sorted(draw(st.sets(st.integers(min_value=0, max_value=60),
+        min_size=1, max_size=5)))
+    coordinate = st.integers(min_value=0, max_value=100000).map(lambda v: v / 100)
+
+    shapes = []
+    for frame in frames:
+        # Keyframes of points and polyline tracks can have different number
+        # of points, rectangles are always defined by 2 points
+        count = draw(points_count)
+        shapes.append({
+            "type": shape_type,
+            "frame": frame,
+            "occluded": draw(st.booleans()),
+            "z_order": 0,
+            "outside": draw(st.booleans()),
+            "points": draw(st.lists(coordinate, min_size=2 * count,
+                max_size=2 * count)),
+            "attributes": [{"spec_id": spec_id, "value": str(frame)}
+                for spec_id in draw(st.sets(st.integers(min_value=1, max_value=3)))],
+        })
+
+    return {
+        "frame": frames[0],
+        "label_id": 1,
+        "group": 0,
+        "attributes": [],
+        "shapes": shapes,
+    }
+
+class TrackInterpolationTestCase(SimpleTestCase):
+    @settings(max_examples=300, deadline=None, derandomize=True)
+    @given(track=_tracks(), end_frame=st.integers(min_value=61, max_value=80))
+    def test_interpolation_is_equal_to_frame_by_frame_one(self, track, end_frame):
+        expected = _get_interpolated_shapes(copy.deepcopy(track), 0, end_frame)
+        actual = TrackManager.get_interpolated_shapes(copy.deepcopy(track), 0, end_frame)
+
+        self.assertEqual(len(actual), len(expected))
+        for shape0, shape1 in zip(actual, expected):
+            shape0 = dict(shape0)
+            points0 = shape0.pop("points")
+            points1 = shape1.pop("points")
+            self.assertEqual(len(points0), len(points1))
+            np.testing.assert_allclose(points0, points1, atol=1e-6)
+            self.assertEqual(shape0, shape1)
+
+    @settings(max_examples=100, deadline=None, derandomize=True)
+    @given(track=_tracks(), start_frame=st.integers(min_value=0, max_value=80),
+        length=st.integers(min_value=0, max_value=20))
+    def test_frame_range(self, track, start_frame, length):
+        shapes = TrackManager.get_interpolated_shapes(track, 0, 70)
+        stop_frame = start_frame + length
+        expected = [shape for shape in shapes
+            if start_frame <= shape["frame"] < stop_frame]
+
+        self.assertEqual(list(shapes.get_range(start_frame, stop_frame)), expected)
+        self.assertEqual(shapes.get_shape(start_frame), next((shape
+            for shape in shapes if shape["frame"] == start_frame), None))
+        self.assertEqual(len(shapes), len(list(shapes)))
+        self.assertEqual(shapes.stop_frame, max(shape["frame"] for shape in shapes) + 1)
@@ -0,0 +1,98 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import tempfile
+from io import BytesIO
+
+import numpy as np
+from django.test import SimpleTestCase
+from PIL import Image
+
+from cvat.apps.engine.media_extractors import (copy_compressed_image,
+    estimate_jpeg_quality, split_jpeg_stream)
+
+
+def generate_jpeg(seed, quality):
+    # Noise gives a lot of 0xFF bytes in entropy-coded data
+    pixels = np.random.RandomState(seed).randint(0, 256, (48, 64, 3))
+    data = BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(data, "JPEG",
+        quality=quality, comment=b"\xff\xd9")
+    return data.getvalue()
+
+def split_into_chunks(data, size):
+    return (data[pos:pos + size] for pos in range(0, len(data), size))
+
+class SplitJpegStreamTestCase(SimpleTestCase):
+    def setUp(self):
+        self.images = [generate_jpeg(seed, quality)
+            for seed, quality in enumerate([10, 50, 95, 100])]
+        self.stream = b"".join(self.images)
+
+    def test_split_by_chunks(self):
+        for size in [1, 100, 4096, len(self.stream)]:
+            self.assertEqual(list(split_jpeg_stream(
+                split_into_chunks(self.stream, size))), self.images)
+
+    def test_images_are_yielded_before_end_of_stream(self):
+        images = split_jpeg_stream(split_into_chunks(self.stream + b"\xff",
+            len(self.images[0])))
+        self.assertEqual(next(images), self.images[0])
+
+    def test_incomplete_stream(self):
+        with self.assertRaises(ValueError):
+            list(split_jpeg_stream([self.stream[:-1]]))
+
+class CopyCompressedImageTestCase(SimpleTestCase):
+    def _save(self, image, **kwargs):
+        fd, path = tempfile.mkstemp(suffix=".jpg")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        image.save(path, **kwargs)
+        return path
+
+    def _copy(self, path, quality=75, quality_margin=0, max_file_size=1 << 20):
+        dest_file = BytesIO()
+        size = copy_compressed_image(path, dest_file, quality, quality_margin, max_file_size)
+        if size is not None:
+            with open(path, "rb") as source_file:
+                self.assertEqual(dest_file.getvalue(), source_file.read())
+        else:
+            self.assertEqual(dest_file.getvalue(), b"")
+        return size
+
+    def test_estimate_quality(self):
+        image = Image.fromarray(np.random.RandomState(0).randint(0, 256,
+            (48, 64, 3)).astype(np.uint8))
+        for quality in [30, 50, 75, 90, 95]:
+            path = self._save(image, format="JPEG", quality=quality)
+            with Image.open(path) as jpeg_image:
+                self.assertEqual(round(estimate_jpeg_quality(jpeg_image)), quality)
+
+    def test_copy(self):
+        image = Image.new("RGB", (64, 48), (10, 20, 30))
+        path = self._save(image, format="JPEG", quality=70)
+        self.assertEqual(self._copy(path), (64, 48))
+        self.assertEqual(self._copy(path, quality=60, quality_margin=10), (64, 48))
+        self.assertIsNone(self._copy(path, quality=60))
+        self.assertIsNone(self._copy(path, max_file_size=10))
+
+        exif = Image.Exif()
+        exif[0x0112] = 1 # not rotated
+        path = self._save(image, format="JPEG", quality=70, exif=exif.tobytes())
+        self.assertEqual(self._copy(path), (64, 48))
+
+    def test_not_copied_images(self):
+        image = Image.new("RGB", (64, 48), (10, 20, 30))
+        exif = Image.Exif()
+        exif[0x0112] = 6 # rotated by 90 degrees
+        for path in [
+            self._save(image, format="JPEG", quality=70, progressive=True),
+            self._save(image, format="JPEG", quality=70, exif=exif.tobytes()),
+            self._save(image.convert("L"), format="JPEG", quality=70),
+            self._save(image.convert("CMYK"), format="JPEG", quality=70),
+            self._save(image, format="PNG"),
+        ]:
+            self.assertIsNone(self._copy(path))
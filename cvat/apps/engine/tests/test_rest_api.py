@@ -16,6 +16,8 @@ from cvat.apps.engine.models import (Task, Segment, Job, StatusChoice,
 from cvat.apps.annotation.models import AnnotationFormat
 from unittest import mock
 import io
+import tarfile
+import zipfile
 import xml.etree.ElementTree as ET
 from collections import defaultdict
 
@@ -1121,6 +1123,290 @@ class TaskDataAPITestCase(APITestCase):
     def test_api_v1_tasks_id_data_user(self):
         self._test_api_v1_tasks_id_data(self.user)
 
+    def test_api_v1_tasks_id_data_compression_workers(self):
+        images = {}
+        for name in ["test_1.jpg", "test_2.jpg", "test_3.jpg"]:
+            image = Image.open(os.path.join(settings.SHARE_ROOT, name))
+            images[name] = image.size
+            image.close()
+
+        for workers in [1, 2]:
+            response = self._create_task(self.owner, {
+                "name": "my task #{}".format(workers),
+                "image_quality": 75,
+                "labels": [{"name": "car"}],
+            })
+            task_id = response.data["id"]
+            with self.settings(IMAGE_COMPRESSION_WORKERS=workers):
+                response = self._run_api_v1_tasks_id_data(task_id, self.owner,
+                    {"server_files[{}]".format(idx): name
+                        for idx, name in enumerate(sorted(images))})
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+            db_task = Task.objects.get(pk=task_id)
+            self.assertEqual(db_task.size, len(images))
+            db_images = db_task.image_set.order_by("frame")
+            self.assertEqual([(os.path.basename(db_image.path),
+                (db_image.width, db_image.height)) for db_image in db_images],
+                sorted(images.items()))
+            for db_image in db_images:
+                image = Image.open(db_task.get_frame_path(db_image.frame))
+                self.assertEqual(image.size, (db_image.width, db_image.height))
+                image.close()
+
+    def test_api_v1_tasks_id_data_passthrough(self):
+        names = ["test_1.jpg", "test_2.jpg", "test_3.jpg"]
+        for margin in [None, 0]:
+            response = self._create_task(self.owner, {
+                "name": "my task #{}".format(margin),
+                "image_quality": 75,
+                "labels": [{"name": "car"}],
+            })
+            task_id = response.data["id"]
+            with self.settings(IMAGE_PASSTHROUGH_QUALITY_MARGIN=margin):
+                self._run_api_v1_tasks_id_data(task_id, self.owner,
+                    {"server_files[{}]".format(idx): name for idx, name in enumerate(names)})
+
+            db_task = Task.objects.get(pk=task_id)
+            for db_image in db_task.image_set.all():
+                with open(db_task.get_frame_path(db_image.frame), "rb") as frame_file, \
+                    open(os.path.join(settings.SHARE_ROOT, os.path.basename(db_image.path)),
+                        "rb") as image_file:
+                    # Test images are baseline RGB JPEG images of quality 75
+                    self.assertEqual(frame_file.read() == image_file.read(), margin == 0)
+
+    def test_api_v1_tasks_id_data_archives(self):
+        members = [("b/2.jpg", generate_image_file("2.jpg").getvalue()),
+            ("a.jpg", generate_image_file("a.jpg").getvalue()),
+            ("b/1.jpg", generate_image_file("1.jpg").getvalue()),
+            ("notes.txt", b"notes")]
+
+        def write_tar(path, mode, members):
+            self.addCleanup(os.remove, path)
+            with tarfile.open(path, mode) as tar:
+                for name, data in members:
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    tar.addfile(info, BytesIO(data))
+
+        archives = {"test.zip": True, "test.tar": True, "sorted.tar.gz": True}
+        # A compressed tar is extracted (by patool) if images aren't sorted in it
+        if shutil.which("patool"):
+            archives["test.tar.gz"] = False
+        self.addCleanup(os.remove, os.path.join(settings.SHARE_ROOT, "test.zip"))
+        with zipfile.ZipFile(os.path.join(settings.SHARE_ROOT, "test.zip"), "w") as zip_file:
+            for name, data in members:
+                zip_file.writestr(name, data)
+        write_tar(os.path.join(settings.SHARE_ROOT, "test.tar"), "w", members)
+        write_tar(os.path.join(settings.SHARE_ROOT, "sorted.tar.gz"), "w:gz", sorted(members))
+        write_tar(os.path.join(settings.SHARE_ROOT, "test.tar.gz"), "w:gz", members)
+
+        frames = {}
+        for archive, is_streamed in archives.items():
+            response = self._create_task(self.owner, {
+                "name": "my task {}".format(archive),
+                "image_quality": 75,
+                "labels": [{"name": "car"}],
+            })
+            task_id = response.data["id"]
+            response = self._run_api_v1_tasks_id_data(task_id, self.owner,
+                {"server_files[0]": archive})
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+            db_task = Task.objects.get(pk=task_id)
+            upload_dir = db_task.get_upload_dirname()
+            db_images = db_task.image_set.order_by("frame")
+            self.assertEqual([os.path.relpath(db_image.path, upload_dir) for db_image in db_images],
+                ["a.jpg", "b/1.jpg", "b/2.jpg"])
+            self.assertEqual(os.path.exists(os.path.join(upload_dir, "a.jpg")), not is_streamed)
+            frames[archive] = []
+            for db_image in db_images:
+                with open(db_task.get_frame_path(db_image.frame), "rb") as frame_file:
+                    frames[archive].append(frame_file.read())
+
+        self.assertEqual(len(set(map(tuple, frames.values()))), 1)
+
+    def test_api_v1_tasks_id_data_share_links(self):
+        names = ["test_1.jpg", "test_2.jpg", "data"]
+        frames = {}
+        # A reflink is a copy of the file, it is copied if there is no support
+        for links in [[], ["hardlink"], ["symlink"], ["reflink"]]:
+            response = self._create_task(self.owner, {
+                "name": "my task {}".format(links),
+                "image_quality": 75,
+                "labels": [{"name": "car"}],
+            })
+            task_id = response.data["id"]
+            with self.settings(SHARE_IMPORT_LINKS=links):
+                self._run_api_v1_tasks_id_data(task_id, self.owner,
+                    {"server_files[{}]".format(idx): name for idx, name in enumerate(names)})
+
+            db_task = Task.objects.get(pk=task_id)
+            upload_dir = db_task.get_upload_dirname()
+            for name in ["test_1.jpg", "test_2.jpg", os.path.join("data", "test_3.jpg")]:
+                path = os.path.join(upload_dir, name)
+                share_path = os.path.join(settings.SHARE_ROOT, name)
+                self.assertEqual(os.path.samefile(path, share_path),
+                    links in [["hardlink"], ["symlink"]])
+                self.assertEqual(os.path.islink(path), links == ["symlink"])
+                with open(path, "rb") as f1, open(share_path, "rb") as f2:
+                    self.assertEqual(f1.read(), f2.read())
+
+            db_images = db_task.image_set.order_by("frame")
+            self.assertEqual([os.path.relpath(db_image.path, upload_dir) for db_image in db_images],
+                ["test_1.jpg", "test_2.jpg", "data/test_3.jpg"])
+            frames[str(links)] = []
+            for db_image in db_images:
+                with open(db_task.get_frame_path(db_image.frame), "rb") as frame_file:
+                    frames[str(links)].append(frame_file.read())
+
+        self.assertEqual(len(set(map(tuple, frames.values()))), 1)
+
+    def _get_content(self, response):
+        if response.streaming:
+            return b"".join(response.streaming_content)
+        return response.content
+
+    def test_api_v1_tasks_id_data_chunks(self):
+        names = ["test_1.jpg", "test_2.jpg", "test_3.jpg"]
+        frames = {}
+        for chunk_size in [0, 2]:
+            response = self._create_task(self.owner, {
+                "name": "my task #{}".format(chunk_size),
+                "image_quality": 75,
+                "labels": [{"name": "car"}],
+            })
+            task_id = response.data["id"]
+            with self.settings(FRAME_CHUNK_SIZE=chunk_size):
+                self._run_api_v1_tasks_id_data(task_id, self.owner,
+                    {"server_files[{}]".format(idx): name
+                        for idx, name in enumerate(names)})
+
+            with ForceLogin(self.owner, self.client):
+                self.assertEqual(self.client.get("/api/v1/tasks/{}".format(
+                    task_id)).data["chunk_size"], chunk_size)
+                frames[chunk_size] = [self._get_content(self.client.get(
+                    "/api/v1/tasks/{}/frames/{}".format(task_id, frame)))
+                    for frame in range(len(names))]
+                if chunk_size:
+                    chunks = [self.client.get("/api/v1/tasks/{}/frames/chunks/{}".format(
+                        task_id, chunk)) for chunk in range(2)]
+
+        self.assertEqual(frames[0], frames[2])
+        self.assertEqual(len(os.listdir(os.path.join(
+            Task.objects.get(pk=task_id).get_data_dirname(), "chunks"))), 4)
+        for chunk, response in enumerate(chunks):
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            content = self._get_content(response)
+            offsets = [int(v) for v in response["X-Chunk-Offsets"].split(",")]
+            self.assertEqual([content[start:stop] for start, stop in
+                zip(offsets[:-1], offsets[1:])], frames[0][2 * chunk:2 * chunk + 2])
+
+        # A broken chunk is found before the stream of frames is started
+        db_task = Task.objects.get(pk=task_id)
+        with open(db_task.get_chunk_path(1), "r+b") as chunk_file:
+            chunk_file.truncate(1)
+        with ForceLogin(self.owner, self.client):
+            response = self.client.get("/api/v1/tasks/{}/frames".format(task_id),
+                {"start": 0, "stop": 2})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_api_v1_tasks_id_frames(self):
+        names = ["test_1.jpg", "test_2.jpg", "test_3.jpg"]
+        response = self._create_task(self.owner, {
+            "name": "my task #1",
+            "image_quality": 75,
+            "labels": [{"name": "car"}],
+        })
+        task_id = response.data["id"]
+        self._run_api_v1_tasks_id_data(task_id, self.owner,
+            {"server_files[{}]".format(idx): name for idx, name in enumerate(names)})
+
+        url = "/api/v1/tasks/{}/frames".format(task_id)
+        with ForceLogin(self.owner, self.client):
+            frames = [self._get_content(self.client.get("{}/{}".format(url, frame)))
+                for frame in range(len(names))]
+            response = self.client.get(url, {"start": 1, "stop": 10})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            with tarfile.open(fileobj=BytesIO(self._get_content(response))) as tar:
+                self.assertEqual(tar.getnames(), ["1.jpg", "2.jpg"])
+                self.assertEqual([tar.extractfile(name).read()
+                    for name in tar.getnames()], frames[1:])
+
+            response = self.client.get(url, {"start": 1, "stop": 10},
+                HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            with self.settings(FRAMES_BATCH_SIZE=2):
+                response = self.client.get(url, {"start": 0, "stop": 2})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+            os.remove(Task.objects.get(pk=task_id).get_frame_path(2))
+            response = self.client.get(url, {"start": 0, "stop": 2})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_api_v1_tasks_id_frames_previews(self):
+        names = ["test_1.jpg", "test_2.jpg"]
+        for chunk_size in [0, 2]:
+            response = self._create_task(self.owner, {
+                "name": "my task #{}".format(chunk_size),
+                "image_quality": 75,
+                "labels": [{"name": "car"}],
+            })
+            task_id = response.data["id"]
+            with self.settings(FRAME_CHUNK_SIZE=chunk_size, FRAME_PREVIEW_LEVELS=2):
+                self._run_api_v1_tasks_id_data(task_id, self.owner,
+                    {"server_files[{}]".format(idx): name for idx, name in enumerate(names)})
+            db_task = Task.objects.get(pk=task_id)
+            self.assertEqual(db_task.preview_levels, 2)
+
+            url = "/api/v1/tasks/{}/frames".format(task_id)
+            with ForceLogin(self.owner, self.client):
+                for db_image in db_task.image_set.all():
+                    for level, expected_level in [(0, 0), (1, 1), (2, 2), (5, 2)]:
+                        response = self.client.get("{}/{}".format(url, db_image.frame),
+                            {"level": level})
+                        image = Image.open(BytesIO(self._get_content(response)))
+                        self.assertEqual(image.size, (db_image.width >> expected_level,
+                            db_image.height >> expected_level))
+
+                response = self.client.get(url, {"level": 1})
+                with tarfile.open(fileobj=BytesIO(self._get_content(response))) as tar:
+                    self.assertEqual([Image.open(tar.extractfile(name)).width
+                        for name in tar.getnames()], [db_image.width >> 1
+                        for db_image in db_task.image_set.order_by("frame")])
+
+                response = self.client.get(url, {"level": "max"})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_api_v1_tasks_id_frames_meta(self):
+        names = ["test_1.jpg", "test_2.jpg", "test_3.jpg"]
+        response = self._create_task(self.owner, {
+            "name": "my task #1",
+            "image_quality": 75,
+            "labels": [{"name": "car"}],
+        })
+        task_id = response.data["id"]
+        self._run_api_v1_tasks_id_data(task_id, self.owner,
+            {"server_files[{}]".format(idx): name for idx, name in enumerate(names)})
+        db_task = Task.objects.get(pk=task_id)
+        expected = [{"width": db_image.width, "height": db_image.height}
+            for db_image in db_task.image_set.order_by("frame")]
+
+        url = "/api/v1/tasks/{}/frames/meta".format(task_id)
+        with ForceLogin(self.owner, self.client):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, expected)
+
+            # The cache in the old format is rebuilt from the database
+            with open(db_task.get_image_meta_cache_path(), "w") as meta_file:
+                meta_file.write(str({"original_size": []}))
+            self.assertEqual(self.client.get(url).data, expected)
+
     def test_api_v1_tasks_id_data_no_auth(self):
         data = {
             "name": "my task #3",
@@ -0,0 +1,117 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from cvat.apps.engine import task
+
+
+class _FileServer(ThreadingMixIn, HTTPServer):
+    """Serve files from a dict by paths, count GET requests and reply 503 to
+    the first requests of paths from the failures dict"""
+    daemon_threads = True
+
+    def __init__(self, files):
+        super().__init__(("127.0.0.1", 0), _FileRequestHandler)
+        self.files = files
+        self.failures = Counter()
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    def get_url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.server_port, path)
+
+class _FileRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests[self.path] += 1
+            fail = self.server.failures[self.path] > 0
+            self.server.failures[self.path] -= 1
+
+        if fail:
+            self.send_error(503)
+        elif self.path not in self.server.files:
+            self.send_error(404)
+        else:
+            data = self.server.files[self.path]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class DownloadDataTestCase(SimpleTestCase):
+    def setUp(self):
+        self.files = {"/images/{}.jpg".format(i): os.urandom(1000 + i)
+            for i in range(20)}
+        self.server = _FileServer(self.files)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir)
+        self.manifest_path = os.path.join(self.upload_dir, "download.manifest")
+
+        patcher = mock.patch.object(task.rq, "get_current_job")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _download(self, paths):
+        return task._download_data([self.server.get_url(path) for path in paths],
+            self.upload_dir, self.manifest_path)
+
+    def _assert_downloaded(self, paths):
+        for path in paths:
+            with open(os.path.join(self.upload_dir, os.path.basename(path)), "rb") as f:
+                self.assertEqual(f.read(), self.files[path])
+
+    def test_download(self):
+        paths = sorted(self.files)
+        self.assertEqual(self._download(paths), [os.path.basename(p) for p in paths])
+        self._assert_downloaded(paths)
+        self.assertEqual(set(self.server.requests.values()), {1})
+
+    def test_retry(self):
+        paths = sorted(self.files)
+        self.server.failures[paths[0]] = task._DOWNLOAD_ATTEMPTS - 1
+        with mock.patch.object(task, "_DOWNLOAD_RETRY_DELAY", 0):
+            self._download(paths)
+        self._assert_downloaded(paths)
+        self.assertEqual(self.server.requests[paths[0]], task._DOWNLOAD_ATTEMPTS)
+
+        self.server.failures[paths[0]] = task._DOWNLOAD_ATTEMPTS
+        os.remove(self.manifest_path)
+        with mock.patch.object(task, "_DOWNLOAD_RETRY_DELAY", 0), \
+            self.assertRaisesRegex(Exception, "503"):
+            self._download(paths)
+
+    def test_resume(self):
+        paths = sorted(self.files)
+        with self.assertRaisesRegex(Exception, "404"):
+            self._download(paths + ["/missing.jpg"])
+        self._assert_downloaded(paths)
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, "missing.jpg")))
+
+        # Files which are changed after downloading are downloaded again
+        with open(os.path.join(self.upload_dir, os.path.basename(paths[0])), "ab") as f:
+            f.write(b"\0")
+        os.remove(os.path.join(self.upload_dir, os.path.basename(paths[1])))
+        self.server.requests.clear()
+        self._download(paths)
+        self._assert_downloaded(paths)
+        self.assertEqual(set(self.server.requests), set(paths[:2]))
@@ -0,0 +1,28 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+from fakeredis import FakeStrictRedis
+from rq import Queue
+
+from cvat.apps.engine import worker
+
+
+def _get_answer():
+    return 42
+
+class SimpleWorkerTestCase(SimpleTestCase):
+    def test_close_old_connections(self):
+        connection = FakeStrictRedis()
+        queue = Queue("test", connection=connection)
+        job = queue.enqueue(_get_answer)
+
+        with mock.patch.object(worker, "close_old_connections") as close_old_connections:
+            worker.SimpleWorker([queue], connection=connection).work(burst=True)
+
+        job.refresh()
+        self.assertEqual(job.result, 42)
+        self.assertEqual(close_old_connections.call_count, 2)
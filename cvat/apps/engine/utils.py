@@ -1,6 +1,7 @@
 import ast
-from collections import namedtuple
+from collections import deque, namedtuple
 import importlib
+from itertools import islice
 import sys
 import traceback
 
@@ -40,14 +41,25 @@ def import_modules(source_code: str):
 class InterpreterError(Exception):
     pass
 
+def _make_syntax_error(err):
+    error_class = err.__class__.__name__
+    details = err.args[0]
+    line_number = err.lineno
+    return InterpreterError("{} at line {}: {}".format(error_class, line_number, details))
+
+def compile_python_code(source_code, filename="<string>"):
+    """Return a code object which can be passed to execute_python_code
+    instead of the source code to avoid its parsing on every call"""
+    try:
+        return compile(source_code, filename, "exec")
+    except SyntaxError as err:
+        raise _make_syntax_error(err)
+
 def execute_python_code(source_code, global_vars=None, local_vars=None):
     try:
         exec(source_code, global_vars, local_vars)
     except SyntaxError as err:
-        error_class = err.__class__.__name__
-        details = err.args[0]
-        line_number = err.lineno
-        raise InterpreterError("{} at line {}: {}".format(error_class, line_number, details))
+        raise _make_syntax_error(err)
     except AssertionError as err:
         # AssertionError doesn't contain any args and line number
         error_class = err.__class__.__name__
@@ -58,3 +70,22 @@ def execute_python_code(source_code, global_vars=None, local_vars=None):
         _, _, tb = sys.exc_info()
         line_number = traceback.extract_tb(tb)[-1][1]
         raise InterpreterError("{} at line {}: {}".format(error_class, line_number, details))
+
+def map_in_order(executor, func, iterable, max_pending):
+    """Like executor.map() but items are taken from the iterable only while
+    there are less than max_pending unfinished calls. Executor.map() takes
+    all items at once, that is too much if items are image data."""
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
@@ -5,12 +5,14 @@
 import os
 import re
 import traceback
-from ast import literal_eval
 import shutil
 from datetime import datetime
 from tempfile import mkstemp
 
-from django.http import HttpResponseBadRequest
+from django.http import (HttpResponse, HttpResponseBadRequest,
+    HttpResponseNotFound, StreamingHttpResponse)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.shortcuts import redirect, render
 from django.conf import settings
 from sendfile import sendfile
@@ -26,7 +28,7 @@ from django_filters import rest_framework as filters
 import django_rq
 from django.db import IntegrityError
 
-from . import annotation, task, models
+from . import annotation, frames, task, models
 from cvat.settings.base import JS_3RDPARTY, CSS_3RDPARTY
 from cvat.apps.authentication.decorators import login_required
 from .log import slogger, clogger
@@ -352,34 +354,107 @@ class TaskViewSet(auth.TaskGetQuerySetMixin, viewsets.ModelViewSet):
     @action(detail=True, methods=['GET'], serializer_class=ImageMetaSerializer,
         url_path='frames/meta')
     def data_info(request, pk):
+        db_task = models.Task.objects.get(pk=pk)
+        # Sizes are integers from the cache, so they aren't validated by
+        # ImageMetaSerializer (it is slow for tasks with many images)
+        data = task.get_image_meta_cache(db_task)['original_size']
+        return Response(data)
+
+    @staticmethod
+    def _get_level(request, db_task):
+        """Level of previews from the "level" query parameter. The level k is
+        2**k times smaller than the original frame. If the task doesn't have
+        the level, the closest one is used."""
         try:
-            db_task = models.Task.objects.get(pk=pk)
-            meta_cache_file = open(db_task.get_image_meta_cache_path())
-        except OSError:
-            task.make_image_meta_cache(db_task)
-            meta_cache_file = open(db_task.get_image_meta_cache_path())
-
-        data = literal_eval(meta_cache_file.read())
-        serializer = ImageMetaSerializer(many=True, data=data['original_size'])
-        if serializer.is_valid(raise_exception=True):
-            return Response(serializer.data)
+            return frames.get_level(db_task, request.query_params.get('level', 0))
+        except ValueError:
+            raise serializers.ValidationError("level must be an integer")
+
+    @action(detail=True, methods=['GET'], serializer_class=None,
+        url_path='frames')
+    def frame_range(self, request, pk):
+        """Get frames [start, stop] of the task as a tar stream with
+        <frame>.jpg members. Frames don't change after the task is created,
+        so the response can be validated by ETag and Last-Modified."""
+
+        db_task = self.get_object()
+        batch_size = settings.FRAMES_BATCH_SIZE
+        try:
+            start = int(request.query_params.get('start', 0))
+            stop = int(request.query_params.get('stop', start + batch_size - 1))
+        except ValueError:
+            raise serializers.ValidationError("start and stop must be integers")
+        stop = min(stop, db_task.size - 1)
+        if not 0 <= start <= stop or stop - start >= batch_size:
+            raise serializers.ValidationError("Invalid range of frames: a range "
+                "inside of the task not longer than {} frames is expected".format(batch_size))
+        level = self._get_level(request, db_task)
+
+        try:
+            last_modified = int(os.path.getmtime(db_task.get_data_dirname()))
+            etag = quote_etag("{}-{}-{}-{}-{}".format(db_task.id, start, stop,
+                level, last_modified))
+            response = get_conditional_response(request, etag=etag,
+                last_modified=last_modified)
+            if response is None:
+                frames.check_frames(db_task, start, stop, level)
+                response = StreamingHttpResponse(
+                    frames.iter_tar(db_task, start, stop, level),
+                    content_type="application/x-tar")
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            return response
+        except FileNotFoundError as e:
+            slogger.task[pk].error("cannot get frames", exc_info=True)
+            return HttpResponseNotFound(str(e))
+        except Exception as e:
+            slogger.task[pk].error("cannot get frames", exc_info=True)
+            return HttpResponseBadRequest(str(e))
 
     @action(detail=True, methods=['GET'], serializer_class=None,
         url_path='frames/(?P<frame>\d+)')
     def frame(self, request, pk, frame):
         """Get a frame for the task"""
 
+        db_task = self.get_object()
+        level = self._get_level(request, db_task)
         try:
+            if db_task.chunk_size:
+                return HttpResponse(frames.read_frame(db_task, frame, level),
+                    content_type="image/jpeg")
+
             # Follow symbol links if the frame is a link on a real image otherwise
             # mimetype detection inside sendfile will work incorrectly.
-            db_task = self.get_object()
-            path = os.path.realpath(db_task.get_frame_path(frame))
+            path = os.path.realpath(db_task.get_frame_path(frame, level))
             return sendfile(request, path)
         except Exception as e:
             slogger.task[pk].error(
                 "cannot get frame #{}".format(frame), exc_info=True)
             return HttpResponseBadRequest(str(e))
 
+    @action(detail=True, methods=['GET'], serializer_class=None,
+        url_path='frames/chunks/(?P<chunk>\d+)')
+    def chunk(self, request, pk, chunk):
+        """Get concatenated JPEG images of frames of a chunk. Frames
+        [chunk * chunk_size, (chunk + 1) * chunk_size) are in the chunk,
+        offsets of the images are in the X-Chunk-Offsets header."""
+
+        db_task = self.get_object()
+        level = self._get_level(request, db_task)
+        try:
+            if not db_task.chunk_size:
+                raise Exception("Frames of the task aren't stored in chunks")
+
+            offsets = frames.get_chunk_offsets(db_task, chunk, level)
+            response = sendfile(request, db_task.get_chunk_path(chunk, level),
+                mimetype="video/x-motion-jpeg")
+            response["X-Chunk-Offsets"] = ",".join(map(str, offsets))
+            return response
+        except Exception as e:
+            slogger.task[pk].error(
+                "cannot get chunk #{}".format(chunk), exc_info=True)
+            return HttpResponseBadRequest(str(e))
+
 class JobViewSet(viewsets.GenericViewSet,
     mixins.RetrieveModelMixin, mixins.UpdateModelMixin):
     queryset = Job.objects.all().order_by('id')
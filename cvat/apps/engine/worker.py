@@ -0,0 +1,20 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+from django.db import close_old_connections
+import rq
+
+
+class SimpleWorker(rq.SimpleWorker):
+    """Run jobs in the worker process itself (without forking), so objects
+    which are loaded by a job (e.g. models of the auto annotation model
+    registry) are kept for next jobs. Database connections are closed before
+    and after every job if they are broken or too old (as Django does for
+    requests), otherwise one dropped connection would fail all next jobs."""
+    def execute_job(self, job, queue):
+        close_old_connections()
+        try:
+            return super().execute_job(job, queue)
+        finally:
+            close_old_connections()
@@ -7,19 +7,19 @@ import rq
 import cv2
 import math
 import numpy
-import fnmatch
 
 from openvino.inference_engine import IENetwork, IEPlugin
 from scipy.optimize import linear_sum_assignment
 from scipy.spatial.distance import euclidean, cosine
 
+from cvat.apps.engine.frames import read_frame
 from cvat.apps.engine.models import Job
 
 
 class ReID:
     __threshold = None
     __max_distance = None
-    __frame_urls = None
+    __db_task = None
     __frame_boxes = None
     __stop_frame = None
     __plugin = None
@@ -33,7 +33,6 @@ class ReID:
     def __init__(self, jid, data):
         self.__threshold = data["threshold"]
         self.__max_distance = data["maxDistance"]
-        self.__frame_urls = {}
         self.__frame_boxes = {}
 
         db_job = Job.objects.select_related('segment__task').get(pk = jid)
@@ -41,14 +40,10 @@ class ReID:
         db_task = db_segment.task
 
         self.__stop_frame = db_segment.stop_frame
+        self.__db_task = db_task
 
-        for root, _, filenames in os.walk(db_task.get_data_dirname()):
-            for filename in fnmatch.filter(filenames, '*.jpg'):
-                frame = int(os.path.splitext(filename)[0])
-                if frame >= db_segment.start_frame and frame <= db_segment.stop_frame:
-                    self.__frame_urls[frame] = os.path.join(root, filename)
-
-        for frame in self.__frame_urls:
+        # Frames are read by engine.frames, they can be stored in chunks
+        for frame in range(db_segment.start_frame, db_segment.stop_frame + 1):
             self.__frame_boxes[frame] = [box for box in data["boxes"] if box["frame"] == frame]
 
         IE_PLUGINS_PATH = os.getenv('IE_PLUGINS_PATH', None)
@@ -81,6 +76,11 @@ class ReID:
             self.__plugin = None
 
 
+    def __read_image(self, frame):
+        data = read_frame(self.__db_task, frame)
+        return cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+
+
     def __boxes_are_compatible(self, cur_box, next_box):
         cur_c_x = (cur_box["points"][0] + cur_box["points"][2]) / 2
         cur_c_y = (cur_box["points"][1] + cur_box["points"][3]) / 2
@@ -171,8 +171,8 @@ class ReID:
             if not (len(cur_boxes) and len(next_boxes)):
                 continue
 
-            cur_image = cv2.imread(self.__frame_urls[cur_frame], cv2.IMREAD_COLOR)
-            next_image = cv2.imread(self.__frame_urls[next_frame], cv2.IMREAD_COLOR)
+            cur_image = self.__read_image(cur_frame)
+            next_image = self.__read_image(next_frame)
             difference_matrix = self.__compute_difference_matrix(cur_boxes, next_boxes, cur_image, next_image)
             cur_idxs, next_idxs = linear_sum_assignment(difference_matrix)
             for idx, cur_idx in enumerate(cur_idxs):
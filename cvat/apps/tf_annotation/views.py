@@ -12,9 +12,9 @@ from cvat.apps.engine.models import Task as TaskModel
 from cvat.apps.engine import annotation, task
 from cvat.apps.engine.serializers import LabeledDataSerializer
 from cvat.apps.engine.annotation import put_task_data
+from cvat.apps.engine.frames import read_frame
 
 import django_rq
-import fnmatch
 import logging
 import json
 import os
@@ -23,8 +23,10 @@ import rq
 import tensorflow as tf
 import numpy as np
 
+from io import BytesIO
 from PIL import Image
 from cvat.apps.engine.log import slogger
+from cvat.apps.auto_annotation.model_registry import model_registry, format_metrics
 
 
 def load_image_into_numpy(image):
@@ -32,7 +34,12 @@ def load_image_into_numpy(image):
     return np.array(image.getdata()).reshape((im_height, im_width, 3)).astype(np.uint8)
 
 
-def run_inference_engine_annotation(image_list, labels_mapping, treshold):
+def open_image(db_task, frame):
+    # Frames are read by engine.frames, they can be stored in chunks
+    return Image.open(BytesIO(read_frame(db_task, frame)))
+
+
+def run_inference_engine_annotation(db_task, labels_mapping, treshold):
     from cvat.apps.auto_annotation.inference_engine import make_plugin, make_network
 
     def _normalize_box(box, w, h, dw, dh):
@@ -47,51 +54,54 @@ def run_inference_engine_annotation(image_list, labels_mapping, treshold):
     if MODEL_PATH is None:
         raise OSError('Model path env not found in the system.')
 
-    plugin = make_plugin()
-    network = make_network('{}.xml'.format(MODEL_PATH), '{}.bin'.format(MODEL_PATH))
-    input_blob_name = next(iter(network.inputs))
-    output_blob_name = next(iter(network.outputs))
-    executable_network = plugin.load(network=network)
+    model_file = '{}.xml'.format(MODEL_PATH)
+    weights_file = '{}.bin'.format(MODEL_PATH)
+
+    def load_network():
+        plugin = make_plugin()
+        network = make_network(model_file, weights_file)
+        input_blob_name = next(iter(network.inputs))
+        output_blob_name = next(iter(network.outputs))
+        # The plugin is kept while the network is loaded into it
+        return plugin, plugin.load(network=network), input_blob_name, output_blob_name
+
+    _, executable_network, input_blob_name, output_blob_name = model_registry.get(
+        ('tf_annotation', model_file), (model_file, weights_file), load_network)
+    slogger.glob.info(format_metrics())
     job = rq.get_current_job()
 
-    del network
+    for image_num in range(db_task.size):
 
-    try:
-        for image_num, im_name in enumerate(image_list):
-
-            job.refresh()
-            if 'cancel' in job.meta:
-                del job.meta['cancel']
-                job.save()
-                return None
-            job.meta['progress'] = image_num * 100 / len(image_list)
-            job.save_meta()
-
-            image = Image.open(im_name)
-            width, height = image.size
-            image.thumbnail((600, 600), Image.ANTIALIAS)
-            dwidth, dheight = 600 / image.size[0], 600 / image.size[1]
-            image = image.crop((0, 0, 600, 600))
-            image_np = load_image_into_numpy(image)
-            image_np = np.transpose(image_np, (2, 0, 1))
-            prediction = executable_network.infer(inputs={input_blob_name: image_np[np.newaxis, ...]})[output_blob_name][0][0]
-            for obj in prediction:
-                obj_class = int(obj[1])
-                obj_value = obj[2]
-                if obj_class and obj_class in labels_mapping and obj_value >= treshold:
-                    label = labels_mapping[obj_class]
-                    if label not in result:
-                        result[label] = []
-                    xmin, ymin, xmax, ymax = _normalize_box(obj[3:7], width, height, dwidth, dheight)
-                    result[label].append([image_num, xmin, ymin, xmax, ymax])
-    finally:
-        del executable_network
-        del plugin
+        job.refresh()
+        if 'cancel' in job.meta:
+            del job.meta['cancel']
+            job.save()
+            return None
+        job.meta['progress'] = image_num * 100 / db_task.size
+        job.save_meta()
+
+        image = open_image(db_task, image_num)
+        width, height = image.size
+        image.thumbnail((600, 600), Image.ANTIALIAS)
+        dwidth, dheight = 600 / image.size[0], 600 / image.size[1]
+        image = image.crop((0, 0, 600, 600))
+        image_np = load_image_into_numpy(image)
+        image_np = np.transpose(image_np, (2, 0, 1))
+        prediction = executable_network.infer(inputs={input_blob_name: image_np[np.newaxis, ...]})[output_blob_name][0][0]
+        for obj in prediction:
+            obj_class = int(obj[1])
+            obj_value = obj[2]
+            if obj_class and obj_class in labels_mapping and obj_value >= treshold:
+                label = labels_mapping[obj_class]
+                if label not in result:
+                    result[label] = []
+                xmin, ymin, xmax, ymax = _normalize_box(obj[3:7], width, height, dwidth, dheight)
+                result[label].append([image_num, xmin, ymin, xmax, ymax])
 
     return result
 
 
-def run_tensorflow_annotation(image_list, labels_mapping, treshold):
+def run_tensorflow_annotation(db_task, labels_mapping, treshold):
     def _normalize_box(box, w, h):
         xmin = int(box[1] * w)
         ymin = int(box[0] * h)
@@ -103,69 +113,61 @@ def run_tensorflow_annotation(image_list, labels_mapping, treshold):
     model_path = os.environ.get('TF_ANNOTATION_MODEL_PATH')
     if model_path is None:
         raise OSError('Model path env not found in the system.')
-    job = rq.get_current_job()
-
-    detection_graph = tf.Graph()
-    with detection_graph.as_default():
-        od_graph_def = tf.GraphDef()
-        with tf.gfile.GFile(model_path + '.pb', 'rb') as fid:
-            serialized_graph = fid.read()
-            od_graph_def.ParseFromString(serialized_graph)
-            tf.import_graph_def(od_graph_def, name='')
 
-        try:
-            config = tf.ConfigProto()
-            config.gpu_options.allow_growth=True
-            sess = tf.Session(graph=detection_graph, config=config)
-            for image_num, image_path in enumerate(image_list):
-
-                job.refresh()
-                if 'cancel' in job.meta:
-                    del job.meta['cancel']
-                    job.save()
-                    return None
-                job.meta['progress'] = image_num * 100 / len(image_list)
-                job.save_meta()
-
-                image = Image.open(image_path)
-                width, height = image.size
-                if width > 1920 or height > 1080:
-                    image = image.resize((width // 2, height // 2), Image.ANTIALIAS)
-                image_np = load_image_into_numpy(image)
-                image_np_expanded = np.expand_dims(image_np, axis=0)
-
-                image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
-                boxes = detection_graph.get_tensor_by_name('detection_boxes:0')
-                scores = detection_graph.get_tensor_by_name('detection_scores:0')
-                classes = detection_graph.get_tensor_by_name('detection_classes:0')
-                num_detections = detection_graph.get_tensor_by_name('num_detections:0')
-                (boxes, scores, classes, num_detections) = sess.run([boxes, scores, classes, num_detections], feed_dict={image_tensor: image_np_expanded})
-
-                for i in range(len(classes[0])):
-                    if classes[0][i] in labels_mapping.keys():
-                        if scores[0][i] >= treshold:
-                            xmin, ymin, xmax, ymax = _normalize_box(boxes[0][i], width, height)
-                            label = labels_mapping[classes[0][i]]
-                            if label not in result:
-                                result[label] = []
-                            result[label].append([image_num, xmin, ymin, xmax, ymax])
-        finally:
-            sess.close()
-            del sess
-    return result
+    model_file = model_path + '.pb'
+    def load_graph():
+        detection_graph = tf.Graph()
+        with detection_graph.as_default():
+            od_graph_def = tf.GraphDef()
+            with tf.gfile.GFile(model_file, 'rb') as fid:
+                serialized_graph = fid.read()
+                od_graph_def.ParseFromString(serialized_graph)
+                tf.import_graph_def(od_graph_def, name='')
+
+        config = tf.ConfigProto()
+        config.gpu_options.allow_growth=True
+        return detection_graph, tf.Session(graph=detection_graph, config=config)
+
+    # The graph and the session are kept by the worker for next jobs
+    detection_graph, sess = model_registry.get(('tf_annotation.tensorflow', model_file),
+        (model_file,), load_graph)
+    slogger.glob.info(format_metrics())
+    job = rq.get_current_job()
 
+    for image_num in range(db_task.size):
 
-def make_image_list(path_to_data):
-    def get_image_key(item):
-        return int(os.path.splitext(os.path.basename(item))[0])
+        job.refresh()
+        if 'cancel' in job.meta:
+            del job.meta['cancel']
+            job.save()
+            return None
+        job.meta['progress'] = image_num * 100 / db_task.size
+        job.save_meta()
 
-    image_list = []
-    for root, dirnames, filenames in os.walk(path_to_data):
-        for filename in fnmatch.filter(filenames, '*.jpg'):
-                image_list.append(os.path.join(root, filename))
+        image = open_image(db_task, image_num)
+        width, height = image.size
+        if width > 1920 or height > 1080:
+            image = image.resize((width // 2, height // 2), Image.ANTIALIAS)
+        image_np = load_image_into_numpy(image)
+        image_np_expanded = np.expand_dims(image_np, axis=0)
+
+        image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
+        boxes = detection_graph.get_tensor_by_name('detection_boxes:0')
+        scores = detection_graph.get_tensor_by_name('detection_scores:0')
+        classes = detection_graph.get_tensor_by_name('detection_classes:0')
+        num_detections = detection_graph.get_tensor_by_name('num_detections:0')
+        (boxes, scores, classes, num_detections) = sess.run([boxes, scores, classes, num_detections], feed_dict={image_tensor: image_np_expanded})
+
+        for i in range(len(classes[0])):
+            if classes[0][i] in labels_mapping.keys():
+                if scores[0][i] >= treshold:
+                    xmin, ymin, xmax, ymax = _normalize_box(boxes[0][i], width, height)
+                    label = labels_mapping[classes[0][i]]
+                    if label not in result:
+                        result[label] = []
+                    result[label].append([image_num, xmin, ymin, xmax, ymax])
 
-    image_list.sort(key=get_image_key)
-    return image_list
+    return result
 
 
 def convert_to_cvat_format(data):
@@ -201,13 +203,11 @@ def create_thread(tid, labels_mapping, user):
         job.save_meta()
         # Get job indexes and segment length
         db_task = TaskModel.objects.get(pk=tid)
-        # Get image list
-        image_list = make_image_list(db_task.get_data_dirname())
 
         # Run auto annotation by tf
         result = None
         slogger.glob.info("tf annotation with tensorflow framework for task {}".format(tid))
-        result = run_tensorflow_annotation(image_list, labels_mapping, TRESHOLD)
+        result = run_tensorflow_annotation(db_task, labels_mapping, TRESHOLD)
 
         if result is None:
             slogger.glob.info('tf annotation for task {} canceled by user'.format(tid))
@@ -229,7 +229,7 @@ def create_thread(tid, labels_mapping, user):
 @login_required
 def get_meta_info(request):
     try:
-        queue = django_rq.get_queue('low')
+        queue = django_rq.get_queue('inference')
         tids = json.loads(request.body.decode('utf-8'))
         result = {}
         for tid in tids:
@@ -253,7 +253,7 @@ def create(request, tid):
     slogger.glob.info('tf annotation create request for task {}'.format(tid))
     try:
         db_task = TaskModel.objects.get(pk=tid)
-        queue = django_rq.get_queue('low')
+        queue = django_rq.get_queue('inference')
         job = queue.fetch_job('tf_annotation.create/{}'.format(tid))
         if job is not None and (job.is_started or job.is_queued):
             raise Exception("The process is already running")
@@ -310,7 +310,7 @@ def create(request, tid):
     fn=objectgetter(TaskModel, 'tid'), raise_exception=True)
 def check(request, tid):
     try:
-        queue = django_rq.get_queue('low')
+        queue = django_rq.get_queue('inference')
         job = queue.fetch_job('tf_annotation.create/{}'.format(tid))
         if job is not None and 'cancel' in job.meta:
             return JsonResponse({'status': 'finished'})
@@ -341,7 +341,7 @@ def check(request, tid):
     fn=objectgetter(TaskModel, 'tid'), raise_exception=True)
 def cancel(request, tid):
     try:
-        queue = django_rq.get_queue('low')
+        queue = django_rq.get_queue('inference')
         job = queue.fetch_job('tf_annotation.create/{}'.format(tid))
         if job is None or job.is_finished or job.is_failed:
             raise Exception('Task is not being annotated currently')
@@ -228,6 +228,20 @@ RQ_QUEUES = {
         'PORT': 6379,
         'DB': 0,
         'DEFAULT_TIMEOUT': '24h'
+    },
+    # Jobs which keep loaded models in the worker (auto annotation and
+    # TF annotation), its worker doesn't fork for jobs
+    'inference': {
+        'HOST': 'localhost',
+        'PORT': 6379,
+        'DB': 0,
+        'DEFAULT_TIMEOUT': '24h'
+    },
+    'dextr': {
+        'HOST': 'localhost',
+        'PORT': 6379,
+        'DB': 0,
+        'DEFAULT_TIMEOUT': '1m'
     }
 }
 
@@ -371,6 +385,98 @@ os.makedirs(SHARE_ROOT, exist_ok=True)
 MODELS_ROOT = os.path.join(BASE_DIR, 'models')
 os.makedirs(MODELS_ROOT, exist_ok=True)
 
+CACHE_ROOT = os.path.join(BASE_DIR, 'cache')
+os.makedirs(CACHE_ROOT, exist_ok=True)
+
+# Serialized job annotations are cached by commit version (see
+# cvat.apps.engine.annotation). Any Django cache backend can be used here
+# (e.g. a Redis one). Values are stored as zlib compressed JSON.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'annotations': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_ROOT, 'annotations'),
+        'TIMEOUT': 7 * 24 * 60 * 60, # 1 week
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+# Store points of new and changed shapes as packed float32 values instead of
+# comma-separated text. Both formats are read, thus the option can be changed
+# at any moment. Existing shapes can be converted by `manage.py packpoints`.
+# float32 keeps ~7 significant digits (e.g. 1/100 px for 4K images).
+ANNOTATION_PACKED_POINTS = False
+
+# Number of threads which read jobs of a task concurrently (every thread uses
+# its own DB connection). Jobs are read one by one if it is 1.
+TASK_ANNOTATION_LOAD_WORKERS = 1
+
+# On PostgreSQL annotations are inserted by COPY instead of INSERT if a table
+# gets at least this number of objects at once. None disables COPY.
+ANNOTATION_COPY_MIN_OBJECTS = 1000
+
+# Number of processes which compress images of a new task
+IMAGE_COMPRESSION_WORKERS = os.cpu_count() or 1
+
+# Source JPEG images are saved as frames as is (without decoding and
+# re-encoding) if they are baseline RGB, aren't rotated by EXIF, aren't larger
+# than IMAGE_PASSTHROUGH_MAX_FILE_SIZE bytes and their quality (estimated by
+# quantization tables) isn't higher than the task image quality plus the
+# margin. It is disabled by default (None), 0 enables it for images whose
+# quality isn't higher than the task image quality.
+IMAGE_PASSTHROUGH_QUALITY_MARGIN = None
+IMAGE_PASSTHROUGH_MAX_FILE_SIZE = 10 * 1024 * 1024
+
+# Number of threads which download remote files of a new task concurrently
+REMOTE_FILES_DOWNLOAD_WORKERS = 8
+
+# Ways to import share files into a new task instead of copying, they are
+# tried in the order and a file is copied if none of them works:
+# 'reflink' (copy-on-write clone, e.g. Btrfs or XFS), 'hardlink' (the same
+# file system, changes of share files are seen by tasks) and 'symlink'
+# (tasks depend on the share files).
+SHARE_IMPORT_LINKS = ['reflink']
+# Number of threads which import share files of a new task
+SHARE_IMPORT_WORKERS = 8
+
+# Number of frames which are packed into one chunk file for new tasks. Zero
+# means that every frame is stored in its own file.
+FRAME_CHUNK_SIZE = 0
+
+# Number of downscaled previews of frames for new tasks. The level k is
+# 2**k times smaller than the original frame. Previews can be requested by
+# the "level" parameter of api/v1/tasks/<id>/frames.
+FRAME_PREVIEW_LEVELS = 0
+
+# Auto annotation (OpenVINO): number of images in one network input (it is
+# used only if outputs of the model can be split by images), number of
+# asynchronous infer requests and number of threads which decode and resize
+# frames ahead of inference
+AUTO_ANNOTATION_BATCH_SIZE = 1
+AUTO_ANNOTATION_INFER_REQUESTS = 2
+AUTO_ANNOTATION_DECODE_WORKERS = 4
+# Auto annotation saves shapes into the task every time this number of
+# frames is processed, so memory doesn't grow with the task size and
+# processed frames are kept if it is canceled or fails
+AUTO_ANNOTATION_SAVE_CHUNK_SIZE = 1024
+# Maximal number of loaded networks and compiled interpretation scripts
+# which are kept by a worker process between auto annotation runs
+AUTO_ANNOTATION_MODEL_CACHE_SIZE = 4
+
+# Number of decoded frames which the DEXTR worker keeps for next clicks and
+# the time in seconds which api of DEXTR waits for a polygon before the
+# client has to poll for it. A waiting request holds a thread of the server
+# (runmodwsgi has 5 threads by default), so the timeout should be short.
+DEXTR_FRAME_CACHE_SIZE = 8
+DEXTR_WAIT_TIMEOUT = 3
+
+# Maximal number of frames in one response of api/v1/tasks/<id>/frames
+FRAMES_BATCH_SIZE = 100
+
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100 MB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = None   # this django check disabled
 LOCAL_LOAD_MAX_FILES_COUNT = 500
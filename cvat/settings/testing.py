@@ -11,6 +11,9 @@ DATA_ROOT = os.path.join(_temp_dir.name, 'data')
 os.makedirs(DATA_ROOT, exist_ok=True)
 SHARE_ROOT = os.path.join(_temp_dir.name, 'share')
 os.makedirs(SHARE_ROOT, exist_ok=True)
+CACHE_ROOT = os.path.join(_temp_dir.name, 'cache')
+os.makedirs(CACHE_ROOT, exist_ok=True)
+CACHES['annotations']['LOCATION'] = os.path.join(CACHE_ROOT, 'annotations')
 
 # To avoid ERROR django.security.SuspiciousFileOperation:
 # The joined path (...) is located outside of the base path component
@@ -12,6 +12,7 @@ work_dir = os.path.dirname(os.path.abspath(__file__))
 cvat_dir = os.path.join(work_dir, '..', '..')
 
 sys.path.insert(0, cvat_dir)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cvat.settings.development')
 
 from cvat.apps.auto_annotation.inference import run_inference_engine_annotation
 
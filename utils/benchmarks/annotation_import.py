@@ -0,0 +1,82 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of saving imported annotations (TaskAnnotation.create is the last
+step of an upload) by INSERT and, on PostgreSQL, by COPY. Run it against
+PostgreSQL (e.g. with DJANGO_SETTINGS_MODULE) to compare both writers."""
+
+import argparse
+
+from common import (setup_django, test_database, measure, print_table,
+    format_size, create_db_task, generate_tracks)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='*', type=int,
+        default=[100000, 1000000],
+        help='Numbers of boxes (a half of them are tracked) in the synthetic task')
+    parser.add_argument('--frames', default=10000, type=int)
+    parser.add_argument('--segment-size', default=0, type=int)
+
+    return vars(parser.parse_args())
+
+
+def _generate_shapes(db_task, count):
+    db_label = db_task.label_set.first()
+    spec_ids = [spec.id for spec in db_label.attributespec_set.all()]
+
+    return [{
+        "frame": idx % db_task.size,
+        "label_id": db_label.id,
+        "group": 0,
+        "type": "rectangle",
+        "occluded": False,
+        "z_order": 0,
+        "points": [float(idx % 100), 10.0, 100.0, 200.0],
+        "attributes": [{"spec_id": spec_id, "value": "value"}
+            for spec_id in spec_ids],
+    } for idx in range(count)]
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.conf import settings
+    from django.db import transaction
+    from django.test.utils import override_settings
+    from cvat.apps.engine.annotation import TaskAnnotation
+
+    def _import(db_task, data):
+        with transaction.atomic():
+            TaskAnnotation(db_task.id, None).create(data)
+
+    writers = [("insert", None)]
+    if 'postgresql' in settings.DATABASES["default"]["ENGINE"]:
+        writers.append(("copy", settings.ANNOTATION_COPY_MIN_OBJECTS))
+
+    rows = []
+    with test_database():
+        for size in kwargs['sizes']:
+            for name, copy_min_objects in writers:
+                db_task = create_db_task(size=kwargs['frames'],
+                    segment_size=kwargs['segment_size'], mode="annotation")
+                data = {
+                    "version": 0,
+                    "tags": [],
+                    "shapes": _generate_shapes(db_task, size // 2),
+                    "tracks": generate_tracks(db_task, 0, db_task.size - 1,
+                        size - size // 2),
+                }
+                with override_settings(ANNOTATION_COPY_MIN_OBJECTS=copy_min_objects):
+                    _, elapsed, peak = measure(_import, db_task, data)
+                rows.append((size, name, "{:.2f}".format(elapsed), format_size(peak)))
+                db_task.delete()
+
+    print_table(("boxes", "writer", "time, s", "peak memory"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Rows fetched, time and peak memory of JobAnnotation.init_from_db for
+synthetic jobs with a lot of tracked shapes (with and without the cache
+of serialized annotations)."""
+
+import argparse
+
+from common import (setup_django, test_database, QueryCounter, measure,
+    print_table, format_size, create_db_task, generate_tracks, save_tracks)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='*', type=int,
+        default=[10000, 100000, 1000000],
+        help='Numbers of tracked shapes in the synthetic job')
+    parser.add_argument('--shapes-per-track', default=2000, type=int,
+        help='Number of keyframes in every track')
+
+    return vars(parser.parse_args())
+
+
+def _count_rows(db_job):
+    from cvat.apps.engine import models
+
+    tracks = models.LabeledTrack.objects.filter(job_id=db_job.id)
+    fetched = tracks.count() + \
+        models.LabeledTrackAttributeVal.objects.filter(track__job_id=db_job.id).count() + \
+        models.TrackedShape.objects.filter(track__job_id=db_job.id).count() + \
+        models.TrackedShapeAttributeVal.objects.filter(shape__track__job_id=db_job.id).count()
+
+    # The number of rows which a single JOIN over all track tables returns
+    joined = tracks.values(
+        "id", "labeledtrackattributeval__id", "trackedshape__id",
+        "trackedshape__trackedshapeattributeval__id").count()
+
+    return fetched, joined
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.db import transaction
+    from cvat.apps.engine.annotation import JobAnnotation
+
+    rows = []
+    with test_database() as connection:
+        for size in kwargs['sizes']:
+            frames = max(kwargs['shapes_per_track'], 1)
+            db_task = create_db_task(size=frames)
+            db_job = db_task.segment_set.first().job_set.first()
+            save_tracks(db_job, generate_tracks(db_task, 0, frames - 1, size,
+                shapes_per_track=kwargs['shapes_per_track']))
+
+            fetched, joined = _count_rows(db_job)
+            with transaction.atomic(), QueryCounter(connection) as counter:
+                annotation = JobAnnotation(db_job.id, None)
+                _, elapsed, peak = measure(annotation.init_from_db)
+
+            # The first read after a commit fills the cache of serialized
+            # annotations, the second one is served from it.
+            with transaction.atomic():
+                annotation = JobAnnotation(db_job.id, None)
+                annotation._commit()
+                annotation.init_from_db()
+                annotation = JobAnnotation(db_job.id, None)
+                _, cached_elapsed, _ = measure(annotation.init_from_db)
+
+            rows.append((size, counter.count, fetched, joined,
+                "{:.2f}".format(elapsed), format_size(peak),
+                "{:.2f}".format(cached_elapsed)))
+            db_task.delete()
+
+    print_table(("shapes", "queries", "rows fetched", "rows in JOIN",
+        "time, s", "peak memory", "cached time, s"), rows)
+
+
+if __name__ == "__main__":
+    main()
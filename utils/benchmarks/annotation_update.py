@@ -0,0 +1,101 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Queries and time of a PATCH "update" request which changes a few boxes
+in a synthetic job with a lot of objects: in-place update of changed rows
+vs deletion and insertion of all objects from the request."""
+
+import argparse
+import copy
+
+from common import (setup_django, test_database, QueryCounter, measure,
+    print_table, create_db_task)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', nargs='*', type=int,
+        default=[1000, 10000, 50000],
+        help='Numbers of shapes in the synthetic job')
+    parser.add_argument('--changed', default=10, type=int,
+        help='Number of shapes in the request')
+
+    return vars(parser.parse_args())
+
+
+def _generate_shapes(db_task, count):
+    db_label = db_task.label_set.first()
+    spec_ids = [spec.id for spec in db_label.attributespec_set.all()]
+
+    return [{
+        "frame": idx % db_task.size,
+        "label_id": db_label.id,
+        "group": 0,
+        "type": "rectangle",
+        "occluded": False,
+        "z_order": 0,
+        "points": [float(idx % 100), 10.0, 100.0, 200.0],
+        "attributes": [{"spec_id": spec_id, "value": "value"}
+            for spec_id in spec_ids],
+    } for idx in range(count)]
+
+
+def _replace(annotation, data):
+    """The way "update" worked before: delete requested objects and create
+    them again"""
+    annotation._delete(data)
+    annotation._create(data)
+    annotation._commit()
+
+
+def _run(connection, db_job, data, method):
+    from django.db import transaction
+    from cvat.apps.engine.annotation import JobAnnotation
+
+    with transaction.atomic(), QueryCounter(connection) as counter:
+        annotation = JobAnnotation(db_job.id, None)
+        _, elapsed, _ = measure(method, annotation, copy.deepcopy(data))
+
+    return counter.count, elapsed
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.db import transaction
+    from cvat.apps.engine.annotation import JobAnnotation
+
+    rows = []
+    with test_database() as connection:
+        for size in kwargs['sizes']:
+            db_task = create_db_task(size=1000, mode="annotation")
+            db_job = db_task.segment_set.first().job_set.first()
+            with transaction.atomic():
+                annotation = JobAnnotation(db_job.id, None)
+                annotation.create({"tags": [], "tracks": [],
+                    "shapes": _generate_shapes(db_task, size)})
+                shapes = annotation.data["shapes"][:kwargs['changed']]
+
+            for shape in shapes:
+                shape["points"] = [v + 1 for v in shape["points"]]
+                shape["attributes"][0]["value"] = "changed"
+            data = {"version": 0, "tags": [], "shapes": shapes, "tracks": []}
+
+            replace_queries, replace_elapsed = _run(connection, db_job, data,
+                _replace)
+            update_queries, update_elapsed = _run(connection, db_job, data,
+                JobAnnotation.update)
+
+            rows.append((size, len(shapes),
+                replace_queries, "{:.3f}".format(replace_elapsed),
+                update_queries, "{:.3f}".format(update_elapsed)))
+            db_task.delete()
+
+    print_table(("shapes", "changed", "replace queries", "replace time, s",
+        "update queries", "update time, s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time and scratch disk space of saving images of a zip archive as task
+frames when the archive is extracted first (the old way, zipfile is used
+instead of patool here) and when images are read from the archive."""
+
+import argparse
+import os
+import shutil
+import zipfile
+from io import BytesIO
+
+import numpy as np
+
+from common import (setup_django, test_database, measure, print_table,
+    format_size, create_db_task)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', default=100, type=int,
+        help='Number of synthetic images')
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--workers', default=os.cpu_count() or 1, type=int)
+
+    return vars(parser.parse_args())
+
+
+def _generate_archive(path, count, width, height):
+    from PIL import Image
+
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    with zipfile.ZipFile(path, 'w') as archive:
+        for idx in range(count):
+            noise = np.random.randint(0, 55, (height, width, 3)).astype(np.float32)
+            data = BytesIO()
+            Image.fromarray((gradient + noise).astype(np.uint8)).save(data, 'PNG')
+            archive.writestr("images/{:06d}.png".format(idx), data.getvalue())
+
+
+def _get_dir_size(dirname):
+    return sum(os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(dirname) for name in names)
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.engine.frames import get_frame_writer
+    from cvat.apps.engine.media_extractors import ArchiveExtractor, DirectoryExtractor
+    from cvat.apps.engine.task import _save_frames
+
+    def _save(make_extractor, db_task):
+        extractor = make_extractor()
+        with get_frame_writer(db_task) as writer:
+            for _ in _save_frames(extractor, writer, 0, kwargs['workers']):
+                pass
+        return _get_dir_size(db_task.get_upload_dirname())
+
+    def _extract(archive_path, upload_dir):
+        with zipfile.ZipFile(archive_path) as archive:
+            archive.extractall(upload_dir)
+        return DirectoryExtractor(source_path=[upload_dir], dest_path=upload_dir,
+            image_quality=50)
+
+    rows = []
+    with test_database():
+        for name in ["extracted", "streamed"]:
+            db_task = create_db_task(size=0, mode="annotation")
+            upload_dir = db_task.get_upload_dirname()
+            archive_path = os.path.join(upload_dir, 'images.zip')
+            _generate_archive(archive_path, kwargs['images'], kwargs['width'],
+                kwargs['height'])
+            archive_size = os.path.getsize(archive_path)
+
+            if name == "extracted":
+                make_extractor = lambda: _extract(archive_path, upload_dir)
+            else:
+                make_extractor = lambda: ArchiveExtractor(source_path=[archive_path],
+                    dest_path=upload_dir, image_quality=50)
+            upload_size, elapsed, _ = measure(_save, make_extractor, db_task)
+            rows.append((name, "{:.2f}".format(elapsed),
+                format_size(upload_size - archive_size)))
+
+            shutil.rmtree(db_task.get_task_dirname())
+            db_task.delete()
+
+    print_table(("archive", "time, s", "scratch space"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Frames per second of auto annotation (run_inference_engine_annotation)
+by different batch sizes (AUTO_ANNOTATION_BATCH_SIZE) and numbers of decode
+threads (AUTO_ANNOTATION_DECODE_WORKERS), and peak memory when all shapes
+are returned at once and when they are saved by chunks of frames
+(AUTO_ANNOTATION_SAVE_CHUNK_SIZE). OpenVINO isn't needed: the network
+is a stub which runs a NumPy computation with a fixed latency per request,
+so the benchmark shows the overlapping of decoding and inference rather
+than speed of a real model. OpenCV (cv2) is required."""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from unittest import mock
+
+import numpy as np
+
+from common import setup_django, measure, print_table, format_size
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', default=200, type=int)
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--batch-sizes', nargs='*', type=int, default=[1, 4, 8])
+    parser.add_argument('--workers', nargs='*', type=int, default=[1, 4])
+    parser.add_argument('--latency', default=0.01, type=float,
+        help='Latency of an infer request of the stub network, s')
+    parser.add_argument('--save-chunk-size', default=64, type=int)
+
+    return vars(parser.parse_args())
+
+
+_INTERP_SCRIPT = """
+for detection in detections:
+    for obj in detection['detections'][0][0]:
+        if obj[2] >= 0.5:
+            results.add_box(obj[3] * detection['frame_width'],
+                obj[4] * detection['frame_height'],
+                obj[5] * detection['frame_width'],
+                obj[6] * detection['frame_height'],
+                int(obj[1]), detection['frame_id'])
+"""
+
+
+class _StubShape:
+    def __init__(self, shape):
+        self.shape = shape
+
+
+class _StubLayer:
+    def __init__(self, layer_type):
+        self.type = layer_type
+
+
+class _StubNetwork:
+    """SSD-like network: 300x300 input and a DetectionOutput layer"""
+    def __init__(self):
+        self._batch_size = 1
+        self.layers = {'detection_out': _StubLayer('DetectionOutput')}
+
+    @property
+    def inputs(self):
+        return {'data': _StubShape([self._batch_size, 3, 300, 300])}
+
+    @property
+    def outputs(self):
+        return {'detection_out': _StubShape([1, 1, 100, 7])}
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, value):
+        self._batch_size = value
+
+
+class _StubRequest:
+    def __init__(self, latency):
+        self._latency = latency
+        self._thread = None
+        self.outputs = None
+
+    def _infer(self, inputs):
+        time.sleep(self._latency)
+        data = inputs['data'].astype(np.float32)
+        scores = np.tanh(data.mean(axis=(1, 2, 3)) / 255)
+        rows = np.zeros((len(data), 7), dtype=np.float32)
+        rows[:, 0] = np.arange(len(data))
+        rows[:, 1] = 1
+        rows[:, 2] = 0.5 + scores / 2
+        rows[:, 3:] = [0.1, 0.1, 0.5, 0.5]
+        self.outputs = {'detection_out': rows.reshape(1, 1, -1, 7)}
+
+    def start(self, inputs):
+        self._thread = threading.Thread(target=self._infer, args=(inputs,))
+        self._thread.start()
+
+    def wait(self, timeout):
+        self._thread.join()
+
+
+class _StubExecutableNetwork:
+    def __init__(self, num_requests, latency):
+        self.requests = [_StubRequest(latency) for _ in range(num_requests)]
+
+    def start_async(self, request_id, inputs):
+        self.requests[request_id].start(inputs)
+
+
+class _StubPlugin:
+    device = 'CPU'
+
+    def __init__(self, latency):
+        self._latency = latency
+
+    def get_supported_layers(self, network):
+        return set(network.layers)
+
+    def load(self, network, num_requests):
+        return _StubExecutableNetwork(num_requests, self._latency)
+
+
+def install_openvino_stub():
+    """The stub is used instead of OpenVINO, its module is only imported"""
+    openvino = types.ModuleType('openvino')
+    openvino.inference_engine = types.ModuleType('openvino.inference_engine')
+    openvino.inference_engine.IENetwork = openvino.inference_engine.IEPlugin = None
+    sys.modules.setdefault('openvino', openvino)
+    sys.modules.setdefault('openvino.inference_engine', openvino.inference_engine)
+    os.environ.setdefault('IE_PLUGINS_PATH', tempfile.gettempdir())
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    install_openvino_stub()
+
+    import cv2
+    from django.test import override_settings
+    from cvat.apps.auto_annotation import model_loader
+    from cvat.apps.auto_annotation.image_loader import ImageLoader
+    from cvat.apps.auto_annotation.inference import run_inference_engine_annotation
+
+    data_dir = tempfile.mkdtemp(prefix='cvat-benchmark-')
+    rows = []
+    try:
+        gradient = np.linspace(0, 200, kwargs['width'], dtype=np.float32)[np.newaxis, :, np.newaxis]
+        paths = []
+        for idx in range(kwargs['frames']):
+            noise = np.random.randint(0, 55, (kwargs['height'], kwargs['width'], 3))
+            paths.append(os.path.join(data_dir, '{}.jpg'.format(idx)))
+            cv2.imwrite(paths[-1], (gradient + noise).astype(np.uint8))
+        model_file = os.path.join(data_dir, 'model.xml')
+        weights_file = os.path.join(data_dir, 'model.bin')
+        interp_path = os.path.join(data_dir, 'interp.py')
+        for path, content in [(model_file, ''), (weights_file, ''),
+                (interp_path, _INTERP_SCRIPT)]:
+            with open(path, 'w') as model_part:
+                model_part.write(content)
+
+        with mock.patch.object(model_loader, 'make_plugin',
+                lambda: _StubPlugin(kwargs['latency'])), \
+            mock.patch.object(model_loader, 'make_network',
+                lambda model, weights: _StubNetwork()):
+            for batch_size in kwargs['batch_sizes']:
+                for workers in kwargs['workers']:
+                    with override_settings(AUTO_ANNOTATION_BATCH_SIZE=batch_size,
+                            AUTO_ANNOTATION_DECODE_WORKERS=workers):
+                        start = time.perf_counter()
+                        result = run_inference_engine_annotation(
+                            data=ImageLoader(paths), model_file=model_file,
+                            weights_file=weights_file, labels_mapping={1: 1},
+                            attribute_spec={1: {}}, convertation_file=interp_path)
+                        elapsed = time.perf_counter() - start
+                    assert [shape['frame'] for shape in result['shapes']] == list(range(len(paths)))
+                    rows.append((batch_size, workers, "{:.2f}".format(elapsed),
+                        "{:.1f}".format(len(paths) / elapsed)))
+
+            memory_rows = []
+            for save_chunk_size in [None, kwargs['save_chunk_size']]:
+                saved_shapes = []
+                save_results = None
+                if save_chunk_size:
+                    save_results = lambda result: saved_shapes.append(len(result['shapes']))
+                with override_settings(AUTO_ANNOTATION_SAVE_CHUNK_SIZE=save_chunk_size or 0):
+                    result, _, peak = measure(run_inference_engine_annotation,
+                        data=ImageLoader(paths), model_file=model_file,
+                        weights_file=weights_file, labels_mapping={1: 1},
+                        attribute_spec={1: {}}, convertation_file=interp_path,
+                        save_results=save_results)
+                memory_rows.append((save_chunk_size or "-",
+                    len(result['shapes']) + sum(saved_shapes), format_size(peak)))
+    finally:
+        shutil.rmtree(data_dir)
+
+    print_table(("batch size", "decode workers", "time, s", "frames/s"), rows)
+    print()
+    print_table(("save chunk size", "shapes", "peak memory"), memory_rows)
+
+
+if __name__ == "__main__":
+    main()
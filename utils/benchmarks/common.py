@@ -0,0 +1,156 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+work_dir = os.path.dirname(os.path.abspath(__file__))
+cvat_dir = os.path.join(work_dir, '..', '..')
+
+sys.path.insert(0, cvat_dir)
+
+
+def setup_django():
+    """Configure Django with testing settings (sqlite, temporary DATA_ROOT)"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cvat.settings.testing")
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Create a temporary database for a benchmark and destroy it at the end"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+class QueryCounter:
+    """Count SQL queries which are executed inside of the context"""
+    def __init__(self, connection):
+        self._connection = connection
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self._connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._wrapper.__exit__(*args)
+
+
+def measure(func, *args, **kwargs):
+    """Run the function and return (result, elapsed seconds, peak memory in bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def print_table(header, rows):
+    widths = [max(len(str(v)) for v in column) for column in zip(header, *rows)]
+    line_format = "  ".join("{{:>{}}}".format(w) for w in widths)
+    print(line_format.format(*header))
+    for row in rows:
+        print(line_format.format(*row))
+
+
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024 or unit == "GB":
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024
+
+
+def create_db_task(size, segment_size=0, overlap=0, mode="interpolation",
+        mutable_attributes=3, immutable_attributes=2):
+    """Create a task with one label, its attributes, segments and jobs"""
+    from cvat.apps.engine import models
+
+    db_task = models.Task.objects.create(name="benchmark", size=size,
+        mode=mode, overlap=overlap, segment_size=segment_size)
+    os.makedirs(db_task.get_upload_dirname())
+    os.makedirs(db_task.get_data_dirname())
+    db_label = models.Label.objects.create(task=db_task, name="car")
+    for i in range(mutable_attributes + immutable_attributes):
+        models.AttributeSpec.objects.create(label=db_label,
+            name="attr{}".format(i), mutable=i < mutable_attributes,
+            input_type=models.AttributeType.TEXT, default_value="", values="")
+
+    segment_size = segment_size or size
+    segment_step = max(segment_size - overlap, 1)
+    for start_frame in range(0, size, segment_step):
+        stop_frame = min(start_frame + segment_size - 1, size - 1)
+        db_segment = models.Segment.objects.create(task=db_task,
+            start_frame=start_frame, stop_frame=stop_frame)
+        models.Job.objects.create(segment=db_segment)
+        if stop_frame == size - 1:
+            break
+
+    return db_task
+
+
+def generate_tracks(db_task, start_frame, stop_frame, shapes, shapes_per_track=1000,
+        points=4):
+    """Generate tracks in the AnnotationIR format with the given total
+    number of tracked shapes inside of [start_frame, stop_frame]"""
+    db_label = db_task.label_set.first()
+    db_specs = list(db_label.attributespec_set.all())
+    mutable = [spec.id for spec in db_specs if spec.mutable]
+    immutable = [spec.id for spec in db_specs if not spec.mutable]
+    shape_type = "rectangle" if points == 4 else "polygon"
+
+    tracks = []
+    frames = stop_frame - start_frame + 1
+    shapes_per_track = min(shapes_per_track, frames)
+    for idx in range(0, shapes, shapes_per_track):
+        count = min(shapes_per_track, shapes - idx)
+        offset = idx % (frames - count + 1)
+        tracks.append({
+            "frame": start_frame + offset,
+            "label_id": db_label.id,
+            "group": 0,
+            "attributes": [{"spec_id": spec_id, "value": "value"}
+                for spec_id in immutable],
+            "shapes": [{
+                "frame": start_frame + offset + i,
+                "type": shape_type,
+                "occluded": False,
+                "z_order": 0,
+                "outside": False,
+                "points": [float(10 + i + p) for p in range(points)],
+                "attributes": [{"spec_id": spec_id, "value": str(i)}
+                    for spec_id in mutable],
+            } for i in range(count)],
+        })
+
+    return tracks
+
+
+def save_tracks(db_job, tracks):
+    """Save tracks directly into the database bypassing commits"""
+    from cvat.apps.engine.annotation import JobAnnotation
+    annotation = JobAnnotation(db_job.id, None)
+    annotation._save_tracks_to_db(tracks)
@@ -0,0 +1,108 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Throughput of readers of a job while writers change it: readers which
+take the row lock of the job vs read-only readers which check the commit
+version. The difference is visible only with a database server which
+supports row locks (e.g. PostgreSQL via DJANGO_SETTINGS_MODULE)."""
+
+import argparse
+import threading
+import time
+
+from common import (setup_django, test_database, print_table, create_db_task,
+    generate_tracks, save_tracks)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', default=10000, type=int,
+        help='Number of tracked shapes in the synthetic job')
+    parser.add_argument('--readers', nargs='*', type=int, default=[1, 4, 8],
+        help='Numbers of reader threads')
+    parser.add_argument('--writers', default=2, type=int,
+        help='Number of writer threads')
+    parser.add_argument('--duration', default=10, type=float,
+        help='Duration of every measurement, s')
+
+    return vars(parser.parse_args())
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.db import connection, transaction, OperationalError
+    from cvat.apps.engine import annotation
+
+    def _locking_read(db_job):
+        with transaction.atomic():
+            job_annotation = annotation.JobAnnotation(db_job.id, None)
+            job_annotation.init_from_db()
+
+    def _read_only_read(db_job):
+        annotation.get_job_data(db_job.id, None)
+
+    def _write(db_job, shape):
+        annotation.patch_job_data(db_job.id, None, {"version": 0, "tags": [],
+            "shapes": [shape], "tracks": []}, "update")
+
+    def _loop(func, args, stop_event, counter):
+        try:
+            while not stop_event.is_set():
+                try:
+                    func(*args)
+                    counter.append(time.perf_counter())
+                except OperationalError:
+                    # sqlite locks whole tables, try again
+                    pass
+        finally:
+            connection.close()
+
+    def _run(db_job, shape, read, readers):
+        stop_event = threading.Event()
+        reads, writes = [], []
+        threads = [threading.Thread(target=_loop,
+            args=(_write, (db_job, shape), stop_event, writes))
+            for _ in range(kwargs['writers'])]
+        threads += [threading.Thread(target=_loop,
+            args=(read, (db_job, ), stop_event, reads))
+            for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(kwargs['duration'])
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+        return len(reads) / kwargs['duration'], len(writes) / kwargs['duration']
+
+    rows = []
+    with test_database():
+        db_task = create_db_task(size=1000, mode="interpolation")
+        db_job = db_task.segment_set.first().job_set.first()
+        save_tracks(db_job, generate_tracks(db_task, 0, db_task.size - 1,
+            kwargs['shapes']))
+        label_id = db_task.label_set.first().id
+        shape = annotation.put_job_data(db_job.id, None, {"version": 0,
+            "tags": [], "tracks": [], "shapes": [{"frame": 0,
+            "label_id": label_id, "group": 0, "type": "rectangle",
+            "occluded": False, "z_order": 0, "points": [1.0, 2.0, 3.0, 4.0],
+            "attributes": []}]})["shapes"][0]
+
+        for readers in kwargs['readers']:
+            row = [readers]
+            for read in [_locking_read, _read_only_read]:
+                reads_per_second, writes_per_second = _run(db_job, shape,
+                    read, readers)
+                row += ["{:.1f}".format(reads_per_second),
+                    "{:.1f}".format(writes_per_second)]
+            rows.append(row)
+
+    print_table(("readers", "lock reads/s", "lock writes/s",
+        "read-only reads/s", "read-only writes/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
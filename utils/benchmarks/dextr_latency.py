@@ -0,0 +1,126 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""p50 and p99 latency of DEXTR clicks on the same frames in the worker when
+every click reads and decodes the frame and the network is loaded per
+request (as a forked RQ job does) and when the network is warm and decoded
+frames are cached (DEXTR_FRAME_CACHE_SIZE). OpenVINO isn't needed: the
+network is a stub with a fixed latency and load time. OpenCV (cv2) is
+required."""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from common import setup_django, print_table
+import auto_annotation as stubs
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clicks', default=100, type=int)
+    parser.add_argument('--frames', default=4, type=int,
+        help='Number of frames which are clicked in turn')
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--latency', default=0.02, type=float,
+        help='Latency of inference of the stub network, s')
+    parser.add_argument('--load-time', default=0.5, type=float,
+        help='Time of loading of the stub network, s')
+
+    return vars(parser.parse_args())
+
+
+class _StubDextrNetwork:
+    def __init__(self, latency):
+        self._latency = latency
+
+    def infer(self, inputs):
+        time.sleep(self._latency)
+        pred = np.zeros((1, 1, 512, 512), dtype=np.float32)
+        pred[0, 0, 128:384, 128:384] = 1
+        return {'output': pred}
+
+
+class _StubDextrPlugin:
+    def __init__(self, latency, load_time):
+        self._latency = latency
+        self._load_time = load_time
+
+    def load(self, network):
+        time.sleep(self._load_time)
+        return _StubDextrNetwork(self._latency)
+
+
+class _StubIONetwork:
+    inputs = {'input': None}
+    outputs = {'output': None}
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+    stubs.install_openvino_stub()
+    model_dir = tempfile.mkdtemp(prefix='cvat-benchmark-')
+    os.environ['DEXTR_MODEL_DIR'] = model_dir
+
+    from cvat.apps.auto_annotation.model_registry import ModelRegistry
+    from cvat.apps.dextr_segmentation import dextr
+    from cvat.apps.dextr_segmentation.latency import LatencyStats
+
+    rows = []
+    try:
+        for name in ['dextr.xml', 'dextr.bin']:
+            open(os.path.join(model_dir, name), 'w').close()
+        frames = []
+        for _ in range(kwargs['frames']):
+            image = Image.fromarray(np.random.randint(0, 255,
+                (kwargs['height'], kwargs['width'], 3), dtype=np.uint8))
+            frame = BytesIO()
+            image.save(frame, format='JPEG', quality=70)
+            frames.append(frame.getvalue())
+        cx, cy = kwargs['width'] // 2, kwargs['height'] // 2
+        points = [{'x': cx - 200, 'y': cy}, {'x': cx + 200, 'y': cy},
+            {'x': cx, 'y': cy - 150}, {'x': cx, 'y': cy + 150}]
+
+        with mock.patch.object(dextr, 'make_plugin',
+                lambda: _StubDextrPlugin(kwargs['latency'], kwargs['load_time'])), \
+            mock.patch.object(dextr, 'make_network',
+                lambda model, weights: _StubIONetwork()):
+            for name, warm in [('cold', False), ('warm', True)]:
+                registry = ModelRegistry(1 if warm else 0)
+                handler = dextr.DEXTR_HANDLER(8 if warm else 0)
+                stats = LatencyStats(name, log_interval=kwargs['clicks'] + 1)
+                with mock.patch.object(dextr, 'network_registry', registry):
+                    if warm:
+                        handler.load_network()
+                    for click in range(kwargs['clicks']):
+                        frame = click % len(frames)
+                        start = time.perf_counter()
+                        image = handler.get_image(frame, lambda: np.array(
+                            Image.open(BytesIO(frames[frame])).convert('RGB')))
+                        loaded = time.perf_counter()
+                        handler.handle(image, points)
+                        finished = time.perf_counter()
+                        stats.add(frame=loaded - start,
+                            segmentation=finished - loaded, total=finished - start)
+
+                for stage, (p50, p99) in sorted(stats.get_percentiles().items()):
+                    rows.append((name, stage, "{:.1f}".format(p50 * 1000),
+                        "{:.1f}".format(p99 * 1000)))
+    finally:
+        shutil.rmtree(model_dir)
+
+    print_table(("worker", "stage", "p50, ms", "p99, ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
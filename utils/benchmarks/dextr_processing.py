@@ -0,0 +1,151 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of DEXTR preprocessing (the crop, the heatmap and the network input)
+and postprocessing (the mask and the polygon) without the network, in the
+previous implementation (a loop over points, a mask of the whole image) and
+in dextr_segmentation.processing. Results of both are compared. OpenCV (cv2)
+is required."""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from common import setup_django, print_table
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clicks', default=50, type=int)
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--points', nargs='*', type=int, default=[4, 8])
+
+    return vars(parser.parse_args())
+
+
+_PADDING = 50
+_THRESHOLD = 0.9
+_SIZE = 512
+
+
+def _old_preprocess(numpy_image, points):
+    points = np.asarray([[int(p["x"]), int(p["y"])] for p in points], dtype=int)
+    bounding_box = (
+        max(min(points[:, 0]) - _PADDING, 0),
+        max(min(points[:, 1]) - _PADDING, 0),
+        min(max(points[:, 0]) + _PADDING, numpy_image.shape[1] - 1),
+        min(max(points[:, 1]) + _PADDING, numpy_image.shape[0] - 1)
+    )
+
+    numpy_cropped = numpy_image[bounding_box[1]:bounding_box[3],
+        bounding_box[0]:bounding_box[2]]
+    resized = cv2.resize(numpy_cropped, (_SIZE, _SIZE),
+        interpolation = cv2.INTER_CUBIC).astype(np.float32)
+
+    points = points - [min(points[:, 0]), min(points[:, 1])] + [_PADDING, _PADDING]
+    points = (points * [_SIZE / numpy_cropped.shape[1], _SIZE / numpy_cropped.shape[0]]).astype(int)
+    heatmap = np.zeros(shape=resized.shape[:2], dtype=np.float64)
+    for point in points:
+        gaussian_x_axis = np.arange(0, _SIZE, 1, float) - point[0]
+        gaussian_y_axis = np.arange(0, _SIZE, 1, float)[:, np.newaxis] - point[1]
+        gaussian = np.exp(-4 * np.log(2) * ((gaussian_x_axis ** 2 + gaussian_y_axis ** 2) / 100)).astype(np.float64)
+        heatmap = np.maximum(heatmap, gaussian)
+    cv2.normalize(heatmap,  heatmap, 0, 255, cv2.NORM_MINMAX)
+
+    input_dextr = np.concatenate((resized, heatmap[:, :, np.newaxis].astype(resized.dtype)), axis=2)
+    input_dextr = input_dextr.transpose((2,0,1))
+    return input_dextr[np.newaxis, ...], bounding_box
+
+
+def _old_postprocess(pred, numpy_image, bounding_box):
+    pred = cv2.resize(pred, (bounding_box[2] - bounding_box[0],
+        bounding_box[3] - bounding_box[1]), interpolation = cv2.INTER_CUBIC)
+    result = np.zeros(numpy_image.shape[:2])
+    result[bounding_box[1]:bounding_box[1] + pred.shape[0], bounding_box[0]:bounding_box[0] + pred.shape[1]] = pred > _THRESHOLD
+
+    result = np.array(result, dtype=np.uint8)
+    cv2.normalize(result,result,0,255,cv2.NORM_MINMAX)
+    contours = cv2.findContours(result, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_TC89_KCOS)[-2]
+
+    contours = max(contours, key=lambda arr: arr.size)
+    if contours.shape.count(1):
+        contours = np.squeeze(contours)
+    if contours.size < 3 * 2:
+        raise Exception('Less then three point have been detected. Can not build a polygon.')
+
+    result = ""
+    for point in contours:
+        result += "{},{} ".format(int(point[0]), int(point[1]))
+    result = result[:-1]
+
+    return result
+
+
+def _make_prediction(rng):
+    """A blurred ellipse like an output of the network"""
+    pred = np.zeros((_SIZE, _SIZE), dtype=np.float32)
+    center = tuple(int(c) for c in rng.randint(150, 362, 2))
+    axes = tuple(int(a) for a in rng.randint(40, 200, 2))
+    cv2.ellipse(pred, center, axes, float(rng.randint(0, 180)), 0, 360, 1.0, -1)
+    return cv2.GaussianBlur(pred, (31, 31), 0)
+
+
+def _make_points(rng, count, width, height):
+    """Extreme points of an object, some of them are near image borders"""
+    xtl, ytl = rng.randint(0, width // 2), rng.randint(0, height // 2)
+    xbr = min(xtl + rng.randint(50, width // 2), width)
+    ybr = min(ytl + rng.randint(50, height // 2), height)
+    xs = rng.randint(xtl, xbr + 1, count)
+    ys = rng.randint(ytl, ybr + 1, count)
+    xs[:2], ys[2:4] = [xtl, xbr], [ytl, ybr]
+    return [{'x': int(x), 'y': int(y)} for x, y in zip(xs, ys)]
+
+
+def _measure(func, args):
+    start = time.perf_counter()
+    results = [func(*arg) for arg in args]
+    return results, (time.perf_counter() - start) / len(args)
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+    from cvat.apps.dextr_segmentation import processing
+
+    rng = np.random.RandomState(0)
+    image = rng.randint(0, 255, (kwargs['height'], kwargs['width'], 3), dtype=np.uint8)
+    preds = [_make_prediction(rng) for _ in range(kwargs['clicks'])]
+    rows = []
+    for count in kwargs['points']:
+        points = [_make_points(rng, count, kwargs['width'], kwargs['height'])
+            for _ in range(kwargs['clicks'])]
+
+        old_inputs, old_pre = _measure(_old_preprocess,
+            [(image, p) for p in points])
+        new_inputs, new_pre = _measure(processing.make_input,
+            [(image, p) for p in points])
+        for (old_input, old_box), (new_input, new_box) in zip(old_inputs, new_inputs):
+            assert old_box == new_box
+            assert np.allclose(old_input, new_input, atol=1e-3)
+
+        old_polygons, old_post = _measure(_old_postprocess,
+            [(pred, image, box) for pred, (_, box) in zip(preds, old_inputs)])
+        new_polygons, new_post = _measure(processing.make_polygon,
+            [(pred, box) for pred, (_, box) in zip(preds, new_inputs)])
+        assert old_polygons == new_polygons
+
+        for name, pre, post in [('loop, whole image', old_pre, old_post),
+                ('vectorized, crop', new_pre, new_post)]:
+            rows.append((count, name, "{:.2f}".format(pre * 1000),
+                "{:.2f}".format(post * 1000)))
+
+    print_table(("points", "processing", "preprocessing, ms",
+        "postprocessing, ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
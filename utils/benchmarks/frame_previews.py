@@ -0,0 +1,75 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Size of frame previews (FRAME_PREVIEW_LEVELS) and time of making and
+decoding them in comparison with original frames."""
+
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+
+from common import setup_django, print_table, format_size
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', default=50, type=int,
+        help='Number of synthetic frames')
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--levels', default=3, type=int)
+    parser.add_argument('--quality', default=50, type=int)
+
+    return vars(parser.parse_args())
+
+
+def _generate_frame(width, height, quality):
+    from PIL import Image
+
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    noise = np.random.randint(0, 55, (height, width, 3)).astype(np.float32)
+    data = BytesIO()
+    Image.fromarray((gradient + noise).astype(np.uint8)).save(data, 'JPEG',
+        quality=quality)
+    return data.getvalue()
+
+
+def _decode(images):
+    from PIL import Image
+
+    for data in images:
+        Image.open(BytesIO(data)).load()
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.engine.frames import make_preview
+
+    frames = [_generate_frame(kwargs['width'], kwargs['height'], kwargs['quality'])
+        for _ in range(kwargs['frames'])]
+
+    rows = []
+    for level in range(kwargs['levels'] + 1):
+        start = time.perf_counter()
+        images = frames if not level else [make_preview(data, level, kwargs['quality'])
+            for data in frames]
+        make_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _decode(images)
+        decode_elapsed = time.perf_counter() - start
+
+        rows.append((level, format_size(sum(map(len, images)) / len(images)),
+            "{:.2f}".format(make_elapsed * 1000 / len(images)),
+            "{:.2f}".format(decode_elapsed * 1000 / len(images))))
+
+    print_table(("level", "frame size", "make, ms", "decode, ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
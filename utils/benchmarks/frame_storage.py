@@ -0,0 +1,75 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of writing, random reading and removing of task frames which are
+stored one per file and packed into chunks (FRAME_CHUNK_SIZE)."""
+
+import argparse
+import os
+import random
+import shutil
+import time
+from io import BytesIO
+
+from common import setup_django, test_database, print_table, create_db_task
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', default=20000, type=int,
+        help='Number of frames in the synthetic task')
+    parser.add_argument('--chunk-sizes', nargs='*', type=int, default=[0, 36, 100],
+        help='Numbers of frames per chunk (0 is a file per frame)')
+    parser.add_argument('--reads', default=2000, type=int,
+        help='Number of random frames which are read')
+
+    return vars(parser.parse_args())
+
+
+def _generate_frame():
+    from PIL import Image
+    data = BytesIO()
+    Image.new('RGB', (640, 480), (128, 64, 32)).save(data, 'JPEG')
+    return data.getvalue()
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.engine import frames
+
+    frame = _generate_frame()
+    rows = []
+    with test_database():
+        for chunk_size in kwargs['chunk_sizes']:
+            db_task = create_db_task(size=kwargs['frames'], mode="interpolation")
+            db_task.chunk_size = chunk_size
+
+            start = time.perf_counter()
+            with frames.get_frame_writer(db_task) as writer:
+                for idx in range(db_task.size):
+                    writer.write(idx, frame)
+            write_elapsed = time.perf_counter() - start
+            files = sum(len(names) for _, _, names in os.walk(db_task.get_data_dirname()))
+
+            start = time.perf_counter()
+            for idx in random.sample(range(db_task.size), min(kwargs['reads'], db_task.size)):
+                frames.read_frame(db_task, idx)
+            read_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            shutil.rmtree(db_task.get_task_dirname())
+            remove_elapsed = time.perf_counter() - start
+
+            rows.append((chunk_size, files, "{:.2f}".format(write_elapsed),
+                "{:.1f}".format(kwargs['reads'] / read_elapsed),
+                "{:.2f}".format(remove_elapsed)))
+            db_task.delete()
+
+    print_table(("chunk size", "files", "write, s", "reads/s", "remove, s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Throughput of compression of task images by different numbers of
+processes (IMAGE_COMPRESSION_WORKERS)."""
+
+import argparse
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from common import (setup_django, test_database, measure, print_table,
+    create_db_task)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', default=200, type=int,
+        help='Number of synthetic images')
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--workers', nargs='*', type=int,
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help='Numbers of compression processes')
+
+    return vars(parser.parse_args())
+
+
+def _generate_images(dirname, count, width, height):
+    from PIL import Image
+
+    # A gradient with noise is closer to photos than a plain color
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    paths = []
+    for idx in range(count):
+        noise = np.random.randint(0, 55, (height, width, 3)).astype(np.float32)
+        image = Image.fromarray((gradient + noise).astype(np.uint8))
+        paths.append(os.path.join(dirname, "{:06d}.png".format(idx)))
+        image.save(paths[-1])
+
+    return paths
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.engine.frames import get_frame_writer
+    from cvat.apps.engine.media_extractors import ImageListExtractor
+    from cvat.apps.engine.task import _save_frames
+
+    def _compress(extractor, db_task, workers):
+        with get_frame_writer(db_task) as writer:
+            for _ in _save_frames(extractor, writer, 0, workers):
+                pass
+
+    source_dir = tempfile.mkdtemp(prefix='cvat-benchmark-')
+    rows = []
+    try:
+        paths = _generate_images(source_dir, kwargs['images'],
+            kwargs['width'], kwargs['height'])
+        with test_database():
+            for workers in kwargs['workers']:
+                db_task = create_db_task(size=0, mode="annotation")
+                extractor = ImageListExtractor(source_path=paths,
+                    dest_path=source_dir, image_quality=50)
+                _, elapsed, _ = measure(_compress, extractor, db_task, workers)
+                rows.append((workers, len(paths), "{:.2f}".format(elapsed),
+                    "{:.1f}".format(len(paths) / elapsed)))
+                db_task.delete()
+    finally:
+        shutil.rmtree(source_dir)
+
+    print_table(("workers", "images", "time, s", "images/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Size of the image meta cache of a task and time and peak memory of
+reading it in the old format (repr of a dict parsed by ast.literal_eval)
+and in the .npy format (cold and from the in-process cache)."""
+
+import argparse
+import os
+from ast import literal_eval
+
+from common import setup_django, test_database, measure, print_table, \
+    format_size, create_db_task
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', default=100000, type=int,
+        help='Number of images in the synthetic task')
+
+    return vars(parser.parse_args())
+
+
+def _read_repr(path):
+    with open(path) as meta_file:
+        return literal_eval(meta_file.read())
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.engine import task
+
+    with test_database():
+        db_task = create_db_task(size=kwargs['images'], mode="annotation")
+        sizes = [(1920 + i % 7, 1080 + i % 5) for i in range(db_task.size)]
+        path = db_task.get_image_meta_cache_path()
+        rows = []
+
+        with open(path, 'w') as meta_file:
+            meta_file.write(str({'original_size': [{'width': w, 'height': h}
+                for w, h in sizes]}))
+        file_size = os.path.getsize(path)
+        _, elapsed, peak = measure(_read_repr, path)
+        rows.append(("repr", format_size(file_size),
+            "{:.1f}".format(elapsed * 1000), format_size(peak)))
+
+        task.make_image_meta_cache(db_task, sizes)
+        file_size = os.path.getsize(path)
+        for name in ["npy", "npy (cached)"]:
+            _, elapsed, peak = measure(task.get_image_sizes, db_task)
+            rows.append((name, format_size(file_size),
+                "{:.1f}".format(elapsed * 1000), format_size(peak)))
+
+        _, elapsed, peak = measure(task.get_image_meta_cache, db_task)
+        rows.append(("npy as dicts", format_size(file_size),
+            "{:.1f}".format(elapsed * 1000), format_size(peak)))
+
+    print_table(("format", "file size", "read, ms", "peak memory"), rows)
+
+
+if __name__ == "__main__":
+    main()
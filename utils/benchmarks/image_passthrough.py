@@ -0,0 +1,84 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of saving JPEG images of a task as frames with and without the
+passthrough of images which don't need re-encoding
+(IMAGE_PASSTHROUGH_QUALITY_MARGIN)."""
+
+import argparse
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+from common import (setup_django, test_database, measure, print_table,
+    create_db_task)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', default=100, type=int,
+        help='Number of synthetic images')
+    parser.add_argument('--width', default=1920, type=int)
+    parser.add_argument('--height', default=1080, type=int)
+    parser.add_argument('--source-quality', default=70, type=int)
+    parser.add_argument('--task-quality', default=75, type=int)
+
+    return vars(parser.parse_args())
+
+
+def _generate_images(dirname, count, width, height, quality):
+    from PIL import Image
+
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    paths = []
+    for idx in range(count):
+        noise = np.random.randint(0, 55, (height, width, 3)).astype(np.float32)
+        image = Image.fromarray((gradient + noise).astype(np.uint8))
+        paths.append(os.path.join(dirname, "{:06d}.jpg".format(idx)))
+        image.save(paths[-1], quality=quality)
+
+    return paths
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.engine.frames import get_frame_writer
+    from cvat.apps.engine.media_extractors import ImageListExtractor
+    from cvat.apps.engine.task import _save_frames
+
+    def _save(extractor, db_task, passthrough):
+        copied = Counter()
+        with get_frame_writer(db_task) as writer:
+            for _, _, _, is_copied in _save_frames(extractor, writer, 0, 1, passthrough):
+                copied[is_copied] += 1
+        return copied
+
+    source_dir = tempfile.mkdtemp(prefix='cvat-benchmark-')
+    rows = []
+    try:
+        paths = _generate_images(source_dir, kwargs['images'],
+            kwargs['width'], kwargs['height'], kwargs['source_quality'])
+        with test_database():
+            for passthrough in [None, (0, 10 * 1024 * 1024)]:
+                db_task = create_db_task(size=0, mode="annotation")
+                extractor = ImageListExtractor(source_path=paths,
+                    dest_path=source_dir, image_quality=kwargs['task_quality'])
+                copied, elapsed, _ = measure(_save, extractor, db_task, passthrough)
+                rows.append(("on" if passthrough else "off", copied[True],
+                    copied[False], "{:.2f}".format(elapsed),
+                    "{:.1f}".format(len(paths) / elapsed)))
+                db_task.delete()
+    finally:
+        shutil.rmtree(source_dir)
+
+    print_table(("passthrough", "copied", "re-encoded", "time, s", "images/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
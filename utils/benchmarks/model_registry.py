@@ -0,0 +1,96 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of auto annotation of many small tasks by the same model when the
+network and the interpretation script are loaded for every run and when they
+are kept by the model registry (AUTO_ANNOTATION_MODEL_CACHE_SIZE). The stub
+network of auto_annotation.py is used, loading of the network into the
+plugin takes a fixed time. OpenCV (cv2) is required."""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import numpy as np
+
+from common import setup_django, print_table
+import auto_annotation as stubs
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', default=40, type=int)
+    parser.add_argument('--frames', default=5, type=int,
+        help='Number of frames of a task')
+    parser.add_argument('--load-time', default=0.5, type=float,
+        help='Time of loading of the stub network, s')
+    parser.add_argument('--latency', default=0.005, type=float,
+        help='Latency of an infer request of the stub network, s')
+
+    return vars(parser.parse_args())
+
+
+class _SlowPlugin(stubs._StubPlugin):
+    def __init__(self, latency, load_time):
+        super().__init__(latency)
+        self._load_time = load_time
+
+    def load(self, network, num_requests):
+        time.sleep(self._load_time)
+        return super().load(network, num_requests)
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+    stubs.install_openvino_stub()
+
+    from cvat.apps.auto_annotation import model_loader, model_registry
+    from cvat.apps.auto_annotation.inference import run_inference_engine_annotation
+
+    data_dir = tempfile.mkdtemp(prefix='cvat-benchmark-')
+    rows = []
+    try:
+        model_file = os.path.join(data_dir, 'model.xml')
+        weights_file = os.path.join(data_dir, 'model.bin')
+        interp_path = os.path.join(data_dir, 'interp.py')
+        for path, content in [(model_file, ''), (weights_file, ''),
+                (interp_path, stubs._INTERP_SCRIPT)]:
+            with open(path, 'w') as model_part:
+                model_part.write(content)
+        images = [np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+            for _ in range(kwargs['frames'])]
+
+        with mock.patch.object(model_loader, 'make_plugin',
+                lambda: _SlowPlugin(kwargs['latency'], kwargs['load_time'])), \
+            mock.patch.object(model_loader, 'make_network',
+                lambda model, weights: stubs._StubNetwork()):
+            for cache_size in [0, 4]:
+                registry = model_registry.ModelRegistry(cache_size)
+                with mock.patch.object(model_registry, 'model_registry', registry):
+                    start = time.perf_counter()
+                    for _ in range(kwargs['tasks']):
+                        result = run_inference_engine_annotation(
+                            data=images, model_file=model_file,
+                            weights_file=weights_file, labels_mapping={1: 1},
+                            attribute_spec={1: {}}, convertation_file=interp_path)
+                        assert len(result['shapes']) == len(images)
+                    elapsed = time.perf_counter() - start
+                    metrics = registry.get_metrics()
+                rows.append((cache_size, "{:.2f}".format(elapsed),
+                    "{:.3f}".format(elapsed / kwargs['tasks']),
+                    "{:.0%}".format(metrics['hit_rate']),
+                    "{:.2f}".format(metrics['load_time'])))
+    finally:
+        shutil.rmtree(data_dir)
+
+    print_table(("cache size", "time, s", "time per task, s", "hit rate",
+        "load time, s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Storage size and load time of shape points in the text format
+(comma-separated values) and in the packed format (float32 bytes) for
+synthetic jobs with big polygons."""
+
+import argparse
+import random
+
+from common import (setup_django, test_database, measure, print_table,
+    format_size, create_db_task, generate_tracks, save_tracks)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shapes', default=10000, type=int,
+        help='Number of polygons and tracked polygons in the synthetic job')
+    parser.add_argument('--points', nargs='*', type=int, default=[10, 100, 500],
+        help='Numbers of vertices in every polygon')
+
+    return vars(parser.parse_args())
+
+
+def _storage_size():
+    from django.db.models import Sum
+    from django.db.models.functions import Length
+    from cvat.apps.engine import models
+
+    size = 0
+    for db_model in [models.LabeledShape, models.TrackedShape]:
+        sizes = db_model.objects.aggregate(points=Sum(Length('points')),
+            packed_points=Sum(Length('packed_points')))
+        size += (sizes['points'] or 0) + (sizes['packed_points'] or 0)
+
+    return size
+
+
+def _load(db_job):
+    from cvat.apps.engine.annotation import JobAnnotation
+
+    annotation = JobAnnotation(db_job.id, None)
+    annotation._init_shapes_from_db()
+    annotation._init_tracks_from_db()
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.conf import settings
+    from django.db import transaction
+    from cvat.apps.engine.annotation import JobAnnotation
+
+    rows = []
+    with test_database():
+        for points in kwargs['points']:
+            for packed in [False, True]:
+                settings.ANNOTATION_PACKED_POINTS = packed
+                db_task = create_db_task(size=1000, mode="annotation")
+                db_job = db_task.segment_set.first().job_set.first()
+                db_label = db_task.label_set.first()
+
+                # Coordinates of real polygons are not round numbers
+                shapes = [{
+                    "frame": idx % db_task.size,
+                    "label_id": db_label.id,
+                    "group": 0,
+                    "type": "polygon",
+                    "occluded": False,
+                    "z_order": 0,
+                    "points": [random.uniform(0, 1920) for _ in range(2 * points)],
+                    "attributes": [],
+                } for idx in range(kwargs['shapes'] // 2)]
+                tracks = generate_tracks(db_task, 0, db_task.size - 1,
+                    kwargs['shapes'] // 2, points=2 * points)
+                with transaction.atomic():
+                    JobAnnotation(db_job.id, None)._save_shapes_to_db(shapes)
+                save_tracks(db_job, tracks)
+
+                with transaction.atomic():
+                    _, elapsed, _ = measure(_load, db_job)
+
+                rows.append((points, "packed" if packed else "text",
+                    format_size(_storage_size()), "{:.2f}".format(elapsed)))
+                db_task.delete()
+
+    print_table(("points", "format", "storage size", "load time, s"), rows)
+
+
+if __name__ == "__main__":
+    main()
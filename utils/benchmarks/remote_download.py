@@ -0,0 +1,92 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of downloading remote files of a task from a local HTTP server with
+a response latency by different numbers of threads
+(REMOTE_FILES_DOWNLOAD_WORKERS) and of a re-run which skips downloaded
+files."""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+
+from common import setup_django, print_table
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', default=200, type=int)
+    parser.add_argument('--file-size', default=200 * 1024, type=int)
+    parser.add_argument('--latency', default=0.05, type=float,
+        help='Delay of every response, s')
+    parser.add_argument('--workers', nargs='*', type=int, default=[1, 4, 8, 16])
+
+    return vars(parser.parse_args())
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _make_handler(data, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.test import override_settings
+    from cvat.apps.engine import task
+
+    server = _Server(("127.0.0.1", 0),
+        _make_handler(os.urandom(kwargs['file_size']), kwargs['latency']))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = ["http://127.0.0.1:{}/{}.jpg".format(server.server_port, i)
+        for i in range(kwargs['files'])]
+
+    rows = []
+    with mock.patch.object(task.rq, 'get_current_job'):
+        for workers in kwargs['workers']:
+            upload_dir = tempfile.mkdtemp()
+            manifest_path = os.path.join(upload_dir, 'download.manifest')
+            try:
+                with override_settings(REMOTE_FILES_DOWNLOAD_WORKERS=workers):
+                    start = time.perf_counter()
+                    task._download_data(urls, upload_dir, manifest_path)
+                    elapsed = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    task._download_data(urls, upload_dir, manifest_path)
+                    rerun_elapsed = time.perf_counter() - start
+            finally:
+                shutil.rmtree(upload_dir)
+
+            rows.append((workers, "{:.2f}".format(elapsed), "{:.2f}".format(rerun_elapsed)))
+
+    server.shutdown()
+    print_table(("workers", "download, s", "re-run, s"), rows)
+
+
+if __name__ == "__main__":
+    main()
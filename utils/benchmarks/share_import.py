@@ -0,0 +1,68 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of importing share files into the upload directory of a task by
+different SHARE_IMPORT_LINKS (a file is copied if a link can't be made)."""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from common import setup_django, print_table, format_size
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', default=1000, type=int)
+    parser.add_argument('--file-size', default=1024 * 1024, type=int)
+    parser.add_argument('--workers', default=8, type=int)
+
+    return vars(parser.parse_args())
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.test import override_settings
+    from cvat.apps.engine import task
+
+    share_root = tempfile.mkdtemp()
+    for i in range(kwargs['files']):
+        path = os.path.join(share_root, 'images', str(i // 100), '{}.jpg'.format(i))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as image_file:
+            image_file.write(os.urandom(kwargs['file_size']))
+
+    rows = []
+    try:
+        for links in [[], ['reflink'], ['hardlink'], ['symlink']]:
+            upload_dir = tempfile.mkdtemp()
+            try:
+                with override_settings(SHARE_ROOT=share_root, SHARE_IMPORT_LINKS=links,
+                    SHARE_IMPORT_WORKERS=kwargs['workers']), \
+                    mock.patch.object(task.rq, 'get_current_job'):
+                    start = time.perf_counter()
+                    task._copy_data_from_share(['images'], upload_dir)
+                    elapsed = time.perf_counter() - start
+                copied = sum(os.path.getsize(os.path.join(root, name))
+                    for root, _, names in os.walk(upload_dir) for name in names
+                    if not os.path.islink(os.path.join(root, name)) and
+                        os.stat(os.path.join(root, name)).st_nlink == 1)
+            finally:
+                shutil.rmtree(upload_dir)
+
+            rows.append((', '.join(links) or 'copy', "{:.2f}".format(elapsed),
+                format_size(copied)))
+    finally:
+        shutil.rmtree(share_root)
+
+    print_table(("links", "import, s", "copied (or cloned)"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time and peak memory of exporting task annotations frame by frame when
+all jobs are merged in memory and when they are streamed segment by segment."""
+
+import argparse
+
+from common import (setup_django, test_database, measure, print_table,
+    format_size, create_db_task, generate_tracks, save_tracks)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', default=20000, type=int,
+        help='Number of frames in the synthetic task')
+    parser.add_argument('--segment-size', default=1000, type=int)
+    parser.add_argument('--overlap', default=5, type=int)
+    parser.add_argument('--shapes-per-frame', default=10, type=int,
+        help='Number of tracked shapes on every frame')
+
+    return vars(parser.parse_args())
+
+
+def _consume(exporter):
+    frames = 0
+    for _ in exporter.group_by_frame():
+        frames += 1
+    return frames
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.annotation.annotation import Annotation, AnnotationIR
+    from cvat.apps.engine import models
+    from cvat.apps.engine.annotation import TaskAnnotation
+
+    def _merged_export(db_task):
+        task_annotation = TaskAnnotation(db_task.id, None)
+        task_annotation.init_from_db()
+        return _consume(Annotation(annotation_ir=task_annotation.ir_data,
+            db_task=task_annotation.db_task))
+
+    def _stream_export(db_task):
+        task_annotation = TaskAnnotation(db_task.id, None)
+        return _consume(Annotation(annotation_ir=AnnotationIR(),
+            annotation_ir_parts=task_annotation.iter_from_db,
+            db_task=task_annotation.db_task))
+
+    with test_database():
+        db_task = create_db_task(size=kwargs['frames'],
+            segment_size=kwargs['segment_size'], overlap=kwargs['overlap'])
+        models.Video.objects.create(task=db_task, path="video.mp4",
+            width=1920, height=1080)
+        for db_segment in db_task.segment_set.all():
+            frames = db_segment.stop_frame - db_segment.start_frame + 1
+            save_tracks(db_segment.job_set.first(), generate_tracks(db_task,
+                db_segment.start_frame, db_segment.stop_frame,
+                frames * kwargs['shapes_per_frame'], shapes_per_track=frames))
+
+        rows = []
+        for name, export in [("merged", _merged_export), ("stream", _stream_export)]:
+            frames, elapsed, peak = measure(export, db_task)
+            rows.append((name, frames, "{:.2f}".format(elapsed), format_size(peak)))
+
+    print_table(("mode", "frames", "time, s", "peak memory"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time of TaskAnnotation.init_from_db for tasks with many segments when
+jobs are read one by one and when they are read by several threads."""
+
+import argparse
+
+from common import (setup_django, test_database, measure, print_table,
+    create_db_task, generate_tracks, save_tracks)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--segments', nargs='*', type=int,
+        default=[10, 50, 100, 200],
+        help='Numbers of segments (jobs) in the synthetic task')
+    parser.add_argument('--segment-size', default=100, type=int)
+    parser.add_argument('--overlap', default=5, type=int)
+    parser.add_argument('--shapes-per-frame', default=5, type=int,
+        help='Number of tracked shapes on every frame')
+    parser.add_argument('--workers', default=4, type=int,
+        help='Number of threads for the concurrent mode')
+
+    return vars(parser.parse_args())
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from django.test.utils import override_settings
+    from cvat.apps.engine.annotation import TaskAnnotation
+
+    def _load(db_task, workers):
+        with override_settings(TASK_ANNOTATION_LOAD_WORKERS=workers):
+            task_annotation = TaskAnnotation(db_task.id, None)
+            task_annotation.init_from_db()
+        return len(task_annotation.ir_data.tracks)
+
+    rows = []
+    with test_database():
+        segment_step = kwargs['segment_size'] - kwargs['overlap']
+        for segments in kwargs['segments']:
+            db_task = create_db_task(
+                size=segment_step * (segments - 1) + kwargs['segment_size'],
+                segment_size=kwargs['segment_size'], overlap=kwargs['overlap'])
+            for db_segment in db_task.segment_set.all():
+                frames = db_segment.stop_frame - db_segment.start_frame + 1
+                save_tracks(db_segment.job_set.first(), generate_tracks(db_task,
+                    db_segment.start_frame, db_segment.stop_frame,
+                    frames * kwargs['shapes_per_frame'], shapes_per_track=frames))
+
+            tracks, serial_elapsed, _ = measure(_load, db_task, 1)
+            _, parallel_elapsed, _ = measure(_load, db_task, kwargs['workers'])
+            rows.append((segments, tracks, "{:.2f}".format(serial_elapsed),
+                "{:.2f}".format(parallel_elapsed)))
+            db_task.delete()
+
+    print_table(("segments", "tracks", "1 worker, s",
+        "{} workers, s".format(kwargs['workers'])), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Copyright (C) 2019 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+"""Time and peak memory of exporting interpolated tracks frame by frame when
+all tracks are expanded at once and when they are expanded by windows of
+frames, and the time of reading a shape on a single frame of every track."""
+
+import argparse
+
+from common import (setup_django, test_database, measure, print_table,
+    format_size, create_db_task, generate_tracks)
+
+
+def _get_kwargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', default=10000, type=int,
+        help='Number of frames in the synthetic task')
+    parser.add_argument('--tracks', default=20, type=int,
+        help='Number of tracks (every track is on all frames)')
+    parser.add_argument('--keyframes', default=20, type=int,
+        help='Number of keyframes in every track')
+
+    return vars(parser.parse_args())
+
+
+def _generate_data(db_task, tracks, keyframes):
+    from cvat.apps.annotation.annotation import AnnotationIR
+
+    step = db_task.size // keyframes
+    data = AnnotationIR()
+    for _ in range(tracks):
+        track = generate_tracks(db_task, 0, keyframes - 1, keyframes,
+            shapes_per_track=keyframes)[0]
+        for shape in track["shapes"]:
+            shape["frame"] *= step
+        data.add_track(track)
+
+    return data
+
+
+def main():
+    kwargs = _get_kwargs()
+    setup_django()
+
+    from cvat.apps.annotation.annotation import Annotation
+    from cvat.apps.engine import models
+    from cvat.apps.engine.data_manager import TrackManager
+
+    def _export(db_task, window):
+        exporter = Annotation(annotation_ir=_generate_data(db_task,
+            kwargs['tracks'], kwargs['keyframes']), db_task=db_task)
+        exporter._FRAME_WINDOW = window
+        return sum(1 for _ in exporter.group_by_frame())
+
+    def _read_frame(db_task, frame):
+        data = _generate_data(db_task, kwargs['tracks'], kwargs['keyframes'])
+        return [TrackManager.get_interpolated_shapes(track, 0, db_task.size) \
+            .get_shape(frame) for track in data.tracks]
+
+    with test_database():
+        db_task = create_db_task(size=kwargs['frames'])
+        models.Video.objects.create(task=db_task, path="video.mp4",
+            width=1920, height=1080)
+
+        rows = []
+        for name, window in [("all frames", db_task.size), ("by windows", 1000)]:
+            frames, elapsed, peak = measure(_export, db_task, window)
+            rows.append(("group_by_frame, " + name, frames,
+                "{:.2f}".format(elapsed), format_size(peak)))
+
+        _, elapsed, peak = measure(_read_frame, db_task, db_task.size // 2)
+        rows.append(("get_shape", 1, "{:.2f}".format(elapsed), format_size(peak)))
+
+    print_table(("mode", "frames", "time, s", "peak memory"), rows)
+
+
+if __name__ == "__main__":
+    main()